@@ -0,0 +1,402 @@
+import io
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+
+# Mede cada etapa do pipeline sobre os próprios arquivos do repositório
+# (PDFs e HTMLs de */capital/dados_brutos e */estado/dados_brutos e os
+# validado_*.csv) e guarda o resultado em JSON para comparar execuções. A
+# etapa qd_local mede o cliente do Querido Diário contra o servidor_qd.py.
+#
+#   python benchmark.py                      # compara com a execução anterior
+#   python benchmark.py --etapas pdf_texto html --repeticoes 3
+#   python benchmark.py --comparar .cache/benchmarks/benchmark_20250101-120000.json
+#
+# Cada etapa roda num processo novo, para que o pico de memória (RSS) seja só dela.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IDENTIFICADOR_DIR = os.path.join(BASE_DIR, "identificador")
+sys.path.insert(0, IDENTIFICADOR_DIR)
+
+LEIS = ["LAI", "LGD", "LGPD", "MROSC"]
+TIPOS = ["capital", "estado"]
+
+PASTA_RESULTADOS = os.path.join(BASE_DIR, ".cache", "benchmarks")
+# Queda de vazão (ou aumento do pico de memória) acima disso é marcada como regressão
+TOLERANCIA = 0.15
+# Páginas digitalizadas amostradas para medir o OCR (cada uma leva segundos)
+PAGINAS_OCR = 3
+
+# Servidor local do Querido Diário (servidor_qd.py) na etapa qd_local: corpus, rede simulada e sorteio fixos
+QD_LOCAL = {
+    "copias": 15, "edicoes": 2,
+    "latencia": 0.005, "jitter": 0.01, "taxa_erro": 0.05, "taxa_corte": 0.05, "semente": 0,
+}
+
+ETAPAS = ["pdf_texto", "ocr", "html", "limpeza_csv", "identificacao", "qd_local"]
+# Métricas em que maior é melhor; nas demais (pico_rss_mb), menor é melhor
+METRICAS_VAZAO = ["paginas_por_s", "mb_por_s", "requisicoes_por_s"]
+
+
+def arquivos_brutos(extensoes):
+    """(lei, tipo, caminho) dos arquivos brutos do repositório com as extensões pedidas."""
+    arquivos = []
+    for lei in LEIS:
+        for tipo in TIPOS:
+            for caminho in sorted(glob.glob(os.path.join(BASE_DIR, lei, tipo, "dados_brutos", "*"))):
+                if caminho.lower().endswith(extensoes):
+                    arquivos.append((lei, tipo, caminho))
+    return arquivos
+
+
+def caminho_txt(pasta_trabalho, lei, tipo, caminho):
+    """.txt de saída na pasta temporária, com o mesmo layout <LEI>/<tipo>/dados_extraidos do repositório."""
+    pasta = os.path.join(pasta_trabalho, lei, tipo, "dados_extraidos")
+    os.makedirs(pasta, exist_ok=True)
+    return os.path.join(pasta, os.path.splitext(os.path.basename(caminho))[0] + ".txt")
+
+
+def megabytes(caminhos):
+    return sum(os.path.getsize(caminho) for caminho in caminhos) / (1024 * 1024)
+
+
+def melhor_tempo(funcao, repeticoes):
+    """Menor tempo entre as repetições e o resultado da última."""
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    return melhor, resultado
+
+
+# -------------------------------------------------------------------
+# Etapas (cada uma roda num processo separado)
+# -------------------------------------------------------------------
+def bench_pdf_texto(pasta_trabalho, repeticoes, opcoes):
+    """Extração do texto dos PDFs com a detecção de páginas digitalizadas (as duas saem da mesma passada)."""
+    import extracao
+
+    pdfs = arquivos_brutos((".pdf",))
+
+    def rodar():
+        paginas, erros = [], 0
+        for lei, tipo, caminho in pdfs:
+            try:
+                paginas_pdf = extracao.extract_pdf_pages(caminho)
+            except Exception:
+                # PDFs corrompidos (ou HTML salvo como .pdf) entram só na contagem de erros
+                erros += 1
+                continue
+            extracao.save_text_stream((texto for texto, _ in paginas_pdf), caminho_txt(pasta_trabalho, lei, tipo, caminho))
+            paginas.extend((caminho, numero, precisa_ocr) for numero, (_, precisa_ocr) in enumerate(paginas_pdf))
+        return paginas, erros
+
+    segundos, (paginas, erros) = melhor_tempo(rodar, repeticoes)
+    digitalizadas = [(caminho, numero) for caminho, numero, precisa_ocr in paginas if precisa_ocr]
+    return {
+        "segundos": segundos,
+        "arquivos": len(pdfs),
+        "erros": erros,
+        "paginas": len(paginas),
+        "mb": megabytes(caminho for _, _, caminho in pdfs),
+        "paginas_digitalizadas": len(digitalizadas),
+        "amostra_ocr": digitalizadas[:opcoes["paginas_ocr"]],
+    }
+
+
+def bench_ocr(pasta_trabalho, repeticoes, opcoes):
+    """OCR por página (rasterização + Tesseract, sem o cache) numa amostra das páginas digitalizadas."""
+    import pytesseract
+    import extracao
+
+    amostra = opcoes.get("amostra_ocr") or []
+    if not amostra:
+        return {"ignorado": "nenhuma página digitalizada na amostra"}
+    try:
+        extracao.tesseract_version()
+    except Exception as e:
+        return {"ignorado": f"Tesseract indisponível: {e}"}
+
+    def rodar():
+        for caminho, numero in amostra:
+            for imagem in extracao.render_pages(caminho, numero, numero + 1, opcoes["dpi"], opcoes["renderer"]):
+                pytesseract.image_to_string(imagem, lang=extracao.OCR_LANG)
+
+    segundos, _ = melhor_tempo(rodar, repeticoes)
+    return {
+        "segundos": segundos,
+        "paginas": len(amostra),
+        "segundos_por_pagina": segundos / len(amostra),
+        "dpi": opcoes["dpi"],
+        "renderer": opcoes["renderer"],
+    }
+
+
+def bench_html(pasta_trabalho, repeticoes, opcoes):
+    """Extração em streaming dos HTMLs."""
+    import extracao
+
+    htmls = arquivos_brutos((".html", ".htm"))
+
+    def rodar():
+        for lei, tipo, caminho in htmls:
+            extracao.extract_html_to_file(caminho, caminho_txt(pasta_trabalho, lei, tipo, caminho))
+
+    segundos, _ = melhor_tempo(rodar, repeticoes)
+    return {"segundos": segundos, "arquivos": len(htmls), "mb": megabytes(caminho for _, _, caminho in htmls)}
+
+
+def bench_limpeza_csv(pasta_trabalho, repeticoes, opcoes):
+    """Limpeza dos validado_*.csv (leitura, extração vetorizada dos números e gravação CSV/Parquet)."""
+    import limpador_validado
+
+    csvs = [(lei, os.path.join(BASE_DIR, lei, f"validado_{lei}.csv")) for lei in LEIS]
+    csvs = [(lei, caminho) for lei, caminho in csvs if os.path.exists(caminho)]
+    pasta_saida = os.path.join(pasta_trabalho, "identificado")
+
+    def rodar():
+        return sum(len(limpador_validado.limpar_csv(caminho, lei, pasta_saida)) for lei, caminho in csvs)
+
+    segundos, linhas = melhor_tempo(rodar, repeticoes)
+    return {"segundos": segundos, "arquivos": len(csvs), "linhas": linhas, "mb": megabytes(c for _, c in csvs)}
+
+
+def bench_identificacao(pasta_trabalho, repeticoes, opcoes):
+    """Identificação dos decretos nos .txt gerados pelas etapas anteriores: por arquivo (índice) e em lote."""
+    import identificador_de_decretos as identificador
+    from limpador_validado import carregar_identificado, COL_TIPO, COL_NOME, COL_ORIGINAL, COL_NUMERO
+
+    arquivos = {}
+    for caminho in glob.glob(os.path.join(pasta_trabalho, "*", "*", "dados_extraidos", "*.txt")):
+        lei = os.path.relpath(caminho, pasta_trabalho).split(os.sep)[0]
+        arquivos[os.path.splitext(os.path.basename(caminho))[0]] = (caminho, lei)
+    if not arquivos:
+        return {"ignorado": "nenhum .txt extraído (rode junto com pdf_texto/html)"}
+    colunas = [COL_TIPO, COL_NOME, COL_ORIGINAL, COL_NUMERO]
+    csvs = {}
+    for lei in LEIS:
+        df = carregar_identificado(lei, colunas, os.path.join(pasta_trabalho, "identificado"))
+        if df is not None:
+            csvs[lei] = df.fillna("")
+    if not csvs:
+        return {"ignorado": "nenhuma tabela identificado_<LEI> (rode junto com limpeza_csv)"}
+    pasta_saida = os.path.join(pasta_trabalho, "resultados")
+    caminho_indice = os.path.join(pasta_trabalho, "indice.sqlite")
+
+    def rodar():
+        if os.path.exists(caminho_indice):
+            os.remove(caminho_indice)
+        indice = identificador.carregar_indice(arquivos, caminho_indice)
+        identificador.identificar_por_arquivo(indice, arquivos, csvs, "off", pasta_saida)
+        identificador.identificar_em_lote(arquivos, csvs, "off", pasta_saida)
+
+    segundos, _ = melhor_tempo(rodar, repeticoes)
+    return {
+        "segundos": segundos,
+        "arquivos": len(arquivos),
+        "mb": megabytes(caminho for caminho, _ in arquivos.values()),
+    }
+
+
+def bench_qd_local(pasta_trabalho, repeticoes, opcoes):
+    """Buscas e downloads do ClienteQD contra o servidor_qd.py local, com latência, erros e cortes sorteados."""
+    import asyncio
+    import querido_diario
+    import servidor_qd
+
+    # a espera real entre tentativas (segundos) mediria o relógio, não o cliente
+    querido_diario.ESPERA_INICIAL = 0.01
+    diarios = servidor_qd.carregar_corpus(copias=QD_LOCAL["copias"], edicoes=QD_LOCAL["edicoes"])
+    config = {chave: valor for chave, valor in QD_LOCAL.items() if chave not in ("copias", "edicoes")}
+    territorios = sorted({diario.territory_id for diario in diarios})
+
+    async def rodar_async():
+        app = servidor_qd.criar_app(diarios, **config)
+        runner, url = await servidor_qd.iniciar(app)
+        esperados = 0
+        try:
+            async with querido_diario.ClienteQD(usar_cache=False, api_url=url) as cliente:
+                buscas = [{"querystring": "lei", "territory_ids": [territorio]} for territorio in territorios]
+                for params, dados in zip(buscas, await cliente.buscar_varios(buscas)):
+                    pasta = os.path.join(pasta_trabalho, "qd", str(params["territory_ids"][0]))
+                    await querido_diario.salvar_diarios(cliente, pasta, dados["gazettes"], baixar_pdf=True)
+                    esperados += sum(bool(g.get("txt_url")) + bool(g.get("url")) for g in dados["gazettes"])
+        finally:
+            await runner.cleanup()
+        return {**app["contadores"], "arquivos_esperados": esperados}
+
+    def rodar():
+        shutil.rmtree(os.path.join(pasta_trabalho, "qd"), ignore_errors=True)
+        return asyncio.run(rodar_async())
+
+    segundos, contadores = melhor_tempo(rodar, repeticoes)
+    baixados = glob.glob(os.path.join(pasta_trabalho, "qd", "*", "*_full_gazzete.*"))
+    # com as edições extras há diários de mesma data no território: cada um tem de ter os seus arquivos
+    if len(baixados) != contadores["arquivos_esperados"]:
+        raise RuntimeError(f"{len(baixados)} arquivos baixados, {contadores['arquivos_esperados']} esperados")
+    return {
+        "segundos": segundos,
+        "diarios": len(diarios),
+        "requisicoes": contadores.get("requisicoes", 0),
+        "requisicoes_por_s": contadores.get("requisicoes", 0) / segundos if segundos else 0.0,
+        "erros_simulados": sum(valor for chave, valor in contadores.items() if chave.startswith("erro_")),
+        "cortes_simulados": contadores.get("cortes", 0),
+        "arquivos": len(baixados),
+        "mb": megabytes(baixados),
+    }
+
+
+FUNCOES = {
+    "pdf_texto": bench_pdf_texto,
+    "ocr": bench_ocr,
+    "html": bench_html,
+    "limpeza_csv": bench_limpeza_csv,
+    "identificacao": bench_identificacao,
+    "qd_local": bench_qd_local,
+}
+
+
+def medir_etapa(etapa, pasta_trabalho, repeticoes, opcoes):
+    """Roda a etapa (no processo filho) sem a saída dos scripts e acrescenta vazão e pico de RSS."""
+    from nlp import pico_memoria_mb
+
+    with redirect_stdout(io.StringIO()):
+        resultado = FUNCOES[etapa](pasta_trabalho, repeticoes, opcoes)
+    if "segundos" in resultado and resultado["segundos"] > 0:
+        if "paginas" in resultado:
+            resultado["paginas_por_s"] = resultado["paginas"] / resultado["segundos"]
+        if "mb" in resultado:
+            resultado["mb_por_s"] = resultado["mb"] / resultado["segundos"]
+    resultado["pico_rss_mb"] = pico_memoria_mb()
+    return resultado
+
+
+def executar_isolado(etapa, pasta_trabalho, repeticoes, opcoes):
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+        return executor.submit(medir_etapa, etapa, pasta_trabalho, repeticoes, opcoes).result()
+
+
+# -------------------------------------------------------------------
+# Comparação entre execuções
+# -------------------------------------------------------------------
+def commit_atual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ultimo_resultado(pasta=PASTA_RESULTADOS, exceto=None):
+    caminhos = sorted(c for c in glob.glob(os.path.join(pasta, "benchmark_*.json")) if c != exceto)
+    return caminhos[-1] if caminhos else None
+
+
+def regressoes(atual, anterior, tolerancia=TOLERANCIA):
+    """Lista (etapa, métrica, antes, agora) das métricas que pioraram além da tolerância."""
+    encontradas = []
+    for etapa, metricas in atual["etapas"].items():
+        base = anterior["etapas"].get(etapa) or {}
+        for metrica in METRICAS_VAZAO + ["pico_rss_mb"]:
+            antes, agora = base.get(metrica), metricas.get(metrica)
+            if not antes or agora is None:
+                continue
+            variacao = (agora - antes) / antes
+            piorou = variacao < -tolerancia if metrica in METRICAS_VAZAO else variacao > tolerancia
+            if piorou:
+                encontradas.append((etapa, metrica, antes, agora))
+    return encontradas
+
+
+def imprimir(resultado):
+    for etapa, metricas in resultado["etapas"].items():
+        if "ignorado" in metricas:
+            print(f"{etapa:>14}: ignorada ({metricas['ignorado']})")
+            continue
+        partes = [f"{metricas['segundos']:.2f}s"]
+        if "paginas_por_s" in metricas:
+            partes.append(f"{metricas['paginas_por_s']:.1f} páginas/s")
+        if "segundos_por_pagina" in metricas:
+            partes.append(f"{metricas['segundos_por_pagina']:.2f} s/página")
+        if "requisicoes_por_s" in metricas:
+            partes.append(f"{metricas['requisicoes_por_s']:.1f} requisições/s")
+        if "mb_por_s" in metricas:
+            partes.append(f"{metricas['mb_por_s']:.2f} MB/s")
+        partes.append(f"pico RSS {metricas['pico_rss_mb']:.0f} MB")
+        print(f"{etapa:>14}: " + ", ".join(partes))
+
+
+def main():
+    import extracao
+
+    parser = argparse.ArgumentParser(description="Benchmark das etapas do pipeline sobre os arquivos do repositório.")
+    parser.add_argument("--etapas", nargs="+", choices=ETAPAS, default=ETAPAS, help="etapas medidas")
+    parser.add_argument("--repeticoes", type=int, default=1, help="repetições por etapa (vale o melhor tempo)")
+    parser.add_argument("--paginas-ocr", type=int, default=PAGINAS_OCR, help="páginas digitalizadas no OCR")
+    parser.add_argument("--dpi", type=int, default=extracao.OCR_DPI, help="resolução da rasterização para OCR")
+    parser.add_argument("--renderer", choices=["pymupdf", "poppler"], default=extracao.OCR_RENDERER)
+    parser.add_argument("--comparar", help="JSON de uma execução anterior (padrão: a mais recente)")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA, help="piora relativa aceita antes de acusar regressão")
+    args = parser.parse_args()
+
+    opcoes = {"paginas_ocr": args.paginas_ocr, "dpi": args.dpi, "renderer": args.renderer}
+    etapas = [etapa for etapa in ETAPAS if etapa in args.etapas]
+    resultado = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit_atual(),
+        "maquina": platform.node(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "repeticoes": args.repeticoes,
+        "etapas": {},
+    }
+
+    pasta_trabalho = tempfile.mkdtemp(prefix="benchmark_")
+    try:
+        for etapa in etapas:
+            print(f"⏱️ {etapa}...")
+            metricas = executar_isolado(etapa, pasta_trabalho, args.repeticoes, opcoes)
+            # a amostra de páginas digitalizadas do pdf_texto alimenta o ocr
+            opcoes["amostra_ocr"] = metricas.pop("amostra_ocr", opcoes.get("amostra_ocr"))
+            resultado["etapas"][etapa] = metricas
+    finally:
+        shutil.rmtree(pasta_trabalho, ignore_errors=True)
+
+    print()
+    imprimir(resultado)
+
+    os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+    saida = os.path.join(PASTA_RESULTADOS, f"benchmark_{datetime.now():%Y%m%d-%H%M%S}.json")
+    anterior = args.comparar or ultimo_resultado(exceto=saida)
+    with open(saida, "w", encoding="utf-8") as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultado salvo em {saida}")
+
+    if anterior:
+        with open(anterior, encoding="utf-8") as arquivo:
+            encontradas = regressoes(resultado, json.load(arquivo), args.tolerancia)
+        print(f"🔍 Comparado com {anterior}")
+        for etapa, metrica, antes, agora in encontradas:
+            print(f"❌ Regressão em {etapa}: {metrica} {antes:.2f} → {agora:.2f}")
+        if encontradas:
+            sys.exit(1)
+        print("✅ Nenhuma regressão acima da tolerância")
+
+
+if __name__ == "__main__":
+    main()
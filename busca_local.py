@@ -0,0 +1,308 @@
+import os
+import re
+import sys
+import time
+import sqlite3
+import argparse
+from array import array
+
+# Busca local (SQLite FTS5) nos textos já baixados: os <data>_full_gazzete.txt
+# salvos pelas buscas no Querido Diário e os .txt de */dados_extraidos. Aceita
+# a mesma sintaxe da API (palavras, "frase", "frase"~N, + para E, | para OU,
+# -palavra para NÃO) e filtra por território, lei e período:
+#
+#   python busca_local.py '"Lei 14.129"~15' --desde 2021-07-20 --lei LGD
+#   python busca_local.py 'acesso+informação' --territorio 3106200 --limite 50
+#   python busca_local.py --fts 'NEAR(lei 14129, 15)'   # consulta FTS5 direta
+#
+# Antes de cada busca o índice é sincronizado com os arquivos (só os novos ou
+# alterados são reindexados). O texto indexado é o de indice.tokenizar: sem
+# acentos, minúsculo e com os números sem pontuação, então "14.129" e "14129"
+# são o mesmo termo. As posições de cada termo no original ficam guardadas, e
+# o trecho de um resultado decodifica só a sua janela do arquivo (Sombra.original).
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, "identificador"))
+
+from indice import tokenizar_sombra
+from sombra import Sombra, Sombras, descartar_outra_versao
+from territorios import NOMES, IndiceTerritorios
+
+CAMINHO_DB = os.path.join(BASE_DIR, ".cache", "busca_local.sqlite")
+LEIS = ["LAI", "LGD", "LGPD", "MROSC"]
+LIMITE = 20
+TAMANHO_TRECHO = 300
+
+# <data>_full_gazzete.txt, ou <data>_<hash>_full_gazzete.txt se o território teve mais de um diário na data
+DATA_DIARIO_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})(?:_[0-9a-f]+)?_full_gazzete\.txt$")
+# Termos da consulta: frase entre aspas (com ~N opcional) ou palavra solta, com - opcional na frente
+TERMO_RE = re.compile(r'(-?)(?:"([^"]*)"(?:~(\d+))?|([^\s"+|]+))')
+# Separadores de alternativas (OU): espaços e | fora das aspas
+ALTERNATIVAS_RE = re.compile(r'(?:\s+|\s*\|\s*)(?=(?:[^"]*"[^"]*")*[^"]*$)')
+
+
+def termos(texto):
+    """(termo, início, fim) dos tokens de `texto`, restritos a [a-z0-9] para o FTS5 ver um token por termo."""
+    return termos_da_sombra(Sombra.de_texto(texto))
+
+
+def termos_da_sombra(sombra):
+    for termo, inicio, fim in tokenizar_sombra(sombra):
+        termo = re.sub(r"[^a-z0-9]", "", termo)
+        if termo:
+            yield termo, inicio, fim
+
+
+def consulta_fts(querystring: str) -> str:
+    """Traduz a sintaxe da API do Querido Diário para uma expressão MATCH do FTS5.
+
+    Os termos com - excluem documentos da consulta inteira, não só da alternativa em que aparecem.
+    """
+    alternativas, negativos = [], []
+    for grupo in ALTERNATIVAS_RE.split(querystring.strip()):
+        positivos = []
+        for negacao, frase, distancia, palavra in TERMO_RE.findall(grupo):
+            palavras = [termo for termo, _, _ in termos(frase or palavra)]
+            if not palavras:
+                continue
+            if distancia and len(palavras) > 1:
+                expressao = "NEAR(" + " ".join(f'"{p}"' for p in palavras) + f", {distancia})"
+            else:
+                expressao = '"' + " ".join(palavras) + '"'
+            (negativos if negacao else positivos).append(expressao)
+        if positivos:
+            alternativas.append("(" + " AND ".join(positivos) + ")")
+    if not alternativas:
+        return ""
+    expressao = " OR ".join(alternativas)
+    if negativos:
+        expressao = f"({expressao}) NOT (" + " OR ".join(negativos) + ")"
+    return expressao
+
+
+def listar_fontes(base_dir: str = BASE_DIR):
+    """{caminho: metadados} dos textos a indexar: diários completos do QD e extrações do repositório."""
+    indice = IndiceTerritorios()
+    fontes = {}
+    for raiz, pastas, arquivos in os.walk(base_dir):
+        pastas[:] = sorted(p for p in pastas if not p.startswith(".") and p != "__pycache__")
+        partes = os.path.relpath(raiz, base_dir).split(os.sep)
+        lei = next((parte for parte in partes if parte in LEIS), None)
+        for nome in sorted(arquivos):
+            caminho = os.path.join(raiz, nome)
+            data = DATA_DIARIO_RE.match(nome)
+            if data:
+                # as buscas salvam em <pasta do território>/<data>_full_gazzete.txt, ex. "Aracaju (SE)"
+                codigos = indice.resolver_linha(os.path.basename(raiz))
+                fontes[caminho] = {
+                    "origem": "qd", "lei": lei, "data": data.group(1),
+                    "territory_id": codigos[0] if len(codigos) == 1 else None,
+                }
+            elif os.path.basename(raiz) == "dados_extraidos" and nome.endswith(".txt"):
+                tipo = os.path.basename(os.path.dirname(raiz))
+                codigos = indice.resolver_arquivo(os.path.splitext(nome)[0], tipo)
+                fontes[caminho] = {
+                    "origem": "extraido", "lei": lei, "data": None,
+                    "territory_id": codigos[0] if len(codigos) == 1 else None,
+                }
+    return fontes
+
+
+class BuscaLocal:
+    """Índice FTS5 dos textos baixados, com território, data e lei de cada documento.
+
+    `documentos` guarda os metadados, `textos` (FTS5, rowid = documentos.id)
+    o texto normalizado e `posicoes` o início e o fim no original de cada
+    termo, na ordem do texto normalizado; a atualização é incremental por
+    tamanho e data de modificação, como no IndiceTextos do identificador.
+    """
+
+    def __init__(self, caminho_db: str = CAMINHO_DB, sombras=None):
+        os.makedirs(os.path.dirname(caminho_db), exist_ok=True)
+        self._conn = sqlite3.connect(caminho_db)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documentos (
+                id INTEGER PRIMARY KEY,
+                caminho TEXT UNIQUE,
+                origem TEXT,
+                lei TEXT,
+                territory_id INTEGER,
+                data TEXT,
+                encoding TEXT,
+                mtime_ns INTEGER,
+                tamanho INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS documentos_data ON documentos (data);
+            CREATE INDEX IF NOT EXISTS documentos_territorio ON documentos (territory_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS textos USING fts5(texto, tokenize = "unicode61");
+            CREATE TABLE IF NOT EXISTS posicoes (
+                id INTEGER PRIMARY KEY,
+                intervalos BLOB
+            );
+            """
+        )
+        self._conn.commit()
+        descartar_outra_versao(self._conn, ["textos", "documentos", "posicoes"])
+        self.sombras = sombras or Sombras()
+
+    def atualizar(self, fontes=None):
+        """Sincroniza o índice com `fontes` ({caminho: metadados}). Devolve (indexados, removidos)."""
+        fontes = listar_fontes() if fontes is None else fontes
+        # documentos indexados antes de existir a tabela posicoes ficam sem mtime e são reindexados
+        existentes = {
+            caminho: (doc_id, mtime_ns, tamanho)
+            for doc_id, caminho, mtime_ns, tamanho in self._conn.execute(
+                "SELECT d.id, d.caminho, iif(p.id IS NULL, NULL, d.mtime_ns), d.tamanho "
+                "FROM documentos d LEFT JOIN posicoes p ON p.id = d.id"
+            )
+        }
+
+        removidos = 0
+        for caminho in set(existentes) - set(fontes):
+            self._remover(existentes[caminho][0])
+            removidos += 1
+
+        indexados = 0
+        for caminho, metadados in fontes.items():
+            stat = os.stat(caminho)
+            anterior = existentes.get(caminho)
+            if anterior and anterior[1] == stat.st_mtime_ns and anterior[2] == stat.st_size:
+                continue
+            if anterior:
+                self._remover(anterior[0])
+            self._indexar(caminho, metadados, stat)
+            indexados += 1
+
+        self._conn.commit()
+        return indexados, removidos
+
+    def _remover(self, doc_id):
+        self._conn.execute("DELETE FROM textos WHERE rowid = ?", (doc_id,))
+        self._conn.execute("DELETE FROM posicoes WHERE id = ?", (doc_id,))
+        self._conn.execute("DELETE FROM documentos WHERE id = ?", (doc_id,))
+
+    def _indexar(self, caminho, metadados, stat):
+        sombra = self.sombras.de(caminho)
+        cursor = self._conn.execute(
+            "INSERT INTO documentos (caminho, origem, lei, territory_id, data, encoding, mtime_ns, tamanho) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (caminho, metadados["origem"], metadados["lei"], metadados["territory_id"], metadados["data"],
+             sombra.encoding, stat.st_mtime_ns, stat.st_size),
+        )
+        normalizados, intervalos = [], array("I")
+        for termo, inicio, fim in termos_da_sombra(sombra):
+            normalizados.append(termo)
+            intervalos.extend((inicio, fim))
+        self._conn.execute("INSERT INTO textos (rowid, texto) VALUES (?, ?)", (cursor.lastrowid, " ".join(normalizados)))
+        self._conn.execute("INSERT INTO posicoes (id, intervalos) VALUES (?, ?)", (cursor.lastrowid, intervalos.tobytes()))
+
+    def buscar(self, querystring: str = "", desde=None, ate=None, territorios=None, leis=None,
+               limite: int = LIMITE, tamanho_trecho: int = TAMANHO_TRECHO, fts: str | None = None):
+        """Documentos que casam com a consulta, dos mais relevantes (bm25) para os menos.
+
+        Devolve (total, resultados), com os resultados no formato dos diários
+        da API (territory_id, date, territory_name, excerpts) mais lei, origem
+        e caminho. Com `desde`/`ate`, só entram os diários com data no período.
+        """
+        expressao = fts or consulta_fts(querystring)
+        if not expressao:
+            return 0, []
+        filtros, parametros = ["textos MATCH ?"], [expressao]
+        if desde:
+            filtros.append("d.data >= ?")
+            parametros.append(str(desde))
+        if ate:
+            filtros.append("d.data <= ?")
+            parametros.append(str(ate))
+        if territorios:
+            filtros.append(f"d.territory_id IN ({', '.join('?' * len(territorios))})")
+            parametros.extend(int(t) for t in territorios)
+        if leis:
+            filtros.append(f"d.lei IN ({', '.join('?' * len(leis))})")
+            parametros.extend(leis)
+        where = " AND ".join(filtros)
+
+        total = self._conn.execute(
+            f"SELECT count(*) FROM textos JOIN documentos d ON d.id = textos.rowid WHERE {where}", parametros
+        ).fetchone()[0]
+        # os marcadores do highlight dizem em qual termo do texto normalizado está cada ocorrência
+        linhas = self._conn.execute(
+            f"SELECT d.id, d.caminho, d.origem, d.lei, d.territory_id, d.data, "
+            f"highlight(textos, 0, char(1), char(2)) "
+            f"FROM textos JOIN documentos d ON d.id = textos.rowid WHERE {where} ORDER BY rank LIMIT ?",
+            parametros + [limite],
+        ).fetchall()
+
+        resultados = []
+        for doc_id, caminho, origem, lei, territory_id, data, marcado in linhas:
+            nome, uf = NOMES.get(territory_id, (None, None))
+            resultados.append({
+                "territory_id": territory_id,
+                "date": data,
+                "territory_name": nome,
+                "state_code": uf,
+                "excerpts": [self.trecho(doc_id, caminho, ordem_da_primeira_marca(marcado), tamanho_trecho)],
+                "lei": lei,
+                "origem": origem,
+                "caminho": caminho,
+            })
+        return total, resultados
+
+    def trecho(self, doc_id, caminho, ordem, tamanho):
+        """Recorte do texto original, com acentos e pontuação, em volta do termo de ordem `ordem`.
+
+        O intervalo do termo é lido direto do blob de posicoes, sem carregar os dos outros termos.
+        """
+        largura = array("I").itemsize * 2
+        with self._conn.blobopen("posicoes", "intervalos", doc_id, readonly=True) as blob:
+            if (ordem + 1) * largura <= len(blob):
+                blob.seek(ordem * largura)
+                inicio, fim = array("I", blob.read(largura))
+                comeco = max(0, (inicio + fim) // 2 - tamanho // 2)
+            else:
+                comeco = 0
+        return self.sombras.de(caminho).original(comeco, comeco + tamanho).strip()
+
+
+def ordem_da_primeira_marca(marcado: str) -> int:
+    """Ordem (0, 1, 2...) do primeiro termo marcado pelo highlight no texto normalizado."""
+    posicao = marcado.find("\x01")
+    return marcado.count(" ", 0, posicao) if posicao >= 0 else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca local (FTS5) nos diários e textos já baixados.")
+    parser.add_argument("consulta", nargs="?", default="", help='sintaxe da API: palavras, "frase", "frase"~N, +, |, -')
+    parser.add_argument("--fts", help="expressão MATCH do FTS5, no lugar da consulta")
+    parser.add_argument("--desde", help="data inicial (AAAA-MM-DD)")
+    parser.add_argument("--ate", help="data final (AAAA-MM-DD)")
+    parser.add_argument("--territorio", type=int, action="append", help="código IBGE (pode repetir)")
+    parser.add_argument("--lei", action="append", choices=LEIS, help="lei (pode repetir)")
+    parser.add_argument("--limite", type=int, default=LIMITE)
+    parser.add_argument("--trecho", type=int, default=TAMANHO_TRECHO, help="caracteres do trecho")
+    parser.add_argument("--sem-atualizar", action="store_true", help="não sincroniza o índice antes da busca")
+    args = parser.parse_args()
+
+    busca = BuscaLocal()
+    if not args.sem_atualizar:
+        inicio = time.perf_counter()
+        indexados, removidos = busca.atualizar()
+        if indexados or removidos:
+            print(f"🗂️ {indexados} documentos indexados, {removidos} removidos em {time.perf_counter() - inicio:.1f}s")
+    if not args.consulta and not args.fts:
+        return
+
+    inicio = time.perf_counter()
+    total, resultados = busca.buscar(args.consulta, args.desde, args.ate, args.territorio, args.lei,
+                                     args.limite, args.trecho, args.fts)
+    duracao = (time.perf_counter() - inicio) * 1000
+    print(f"🔎 {total} documentos em {duracao:.1f} ms (mostrando {len(resultados)})\n")
+    for resultado in resultados:
+        territorio = f"{resultado['territory_name']} ({resultado['state_code']})" if resultado["territory_name"] else "?"
+        print(f"📄 {resultado['date'] or 's/ data'} | {territorio} | {resultado['lei'] or '-'} | {resultado['caminho']}")
+        print(f"   …{' '.join(resultado['excerpts'][0].split())}…\n")
+
+
+if __name__ == "__main__":
+    main()
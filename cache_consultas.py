@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import sqlite3
+
+from cache_lru import LimiteLRU
+
+
+class CacheAusente(Exception):
+    """Consulta sem resposta no cache enquanto o modo somente-cache está ligado."""
+
+
+class CacheConsultas:
+    """Cache em disco (SQLite) das respostas da API do Querido Diário.
+
+    A chave é a consulta normalizada (parâmetros ordenados, valores sem
+    espaços, listas de territórios ordenadas), então a mesma busca feita por
+    scripts diferentes reaproveita a resposta. Cada entrada tem seu próprio
+    TTL; acima de `tamanho_maximo` bytes, as menos acessadas são removidas.
+    Acertos e faltas são contados na execução e acumulados no banco.
+    """
+
+    def __init__(self, caminho_db: str, tamanho_maximo: int):
+        os.makedirs(os.path.dirname(caminho_db), exist_ok=True)
+        self.tamanho_maximo = tamanho_maximo
+        self.acertos = 0
+        self.faltas = 0
+        self._conn = sqlite3.connect(caminho_db)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS respostas (
+                chave TEXT PRIMARY KEY,
+                resposta TEXT,
+                tamanho INTEGER,
+                expira_em REAL,
+                acessado_em REAL
+            );
+            CREATE INDEX IF NOT EXISTS respostas_acesso ON respostas (acessado_em);
+            CREATE TABLE IF NOT EXISTS estatisticas (
+                nome TEXT PRIMARY KEY,
+                valor INTEGER
+            );
+            """
+        )
+        self._conn.commit()
+        self._limite = LimiteLRU(self._conn, "respostas", tamanho_maximo)
+
+    @staticmethod
+    def chave(url: str, params: dict) -> str:
+        normalizados = {}
+        for nome, valor in params.items():
+            if isinstance(valor, (list, tuple, set)):
+                valor = ",".join(sorted(str(v).strip() for v in valor))
+            valor = str(valor).strip()
+            if nome == "territory_ids":
+                valor = ",".join(sorted(v.strip() for v in valor.split(",")))
+            normalizados[nome.strip()] = valor
+        return url + "?" + json.dumps(normalizados, sort_keys=True, ensure_ascii=False)
+
+    def buscar(self, chave: str, ignorar_validade: bool = False):
+        """Resposta guardada para a chave, ou None se não existir (ou estiver vencida)."""
+        linha = self._conn.execute(
+            "SELECT resposta, expira_em FROM respostas WHERE chave = ?", (chave,)
+        ).fetchone()
+        agora = time.time()
+        if linha is None or (linha[1] < agora and not ignorar_validade):
+            self._contar("faltas")
+            return None
+        self._conn.execute("UPDATE respostas SET acessado_em = ? WHERE chave = ?", (agora, chave))
+        self._contar("acertos")
+        return json.loads(linha[0])
+
+    def guardar(self, chave: str, resposta, ttl: float):
+        texto = json.dumps(resposta, ensure_ascii=False)
+        tamanho = len(texto.encode("utf-8"))
+        agora = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?)",
+            (chave, texto, tamanho, agora + ttl, agora),
+        )
+        self._conn.commit()
+        if self._limite.inserir(tamanho):
+            self.despejar()
+
+    def despejar(self):
+        """Remove as vencidas e, se ainda passar do limite, as menos acessadas até 90% do tamanho máximo."""
+        self._conn.execute("DELETE FROM respostas WHERE expira_em < ?", (time.time(),))
+        self._limite.despejar()
+        self._conn.commit()
+
+    def _contar(self, nome: str):
+        setattr(self, nome, getattr(self, nome) + 1)
+        self._conn.execute(
+            "INSERT INTO estatisticas VALUES (?, 1) ON CONFLICT(nome) DO UPDATE SET valor = valor + 1", (nome,)
+        )
+        self._conn.commit()
+
+    def resumo(self) -> str:
+        acumulado = dict(self._conn.execute("SELECT nome, valor FROM estatisticas"))
+        return (
+            f"Cache de consultas: {self.acertos} acertos, {self.faltas} faltas nesta execução "
+            f"({acumulado.get('acertos', 0)} acertos, {acumulado.get('faltas', 0)} faltas no total)"
+        )
@@ -0,0 +1,55 @@
+import sqlite3
+
+# Despejo LRU comum aos caches em SQLite (cache_ocr, cache_consultas). A
+# tabela precisa das colunas chave, tamanho (bytes) e acessado_em.
+
+# Inserções entre uma soma e outra da tabela, mesmo com a estimativa abaixo do limite:
+# outros processos gravam no mesmo banco e substituições de chave não descontam o tamanho antigo
+VERIFICAR_A_CADA = 100
+
+
+def somar_tamanho(conn: sqlite3.Connection, tabela: str) -> int:
+    return conn.execute(f"SELECT COALESCE(SUM(tamanho), 0) FROM {tabela}").fetchone()[0]
+
+
+def despejar_lru(conn: sqlite3.Connection, tabela: str, tamanho_maximo: int) -> int:
+    """Se a soma de `tamanho` passar de `tamanho_maximo`, remove as linhas com `acessado_em` mais antigo
+    até voltar a 90% do limite. Devolve o total que ficou."""
+    total = somar_tamanho(conn, tabela)
+    if total <= tamanho_maximo:
+        return total
+    alvo = total - int(tamanho_maximo * 0.9)
+    removidos = 0
+    chaves = []
+    for chave, tamanho in conn.execute(f"SELECT chave, tamanho FROM {tabela} ORDER BY acessado_em"):
+        chaves.append((chave,))
+        removidos += tamanho
+        if removidos >= alvo:
+            break
+    conn.executemany(f"DELETE FROM {tabela} WHERE chave = ?", chaves)
+    return total - removidos
+
+
+class LimiteLRU:
+    """Estimativa em memória do tamanho de uma tabela de cache, para não somá-la a cada inserção.
+
+    inserir() diz quando vale chamar despejar(): quando a estimativa passa do
+    limite ou a cada VERIFICAR_A_CADA inserções. despejar() soma a tabela de
+    verdade, remove o excesso e corrige a estimativa.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, tabela: str, tamanho_maximo: int):
+        self._conn = conn
+        self.tabela = tabela
+        self.tamanho_maximo = tamanho_maximo
+        self.total = somar_tamanho(conn, tabela)
+        self._insercoes = 0
+
+    def inserir(self, tamanho: int) -> bool:
+        self.total += tamanho
+        self._insercoes += 1
+        return self.total > self.tamanho_maximo or self._insercoes >= VERIFICAR_A_CADA
+
+    def despejar(self):
+        self.total = despejar_lru(self._conn, self.tabela, self.tamanho_maximo)
+        self._insercoes = 0
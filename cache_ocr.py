@@ -0,0 +1,64 @@
+import os
+import time
+import sqlite3
+import hashlib
+
+from cache_lru import LimiteLRU
+
+
+class CacheOCR:
+    """Cache persistente do texto OCR de cada página.
+
+    A chave combina o hash da imagem rasterizada com DPI, idioma e versão do
+    Tesseract, então a mesma página (mesmo em outro PDF ou outra lei) só
+    passa pelo OCR uma vez. Quando o total de texto guardado passa de
+    `tamanho_maximo` bytes, as entradas acessadas há mais tempo são removidas.
+    """
+
+    def __init__(self, pasta: str, tamanho_maximo: int):
+        os.makedirs(pasta, exist_ok=True)
+        self.tamanho_maximo = tamanho_maximo
+        # vários processos do pool usam o mesmo arquivo
+        self._conn = sqlite3.connect(os.path.join(pasta, "ocr.sqlite"), timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS paginas (
+                chave TEXT PRIMARY KEY,
+                texto TEXT,
+                tamanho INTEGER,
+                acessado_em REAL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS paginas_acesso ON paginas (acessado_em)")
+        self._conn.commit()
+        self._limite = LimiteLRU(self._conn, "paginas", tamanho_maximo)
+
+    @staticmethod
+    def chave(imagem_bytes: bytes, dpi: int, idioma: str, versao_motor: str) -> str:
+        hash_imagem = hashlib.sha256(imagem_bytes).hexdigest()
+        return f"{hash_imagem}:{dpi}:{idioma}:{versao_motor}"
+
+    def buscar(self, chave: str):
+        linha = self._conn.execute("SELECT texto FROM paginas WHERE chave = ?", (chave,)).fetchone()
+        if linha is None:
+            return None
+        self._conn.execute("UPDATE paginas SET acessado_em = ? WHERE chave = ?", (time.time(), chave))
+        self._conn.commit()
+        return linha[0]
+
+    def guardar(self, chave: str, texto: str):
+        tamanho = len(texto.encode("utf-8"))
+        self._conn.execute(
+            "INSERT OR REPLACE INTO paginas VALUES (?, ?, ?, ?)",
+            (chave, texto, tamanho, time.time()),
+        )
+        self._conn.commit()
+        if self._limite.inserir(tamanho):
+            self.despejar()
+
+    def despejar(self):
+        """Remove as entradas menos usadas até o cache voltar a 90% do tamanho máximo."""
+        self._limite.despejar()
+        self._conn.commit()
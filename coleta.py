@@ -17,26 +17,24 @@
 import os
 import time
 import logging
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import csv
 import requests
 from urllib.parse import urlparse
 from unidecode import unidecode
 
-
-# Configuração básica do logger
-logging.basicConfig(
-    level=logging.INFO,  # Níveis: DEBUG, INFO, WARNING, ERROR, CRITICAL
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("download_regulamentacoes.log", encoding="utf-8"),
-        logging.StreamHandler()
-    ]
+from gravacao_http import montar_adaptador
+from manifesto import (
+    SITUACAO_OK, SITUACAO_PERMANENTE, SITUACAO_TEMPORARIA,
+    DownloadCorrompido, DownloadIncompleto, DownloadParcial, Manifesto,
 )
+from metricas import acumular, anotar, medir_arquivo, perfilar
+
 
-# Cria uma session para evitar tantos problemas de download...
-session = requests.Session()
-session.headers.update({
+HEADERS = {
     "User-Agent": (
         "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
         "AppleWebKit/537.36 (KHTML, like Gecko) "
@@ -45,7 +43,7 @@ session.headers.update({
     "Accept": "text/html,application/xhtml+xml,application/xml; q=0.9, */*; q=0.8",
     "Accept-Language": "pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7",
     "Connection": "keep-alive",
-})
+}
 
 laws = ["LGD", "LGPD", "MROSC"]
 territory_types = ["capitais","estados"]
@@ -53,103 +51,434 @@ directory = os.getcwd()
 
 dados_brutos_directory = "//dados_brutos"
 dados_extraidos_directory = "//dados_extraidos"
+# Manifesto e armazém endereçado por conteúdo dos downloads
+cache_directory = os.path.join(directory, ".cache", "downloads")
+
+# Quantos downloads rodam ao mesmo tempo (somando todos os portais)
+MAX_WORKERS = 8
+# Quantos downloads simultâneos um mesmo portal aceita
+MAX_WORKERS_POR_HOST = 2
+# Política de educação por portal: 1 requisição a cada 4s, sem rajadas
+REQUISICOES_POR_SEGUNDO_POR_HOST = 0.25
+RAJADA_POR_HOST = 1
+# Documentos hospedados no CDN do Querido Diário têm um .txt gêmeo (mesma URL, outra extensão)
+HOSTS_CDN_QD = ("querido-diario.nyc3.cdn.digitaloceanspaces.com",)
+# Com o .txt do QD em mãos, o PDF só é baixado se isto estiver ligado (ou se o .txt falhar)
+BAIXAR_PDF_DO_QD = False
+# Tentativas por documento quando a conexão cai no meio; cada uma continua do .parcial
+TENTATIVAS_RETOMADA = 3
+# Erros de transferência que valem uma nova tentativa com Range
+ERROS_RETOMAVEIS = (
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    DownloadIncompleto,
+)
+# Respostas 4xx que ainda valem uma nova tentativa numa próxima execução (as outras são link quebrado)
+STATUS_4XX_PASSAGEIROS = {408, 425, 429}
+
+
+class TokenBucket:
+    """Balde de fichas: repõe `taxa` fichas por segundo até o limite de `capacidade`.
+
+    Cada requisição consome uma ficha; sem ficha disponível, a thread dorme
+    apenas o tempo necessário para a próxima ser reposta.
+    """
+
+    def __init__(self, taxa: float, capacidade: int = 1):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self._fichas = float(capacidade)
+        self._ultima_reposicao = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                decorrido = agora - self._ultima_reposicao
+                self._fichas = min(self.capacidade, self._fichas + decorrido * self.taxa)
+                self._ultima_reposicao = agora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.taxa
+            time.sleep(espera)
+
+
+class Host:
+    """Estado compartilhado de um portal: sessão, balde de fichas e aquecimento único."""
+
+    def __init__(self, origin: str | None):
+        self.origin = origin
+        self.bucket = TokenBucket(REQUISICOES_POR_SEGUNDO_POR_HOST, RAJADA_POR_HOST)
+        self.slots = threading.BoundedSemaphore(MAX_WORKERS_POR_HOST)
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        # com HTTP_GRAVACAO=gravar/reproduzir, as respostas vêm das fixtures (ver gravacao_http.py)
+        adapter = montar_adaptador(pool_connections=1, pool_maxsize=MAX_WORKERS_POR_HOST)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._aquecido = False
+        self._lock_aquecimento = threading.Lock()
+
+    def aquecer(self):
+        """Visita a origem uma única vez por execução, para obter cookies do portal."""
+        if self._aquecido or not self.origin:
+            return
+        with self._lock_aquecimento:
+            if self._aquecido:
+                return
+            try:
+                self.bucket.acquire()
+                self.session.get(self.origin, timeout=(5, 15))
+            except requests.exceptions.RequestException as e:
+                logging.warning(f" - Falha ao aquecer {self.origin}: {e}")
+            self._aquecido = True
+
+    def get(self, url: str, **kwargs):
+        self.bucket.acquire()
+        return self.session.get(url, **kwargs)
+
+
+class Hosts:
+    """Registro thread-safe de `Host` por origem (scheme://netloc)."""
+
+    def __init__(self):
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def para(self, url: str) -> Host:
+        parsed = urlparse(url)
+        origin = f"{parsed.scheme}://{parsed.netloc}" if parsed.scheme and parsed.netloc else None
+        with self._lock:
+            if origin not in self._hosts:
+                self._hosts[origin] = Host(origin)
+            return self._hosts[origin]
+
+
+def host_da_url(url: str):
+    parsed = urlparse(url)
+    return parsed.netloc or None
+
+
+def listar_tarefas(directory: str):
+    """Percorre os validado_*.csv das leis e devolve uma tarefa por linha com regulamentação encontrada."""
+    tarefas = []
+    for entry in os.scandir(directory):
+        if entry.name in laws and entry.is_dir():
+            for local_file in os.scandir(entry):
+                file_name, file_extension = os.path.splitext(local_file.name)
+                if file_extension == ".csv" and file_name.startswith("validado"):
+                    with open(local_file.path, mode ='r') as file:
+                        csvFile = csv.DictReader(file)
+                        for lines in csvFile:
+
+                            # --- detectar dinamicamente a coluna de Sim ou Não ---
+                            coluna_encontrou = None
+                            for key in lines.keys():
+                                # normaliza acentuação e maiúsculas para comparação robusta
+                                if "encontrou regulamentacao" in unidecode(key).lower():
+                                    coluna_encontrou = key
+                                    break
+
+                            # obtém o valor (sim/não) e só prossegue se contiver "sim"
+                            resposta = (lines.get(coluna_encontrou) or "").strip().lower()
+                            if not resposta.startswith("sim"):
+                                continue
+
+                            file_source = (lines.get('Se sim, link da regulamentação') or '').strip()
+                            if not file_source:
+                                continue
+
+                            tarefas.append({
+                                "lei": entry.name,
+                                "url": file_source,
+                                "nome": lines["Nome"],
+                                "download_directory": os.path.join(
+                                    directory, entry.name, lines["Capital / Estado"].lower(), "dados_brutos"
+                                ),
+                            })
+    return tarefas
+
+
+def intercalar_por_host(tarefas):
+    """Reordena as tarefas em rodízio entre portais.
+
+    Assim as threads do pool não ficam todas presas esperando o balde
+    de um único portal enquanto outros estão livres.
+    """
+    filas = defaultdict(deque)
+    for tarefa in tarefas:
+        filas[host_da_url(tarefa["url"])].append(tarefa)
+
+    intercaladas = []
+    while filas:
+        for host in list(filas):
+            intercaladas.append(filas[host].popleft())
+            if not filas[host]:
+                del filas[host]
+    return intercaladas
+
+
+def url_txt_do_qd(url: str):
+    """URL do .txt gêmeo de um PDF do CDN do Querido Diário, ou None se a URL não for de lá."""
+    parsed = urlparse(url)
+    if parsed.netloc.lower() not in HOSTS_CDN_QD or not parsed.path.lower().endswith(".pdf"):
+        return None
+    return parsed._replace(path=parsed.path[:-len(".pdf")] + ".txt").geturl()
+
+
+def tarefa_txt_do_qd(tarefa: dict) -> dict:
+    """A tarefa do .txt gêmeo: mesma nomenclatura, salvo direto em dados_extraidos."""
+    return {
+        **tarefa,
+        "url": url_txt_do_qd(tarefa["url"]),
+        "download_directory": os.path.join(os.path.dirname(tarefa["download_directory"]), "dados_extraidos"),
+    }
+
+
+def escolher_extensao(response, file_source: str) -> str:
+    # usa a URL final pós-redirecionamento (response.url)
+    final_url = (response.url or file_source).lower()
+    if final_url.endswith(".pdf"):
+        return "pdf"
+    if final_url.endswith((".html", ".htm")):
+        return "html"
+    if final_url.endswith(".txt"):
+        return "txt"
+    # Usando o Content-Type como evidência
+    ct = (response.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+    if ct == "application/pdf":
+        return "pdf"
+    if ct in ("text/html", "application/xhtml+xml"):
+        return "html"
+    if ct == "text/plain":
+        return "txt"
+    # Se der ruim...
+    return "bin"
+
+
+def caminho_destino(tarefa: dict, extension: str) -> str:
+    output_file = f"{unidecode(tarefa['nome'].split()[0])}_{tarefa['lei']}.{extension}"
+    return os.path.join(tarefa["download_directory"], output_file)
+
+
+def transferir(tarefa: dict, host: Host, manifesto: Manifesto, parcial: DownloadParcial):
+    """Uma tentativa de download de `tarefa` para o .parcial; devolve o caminho salvo.
+
+    Se o manifesto já conhece a URL, a requisição é condicional; um 304 só
+    refaz o link do objeto já armazenado, sem transferir o corpo de novo.
+    Se sobrou um .parcial de uma tentativa anterior, pede só o restante.
+    """
+    file_source = tarefa["url"]
+    registro = manifesto.buscar(file_source)
+    condicionais = manifesto.cabecalhos_condicionais(file_source) if registro else {}
+    response = host.get(
+        file_source,
+        # sem compressão, para o Content-Length valer para os bytes gravados e o Range ser em bytes do arquivo
+        headers={"Accept-Encoding": "identity", **condicionais, **parcial.cabecalhos()},
+        stream=True,
+        timeout=(5, 60),
+        allow_redirects=True,
+    )
+    with response:
+        anotar(status_http=response.status_code)
+
+        if response.status_code == 304 and not condicionais:
+            # alguns proxies respondem 304 sem a requisição ter validadores: não há o que reaproveitar
+            raise requests.exceptions.HTTPError(f"304 sem requisição condicional: {file_source}", response=response)
+
+        if response.status_code == 304:
+            full_save_path = caminho_destino(tarefa, registro["extensao"])
+            manifesto.vincular(registro["sha256"], full_save_path)
+            parcial.descartar()
+            anotar(bytes=0, destino=full_save_path)
+            logging.info(f" - NOT MODIFIED, kept: {full_save_path}")
+            return full_save_path
+
+        if response.status_code == 416:
+            # o .parcial não corresponde mais ao arquivo do servidor
+            parcial.descartar()
+            raise DownloadIncompleto("faixa recusada pelo servidor (416)")
+
+        response.raise_for_status()
+
+        extension = escolher_extensao(response, file_source)
+        full_save_path = caminho_destino(tarefa, extension)
+
+        # mesmo ETag do registro: o conteúdo tem de bater com o SHA-256 já conhecido
+        etag = response.headers.get("ETag")
+        mesmo_etag = registro and etag and etag == registro["etag"]
+        parcial.sha256_esperado = registro["sha256"] if mesmo_etag else None
+        parcial.iniciar(response.status_code, response.headers)
+        if parcial.retomado_de:
+            anotar(retomado_de=parcial.retomado_de)
+            logging.info(f" - RESUMING at byte {parcial.retomado_de}: {file_source}")
+
+        for chunk in response.iter_content(chunk_size=parcial.buffer):
+            parcial.escrever(chunk)
+        sha256, tamanho = parcial.concluir()
+
+    manifesto.adotar(parcial.caminho, sha256)
+    manifesto.vincular(sha256, full_save_path)
+    manifesto.registrar(
+        file_source,
+        response.url,
+        response.headers.get("ETag"),
+        response.headers.get("Last-Modified"),
+        tamanho,
+        sha256,
+        extension,
+    )
+    anotar(bytes=tamanho - parcial.retomado_de, destino=full_save_path)
+    return full_save_path
+
+
+def baixar(tarefa: dict, hosts: Hosts, manifesto: Manifesto, copias=()):
+    """Baixa o documento de uma tarefa respeitando o limite do portal.
+
+    O corpo vai em streaming para um .parcial no cache e só é ligado em
+    dados_brutos depois de conferidos o Content-Length e, se o manifesto
+    conhece o arquivo, o SHA-256. Uma queda no meio é retomada com Range,
+    aqui mesmo ou na próxima execução. As `copias` (tarefas com a mesma URL)
+    recebem um link do mesmo objeto. Devolve os caminhos salvos, o da tarefa
+    primeiro, ou uma lista vazia.
+    """
+    file_source = tarefa["url"]
+    host = hosts.para(file_source)
+    parcial = DownloadParcial(manifesto.caminho_parcial(file_source))
+
+    with perfilar("download"), medir_arquivo("download", file_source, lei=tarefa["lei"], tentativas=0) as evento:
+        try:
+            with host.slots:
+                host.aquecer()
+                for tentativa in range(TENTATIVAS_RETOMADA):
+                    acumular("tentativas")
+                    try:
+                        full_save_path = transferir(tarefa, host, manifesto, parcial)
+                        break
+                    except ERROS_RETOMAVEIS as e:
+                        parcial.descartar_arquivo_aberto()
+                        if tentativa == TENTATIVAS_RETOMADA - 1:
+                            raise
+                        logging.warning(f" - INTERRUPTED ({e}), retrying: {file_source}")
+            logging.info(f" - OK Downloaded to: {full_save_path}")
+            manifesto.anotar_situacao(file_source, SITUACAO_OK)
+            caminhos = [full_save_path]
+            if copias:
+                extension = os.path.splitext(full_save_path)[1][1:]
+                sha256 = manifesto.buscar(file_source)["sha256"]
+                for copia in copias:
+                    caminhos.append(caminho_destino(copia, extension))
+                    manifesto.vincular(sha256, caminhos[-1])
+                    logging.info(f" - OK Linked same URL to: {caminhos[-1]}")
+            return caminhos
+
+        except DownloadIncompleto as e:
+            evento["erro"] = f"incompleto: {e}"
+            logging.error(f" - INCOMPLETE download, partial kept for resuming: {e}")
+
+        except DownloadCorrompido as e:
+            evento["erro"] = f"corrompido: {e}"
+            logging.error(f" - CORRUPT download discarded: {e}")
+
+        except requests.exceptions.RequestException as e:
+            evento["erro"] = f"rede: {e}"
+            logging.error(f" - NETWORK Error downloading PDF: {e}")
+
+        except IOError as e:
+            evento["erro"] = f"escrita: {e}"
+            logging.error(f" - WRITE Error saving PDF file: {e}")
+
+        except Exception as e:
+            evento["erro"] = f"{type(e).__name__}: {e}"
+            logging.exception(f" - UKNOWN ERROR {e}")
+        finally:
+            parcial.descartar_arquivo_aberto()
+
+    situacao = SITUACAO_PERMANENTE if falha_permanente(evento.get("status_http")) else SITUACAO_TEMPORARIA
+    manifesto.anotar_situacao(file_source, situacao, evento.get("erro"))
+    return []
+
+
+def falha_permanente(status_http) -> bool:
+    """Um 4xx (fora os de espera, como 429) não muda tentando de novo: o link está quebrado ou não é público."""
+    return status_http is not None and 400 <= status_http < 500 and status_http not in STATUS_4XX_PASSAGEIROS
+
+
+def tarefa_resolvida(tarefa: dict, manifesto: Manifesto) -> bool:
+    """Se a última tentativa da tarefa trouxe o documento (o .txt do QD ou o original) ou falhou de vez."""
+    urls = [url for url in (url_txt_do_qd(tarefa["url"]), tarefa["url"]) if url]
+    situacoes = [manifesto.situacao(url) for url in urls]
+    if SITUACAO_OK in situacoes:
+        return True
+    tentadas = [situacao for situacao in situacoes if situacao is not None]
+    return bool(tentadas) and all(situacao == SITUACAO_PERMANENTE for situacao in tentadas)
+
+
+def baixar_tarefa(tarefa: dict, hosts: Hosts, manifesto: Manifesto, baixar_pdf_do_qd: bool = BAIXAR_PDF_DO_QD,
+                  copias=()):
+    """Baixa uma tarefa e as suas `copias` (mesma URL); devolve os caminhos principais salvos, um por tarefa.
+
+    Um PDF do CDN do Querido Diário vira o download do seu .txt gêmeo direto
+    em dados_extraidos, sem passar pela extração nem pelo OCR. O PDF só vem
+    junto com `baixar_pdf_do_qd`, ou no lugar do .txt se ele não existir.
+    """
+    if not url_txt_do_qd(tarefa["url"]):
+        return baixar(tarefa, hosts, manifesto, copias)
+    caminhos_txt = baixar(tarefa_txt_do_qd(tarefa), hosts, manifesto, [tarefa_txt_do_qd(c) for c in copias])
+    if not caminhos_txt:
+        logging.warning(f" - QD text twin unavailable, falling back to PDF: {tarefa['url']}")
+    if not caminhos_txt or baixar_pdf_do_qd:
+        caminhos_pdf = baixar(tarefa, hosts, manifesto, copias)
+        return caminhos_txt or caminhos_pdf
+    return caminhos_txt
+
+
+def baixar_todos(tarefas, max_workers: int = MAX_WORKERS, pasta_cache: str = cache_directory,
+                 baixar_pdf_do_qd: bool = BAIXAR_PDF_DO_QD):
+    """Distribui as tarefas num pool limitado de threads; portais diferentes baixam em paralelo.
+
+    Tarefas com a mesma URL (linhas do validado que apontam para o mesmo
+    documento) viram um único download, ligado depois a cada destino: duas
+    threads nunca gravam o mesmo .parcial. Devolve um caminho por tarefa
+    bem-sucedida (o .txt, para documentos do Querido Diário).
+    """
+    hosts = Hosts()
+    manifesto = Manifesto(pasta_cache)
+    por_url = defaultdict(list)
+    for tarefa in tarefas:
+        por_url[tarefa["url"]].append(tarefa)
+    baixados = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futuros = [
+            executor.submit(baixar_tarefa, tarefa, hosts, manifesto, baixar_pdf_do_qd, por_url[tarefa["url"]][1:])
+            for tarefa in intercalar_por_host([grupo[0] for grupo in por_url.values()])
+        ]
+        for futuro in as_completed(futuros):
+            baixados.extend(futuro.result())
+    return baixados
+
+
+def main():
+    # Configuração básica do logger
+    logging.basicConfig(
+        level=logging.INFO,  # Níveis: DEBUG, INFO, WARNING, ERROR, CRITICAL
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        handlers=[
+            logging.FileHandler("download_regulamentacoes.log", encoding="utf-8"),
+            logging.StreamHandler()
+        ]
+    )
 
+    tarefas = listar_tarefas(directory)
+    inicio = time.monotonic()
+    baixados = baixar_todos(tarefas)
+    logging.info(
+        f"{len(baixados)}/{len(tarefas)} documentos baixados em {time.monotonic() - inicio:.1f}s"
+    )
 
-for entry in os.scandir(directory):
-    if entry.name in laws and entry.is_dir():
-        for local_file in os.scandir(entry):
-            file_name, file_extension = os.path.splitext(local_file.name)
-            if file_extension == ".csv":
-                with open(local_file.path, mode ='r') as file:
-                    csvFile = csv.DictReader(file)
-                    for lines in csvFile:
-                        
-                        # --- detectar dinamicamente a coluna de Sim ou Não ---
-                        coluna_encontrou = None
-                        for key in lines.keys():
-                            # normaliza acentuação e maiúsculas para comparação robusta
-                            if "encontrou regulamentacao" in unidecode(key).lower():
-                                coluna_encontrou = key
-                                break
-
-                        # obtém o valor (sim/não) e só prossegue se contiver "sim"
-                        resposta = (lines.get(coluna_encontrou) or "").strip().lower()
-                        if not resposta.startswith("sim"):
-                            continue
-
-                        # agora sim, processa o link
-                        file_source = (lines.get('Se sim, link da regulamentação') or '').strip()
-                        #print(file_source)
-                        
-                        download_directory = f'./{entry.name}/{lines["Capital / Estado"].lower()}/dados_brutos'
-
-                        try:
-                            # colocando headers para não ficarem pistola...
-                            parsed = urlparse(file_source)
-                            origin = f"{parsed.scheme}://{parsed.netloc}" if parsed.scheme and parsed.netloc else None
-                            req_headers = {}
-                            if origin:
-                                #req_headers["Referer"] = origin
-                                session.get(origin, timeout=(5, 15))
-                                time.sleep(4)
-
-                            time.sleep(4) # soneca básica para não sobrecarregar...
-                            response = session.get(
-                                file_source,
-                                headers=req_headers,
-                                stream=True,
-                                timeout=(5, 60),
-                                allow_redirects=True,
-                            )
-                            response.raise_for_status()
-
-                            #response = requests.get(file_source, stream=True, timeout=(5, 60))
-                            #response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-
-                            # decidndo qual extensão usar
-                            # usa a URL final pós-redirecionamento (response.url)
-                            final_url = (response.url or file_source).lower()
-                            if final_url.endswith(".pdf"):
-                                extension = "pdf"
-                            elif final_url.endswith((".html", ".htm")):
-                                extension = "html"
-                            else:
-                                # Usando o Content-Type como evidência
-                                ct = (response.headers.get("Content-Type") or "").split(";")[0].strip().lower()
-                                if ct == "application/pdf":
-                                    extension = "pdf"
-                                elif ct in ("text/html", "application/xhtml+xml"):
-                                    extension = "html"
-                                else:
-                                    # Se der ruim...
-                                    extension = "bin"
-
-                            output_file = f"{unidecode(lines['Nome'].split()[0])}_{entry.name}.{extension}"
-                            full_save_path = os.path.join(download_directory, output_file)
-                            response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-
-
-                            with open(full_save_path, 'wb') as save_file:
-                                for chunk in response.iter_content(chunk_size=8192):
-                                    save_file.write(chunk)
-                            logging.info(f" - OK Downloaded to: {full_save_path}")
-
-                        #except requests.exceptions.RequestException as e:
-                        #    print(f"Error downloading PDF: {e}")
-                        #except IOError as e:
-                        #    print(f"Error saving PDF file: {e}")
-
-                        
-                        except requests.exceptions.RequestException as e:
-                            logging.error(f" - NETWORK Error downloading PDF: {e}")
-
-                        except IOError as e:
-                            logging.error(f" - WRITE Error saving PDF file: {e}")
-
-                        except Exception as e:
-                            logging.exception(f" - UKNOWN ERROR {e}")
-
-                        
-
-                        
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+import os
+import sys
+import zlib
+import sqlite3
+import hashlib
+import argparse
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+# Detecção de documentos duplicados e quase duplicados em dados_brutos e
+# dados_extraidos: a mesma regulamentação baixada para mais de uma lei ou
+# território, ou publicada no portal do estado e no diário oficial.
+#
+#   python duplicatas.py                  # relatório em identificador/resultados/duplicatas.csv
+#   python duplicatas.py --limiar 0.9
+#
+# Cada documento (<LEI>/<tipo>/<nome>, com o bruto e/ou o .txt) ganha uma
+# impressão: SHA-256 do bruto, SHA-256 do texto normalizado e uma assinatura
+# MinHash dos shingles de palavras do texto. Documentos com o mesmo bruto, o
+# mesmo texto ou similaridade de Jaccard estimada acima do limiar (candidatos
+# achados por LSH, sem comparar todos os pares) caem no mesmo grupo. As
+# impressões ficam em cache por caminho, tamanho e mtime.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, "identificador"))
+
+from indice import tokenizar_sombra
+from sombra import Sombras, descartar_outra_versao
+
+LEIS = ["LAI", "LGD", "LGPD", "MROSC"]
+TIPOS = ["capital", "estado"]
+
+CAMINHO_DB = os.path.join(BASE_DIR, ".cache", "duplicatas.sqlite")
+CAMINHO_RELATORIO = os.path.join(BASE_DIR, "identificador", "resultados", "duplicatas.csv")
+
+# Shingles de 5 palavras; 128 permutações em 16 bandas de 8 linhas: pares com
+# Jaccard acima de ~0,7 quase sempre viram candidatos, abaixo de ~0,5 quase nunca
+TAMANHO_SHINGLE = 5
+NUM_PERMUTACOES = 128
+BANDAS = 16
+LINHAS_POR_BANDA = NUM_PERMUTACOES // BANDAS
+LIMIAR_SIMILARIDADE = 0.8
+# Quantos shingles entram de uma vez no cálculo da assinatura (limita a matriz permutações x shingles)
+BLOCO_SHINGLES = 16384
+CHUNK_SIZE = 1024 * 1024
+
+# Reaproveitamento de resultados entre documentos de um grupo
+REUSO_DESLIGADO = "off"
+REUSO_EXATO = "exatas"
+REUSO_QUASE = "quase"
+MODOS_REUSO = [REUSO_DESLIGADO, REUSO_EXATO, REUSO_QUASE]
+
+_PRIMO = np.uint64((1 << 61) - 1)
+# Permutações h(x) = (a*x + b) mod p fixas: as assinaturas do cache continuam comparáveis entre execuções
+_sorteio = np.random.RandomState(20240601)
+_A = _sorteio.randint(1, 1 << 32, NUM_PERMUTACOES, dtype=np.uint64).reshape(-1, 1)
+_B = _sorteio.randint(0, 1 << 32, NUM_PERMUTACOES, dtype=np.uint64).reshape(-1, 1)
+
+
+# -------------------------------------------------------------------
+# Impressões
+# -------------------------------------------------------------------
+def sha256_arquivo(caminho):
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(CHUNK_SIZE), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def shingles(termos):
+    """Hashes (32 bits, sem repetição) das sequências de TAMANHO_SHINGLE termos; textos curtos viram um shingle só."""
+    if not termos:
+        return np.zeros(0, dtype=np.uint64)
+    hashes = np.fromiter((zlib.crc32(termo.encode("utf-8")) for termo in termos), dtype=np.uint64, count=len(termos))
+    k = min(TAMANHO_SHINGLE, len(hashes))
+    combinados = hashes[:len(hashes) - k + 1].copy()
+    for deslocamento in range(1, k):
+        # a multiplicação transborda de propósito (aritmética módulo 2^64)
+        combinados = combinados * np.uint64(1000003) + hashes[deslocamento:len(hashes) - k + 1 + deslocamento]
+    return np.unique((combinados ^ (combinados >> np.uint64(32))) & np.uint64(0xFFFFFFFF))
+
+
+def assinatura(valores):
+    """Assinatura MinHash: o menor (a*x + b) mod p de cada permutação sobre os shingles."""
+    minimos = np.full(NUM_PERMUTACOES, np.iinfo(np.uint64).max, dtype=np.uint64)
+    for inicio in range(0, len(valores), BLOCO_SHINGLES):
+        bloco = valores[inicio:inicio + BLOCO_SHINGLES].reshape(1, -1)
+        minimos = np.minimum(minimos, ((_A * bloco + _B) % _PRIMO).min(axis=1))
+    return minimos
+
+
+def similaridade(assinatura_a, assinatura_b):
+    """Jaccard estimado: fração das permutações com o mesmo mínimo."""
+    return float(np.mean(assinatura_a == assinatura_b))
+
+
+def impressao_texto(sombra):
+    """(SHA-256 do texto normalizado, assinatura MinHash) da sombra de um .txt."""
+    termos = [termo for termo, _, _ in tokenizar_sombra(sombra)]
+    sha_texto = hashlib.sha256(" ".join(termos).encode("utf-8")).hexdigest()
+    return sha_texto, assinatura(shingles(termos))
+
+
+class Impressoes:
+    """Cache (SQLite) das impressões por arquivo, recalculadas só quando mudam tamanho ou mtime."""
+
+    def __init__(self, caminho_db: str = CAMINHO_DB, sombras: Sombras | None = None):
+        os.makedirs(os.path.dirname(caminho_db), exist_ok=True)
+        self._conn = sqlite3.connect(caminho_db)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS impressoes (
+                caminho TEXT PRIMARY KEY,
+                mtime_ns INTEGER,
+                tamanho INTEGER,
+                sha256 TEXT,
+                sha256_texto TEXT,
+                assinatura BLOB
+            )
+            """
+        )
+        self._conn.commit()
+        descartar_outra_versao(self._conn, ["impressoes"])
+        self.sombras = sombras or Sombras()
+
+    def de(self, caminho, texto: bool):
+        """{"sha256", "sha256_texto", "assinatura"} do arquivo; as duas últimas só para texto."""
+        stat = os.stat(caminho)
+        linha = self._conn.execute(
+            "SELECT sha256, sha256_texto, assinatura FROM impressoes WHERE caminho = ? AND mtime_ns = ? AND tamanho = ?",
+            (caminho, stat.st_mtime_ns, stat.st_size),
+        ).fetchone()
+        if linha and (linha[2] is not None or not texto):
+            sha, sha_texto, blob = linha
+            return {"sha256": sha, "sha256_texto": sha_texto,
+                    "assinatura": np.frombuffer(blob, dtype=np.uint64) if blob is not None else None}
+
+        sha = sha256_arquivo(caminho)
+        sha_texto, valores = impressao_texto(self.sombras.de(caminho)) if texto else (None, None)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO impressoes VALUES (?, ?, ?, ?, ?, ?)",
+            (caminho, stat.st_mtime_ns, stat.st_size, sha, sha_texto, valores.tobytes() if valores is not None else None),
+        )
+        self._conn.commit()
+        return {"sha256": sha, "sha256_texto": sha_texto, "assinatura": valores}
+
+
+# -------------------------------------------------------------------
+# Agrupamento
+# -------------------------------------------------------------------
+def listar_documentos(base_dir: str = BASE_DIR, leis=LEIS):
+    """{<LEI>/<tipo>/<nome>: {"lei", "bruto", "txt"}} de todas as pastas dados_brutos e dados_extraidos."""
+    documentos = {}
+    for lei in leis:
+        for tipo in TIPOS:
+            for pasta, campo in (("dados_brutos", "bruto"), ("dados_extraidos", "txt")):
+                caminho_pasta = os.path.join(base_dir, lei, tipo, pasta)
+                if not os.path.isdir(caminho_pasta):
+                    continue
+                for entrada in sorted(os.scandir(caminho_pasta), key=lambda e: e.name):
+                    if not entrada.is_file() or (campo == "txt" and not entrada.name.endswith(".txt")):
+                        continue
+                    chave = f"{lei}/{tipo}/{os.path.splitext(entrada.name)[0]}"
+                    documento = documentos.setdefault(chave, {"lei": lei, "bruto": None, "txt": None})
+                    documento[campo] = entrada.path
+    return documentos
+
+
+class UniaoBusca:
+    def __init__(self, itens):
+        self.pai = {item: item for item in itens}
+
+    def raiz(self, item):
+        while self.pai[item] != item:
+            self.pai[item] = self.pai[self.pai[item]]
+            item = self.pai[item]
+        return item
+
+    def unir(self, a, b):
+        raiz_a, raiz_b = self.raiz(a), self.raiz(b)
+        if raiz_a != raiz_b:
+            # a menor chave fica como raiz, para os grupos saírem iguais entre execuções
+            raiz_a, raiz_b = sorted((raiz_a, raiz_b))
+            self.pai[raiz_b] = raiz_a
+
+
+def pares_candidatos(assinaturas):
+    """Pares de chaves que coincidem em ao menos uma banda da LSH."""
+    candidatos = set()
+    for banda in range(BANDAS):
+        baldes = defaultdict(list)
+        for chave, valores in assinaturas.items():
+            baldes[valores[banda * LINHAS_POR_BANDA:(banda + 1) * LINHAS_POR_BANDA].tobytes()].append(chave)
+        for chaves in baldes.values():
+            for i, a in enumerate(chaves):
+                for b in chaves[i + 1:]:
+                    candidatos.add((a, b) if a < b else (b, a))
+    return candidatos
+
+
+def agrupar(documentos, impressoes: Impressoes | None = None, limiar: float = LIMIAR_SIMILARIDADE,
+            quase: bool = True):
+    """Grupos de documentos duplicados: [{"representante", "membros": {chave: (relação, similaridade)}}].
+
+    A relação de cada membro com o representante é "bruto idêntico", "texto
+    idêntico" ou "quase idêntico"; só entram grupos com mais de um documento.
+    Sem `quase`, só as duplicatas exatas (mesmo bruto ou mesmo texto).
+    """
+    impressoes = impressoes or Impressoes()
+    por_documento = {}
+    for chave, documento in documentos.items():
+        por_documento[chave] = {
+            "bruto": impressoes.de(documento["bruto"], texto=False) if documento["bruto"] else None,
+            "txt": impressoes.de(documento["txt"], texto=True) if documento["txt"] else None,
+        }
+
+    uniao = UniaoBusca(documentos)
+    for campo, hash_campo in (("bruto", "sha256"), ("txt", "sha256_texto")):
+        primeiro = {}
+        for chave, impressao in por_documento.items():
+            if impressao[campo]:
+                uniao.unir(primeiro.setdefault(impressao[campo][hash_campo], chave), chave)
+
+    assinaturas = {chave: imp["txt"]["assinatura"] for chave, imp in por_documento.items() if imp["txt"]}
+    if quase:
+        for a, b in pares_candidatos(assinaturas):
+            if similaridade(assinaturas[a], assinaturas[b]) >= limiar:
+                uniao.unir(a, b)
+
+    grupos = defaultdict(list)
+    for chave in documentos:
+        grupos[uniao.raiz(chave)].append(chave)
+
+    resultado = []
+    for membros in grupos.values():
+        if len(membros) < 2:
+            continue
+        # representante: quem já tem texto, e entre esses o maior (mais conteúdo para reaproveitar)
+        representante = max(
+            sorted(membros),
+            key=lambda chave: os.path.getsize(documentos[chave]["txt"]) if documentos[chave]["txt"] else -1,
+        )
+        relacoes = {}
+        for chave in sorted(membros):
+            relacoes[chave] = relacao(por_documento[representante], por_documento[chave]) if chave != representante else ("representante", 1.0)
+        resultado.append({"representante": representante, "membros": relacoes})
+    return sorted(resultado, key=lambda grupo: grupo["representante"])
+
+
+def relacao(impressao_a, impressao_b):
+    """(relação, similaridade estimada) entre dois documentos do mesmo grupo."""
+    if impressao_a["bruto"] and impressao_b["bruto"] and impressao_a["bruto"]["sha256"] == impressao_b["bruto"]["sha256"]:
+        return "bruto idêntico", 1.0
+    if impressao_a["txt"] and impressao_b["txt"]:
+        if impressao_a["txt"]["sha256_texto"] == impressao_b["txt"]["sha256_texto"]:
+            return "texto idêntico", 1.0
+        return "quase idêntico", similaridade(impressao_a["txt"]["assinatura"], impressao_b["txt"]["assinatura"])
+    # ligado ao grupo por outro membro (ex.: sem texto ainda, mas com o mesmo bruto de alguém)
+    return "indireto", None
+
+
+def representantes_textos(arquivos, modo: str = REUSO_EXATO, impressoes: Impressoes | None = None,
+                          limiar: float = LIMIAR_SIMILARIDADE):
+    """{chave: chave do representante} para os .txt de `arquivos` ({chave: (caminho, lei)}).
+
+    Com REUSO_EXATO, só textos normalizados idênticos dividem o representante;
+    com REUSO_QUASE, também os quase idênticos (a busca roda no texto do
+    representante, então posições e trechos vêm dele).
+    """
+    if modo == REUSO_DESLIGADO:
+        return {chave: chave for chave in arquivos}
+    documentos = {chave: {"lei": lei, "bruto": None, "txt": caminho} for chave, (caminho, lei) in arquivos.items()}
+    mapa = {chave: chave for chave in arquivos}
+    for grupo in agrupar(documentos, impressoes, limiar, quase=modo == REUSO_QUASE):
+        for chave in grupo["membros"]:
+            mapa[chave] = grupo["representante"]
+    return mapa
+
+
+# -------------------------------------------------------------------
+# Relatório
+# -------------------------------------------------------------------
+def relatorio(documentos, grupos, caminho_csv: str = CAMINHO_RELATORIO):
+    """Grava um CSV com uma linha por documento duplicado e devolve o resumo."""
+    linhas = []
+    for numero, grupo in enumerate(grupos, start=1):
+        for chave, (tipo_relacao, valor) in grupo["membros"].items():
+            documento = documentos[chave]
+            linhas.append({
+                "Grupo": numero,
+                "Documento": chave,
+                "Lei": documento["lei"],
+                "Representante": grupo["representante"],
+                "Relacao": tipo_relacao,
+                "Similaridade": round(valor, 3) if valor is not None else None,
+                "Bytes Bruto": os.path.getsize(documento["bruto"]) if documento["bruto"] else None,
+                "Bytes TXT": os.path.getsize(documento["txt"]) if documento["txt"] else None,
+            })
+    colunas = ["Grupo", "Documento", "Lei", "Representante", "Relacao", "Similaridade", "Bytes Bruto", "Bytes TXT"]
+    df = pd.DataFrame(linhas, columns=colunas).astype({"Bytes Bruto": "Int64", "Bytes TXT": "Int64"})
+    os.makedirs(os.path.dirname(caminho_csv), exist_ok=True)
+    df.to_csv(caminho_csv, index=False, encoding="utf-8-sig")
+
+    redundantes = df[df["Relacao"] != "representante"]
+    return {
+        "documentos": len(documentos),
+        "grupos": len(grupos),
+        "redundantes": len(redundantes),
+        "bytes_redundantes": int(redundantes["Bytes Bruto"].fillna(redundantes["Bytes TXT"]).fillna(0).sum()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agrupa documentos duplicados e quase duplicados (MinHash/LSH).")
+    parser.add_argument("--limiar", type=float, default=LIMIAR_SIMILARIDADE, help="Jaccard mínimo para quase duplicatas")
+    parser.add_argument("--saida", default=CAMINHO_RELATORIO, help="CSV do relatório")
+    args = parser.parse_args()
+
+    documentos = listar_documentos()
+    grupos = agrupar(documentos, limiar=args.limiar)
+    resumo = relatorio(documentos, grupos, args.saida)
+    print(f"🧬 {resumo['documentos']} documentos, {resumo['grupos']} grupos de duplicatas, "
+          f"{resumo['redundantes']} documentos redundantes ({resumo['bytes_redundantes'] / (1024 * 1024):.1f} MB)")
+    print(f"✅ Relatório salvo em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,65 @@
 import os
+import re
+import sys
+import time
+import codecs
+import shutil
+import hashlib
+import argparse
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pymupdf
 from pdf2image import convert_from_path
 import pytesseract
+from PIL import Image
 from bs4 import BeautifulSoup
+from lxml import etree
+
+from cache_ocr import CacheOCR
+from metricas import acumular, medir_arquivo, perfilar, registrar_evento
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "identificador"))
+
+from sombra import Sombras
 
 POPPLER_PATH = "C:\\poppler-25.07.0\\Library\\bin"
 TESSERACT_PATH = "C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
 LAWS = ["LAI", "LGD", "LGPD", "MROSC"]
 TERRITORY_TYPES = ["capital","estado"]
 DIRECTORY = os.getcwd()
-DADOS_BRUTOS_DIRECTORY = "//dados_brutos"
-DADOS_EXTRAIDOS_DIRECTORY = "//dados_extraidos"
+DADOS_BRUTOS_DIRECTORY = "dados_brutos"
+DADOS_EXTRAIDOS_DIRECTORY = "dados_extraidos"
 MIN_TEXT_RATIO = 0.01
+# Processos usados na extração (1 = modo serial, sem pool)
+MAX_WORKERS = os.cpu_count() or 1
+# PDFs com mais páginas que isso são divididos em lotes de páginas entre os processos
+PAGINAS_POR_TAREFA = 20
+# Resolução usada para rasterizar páginas no OCR
+OCR_DPI = 200
+# "pymupdf" rasteriza direto por pixmap; "poppler" usa o pdf2image
+OCR_RENDERER = "pymupdf"
+# Quantas páginas o poppler rasteriza por chamada (limita a memória do OCR)
+OCR_JANELA_PAGINAS = 2
+OCR_LANG = "por"
+# Cache do OCR por página (None desliga) e seu tamanho máximo em bytes de texto
+OCR_CACHE_DIRECTORY = os.path.join(DIRECTORY, ".cache", "ocr")
+OCR_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Bytes lidos por vez do HTML; a detecção de charset olha só o início do arquivo
+HTML_CHUNK_SIZE = 64 * 1024
+HTML_SNIFF_SIZE = 4096
+# Tags cujo conteúdo não entra no texto (scripts, estilos, menus, cabeçalhos e rodapés do portal)
+HTML_BOILERPLATE_TAGS = {
+    "head", "script", "style", "noscript", "template", "iframe", "svg",
+    "nav", "header", "footer", "aside", "form", "button", "select",
+}
+HTML_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9_.:-]+)""", re.IGNORECASE)
+# Nomes que os navegadores tratam como windows-1252 (superconjunto do latin-1)
+HTML_CP1252_ALIASES = {"ascii", "latin-1", "iso8859-1", "cp1252"}
+# Bytes lidos por vez ao calcular o hash dos arquivos brutos
+HASH_CHUNK_SIZE = 1024 * 1024
 
 def html_to_text(html_path: str):
+    """Caminho antigo (árvore inteira do BeautifulSoup), mantido como referência para o --benchmark-html."""
     try:
         with open(html_path, 'r', encoding = 'utf-8') as file:
             content = file.read()
@@ -27,96 +73,542 @@ def html_to_text(html_path: str):
     except Exception as e:
         print(e)
 
-def save_text_to_file(content: str, full_file_path: str):
-    with open(full_file_path, 'w', encoding='utf_8') as text_output:
-        text_output.write(content)
+def detect_html_encoding(head: bytes):
+    """Charset do HTML a partir dos primeiros bytes: BOM, depois <meta charset>, depois UTF-8 se válido.
+
+    Devolve (encoding, tamanho_do_bom). Páginas declaradas como UTF-8 mas que
+    não decodificam como tal caem para windows-1252, como fazem os navegadores.
+    """
+    for bom, encoding in ((codecs.BOM_UTF8, "utf-8"), (codecs.BOM_UTF16_LE, "utf-16-le"), (codecs.BOM_UTF16_BE, "utf-16-be")):
+        if head.startswith(bom):
+            return encoding, len(bom)
+
+    encoding = None
+    match = HTML_META_CHARSET_RE.search(head[:HTML_SNIFF_SIZE])
+    if match:
+        try:
+            encoding = codecs.lookup(match.group(1).decode("ascii")).name
+        except LookupError:
+            encoding = None
+    if encoding in HTML_CP1252_ALIASES:
+        return "cp1252", 0
+    if encoding in (None, "utf-8"):
+        try:
+            codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+            return "utf-8", 0
+        except UnicodeDecodeError:
+            return "cp1252", 0
+    return encoding, 0
+
+class HtmlTextCollector:
+    """Alvo do parser do lxml: recebe os eventos de tag e texto sem montar a árvore.
+
+    Cada nó de texto sai numa linha, sem espaços nas pontas (como o
+    get_text(separator='\\n', strip=True) do caminho antigo), e o conteúdo
+    das tags de HTML_BOILERPLATE_TAGS é descartado.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self._buffer = []
+        self._skip_depth = 0
 
-def check_and_extract_text_from_pdf(full_file_path: str):
-    total_area = 0.0
-    total_text_area = 0.0
-    text_ratio = 0
-    text = ""
+    def _flush(self):
+        if self._buffer:
+            text = "".join(self._buffer).strip()
+            self._buffer = []
+            if text and not self._skip_depth:
+                self.lines.append(text + "\n")
 
+    def start(self, tag, attrib):
+        self._flush()
+        if self._skip_depth or tag in HTML_BOILERPLATE_TAGS:
+            self._skip_depth += 1
+
+    def end(self, tag):
+        self._flush()
+        if self._skip_depth:
+            self._skip_depth -= 1
+
+    def data(self, data):
+        self._buffer.append(data)
+
+    def close(self):
+        self._flush()
+
+    def take(self):
+        lines, self.lines = self.lines, []
+        return "".join(lines)
+
+def iter_html_text(html_path: str):
+    """Lê o HTML em blocos, decodifica com o charset detectado e gera o texto conforme o parser avança."""
+    collector = HtmlTextCollector()
+    parser = etree.HTMLParser(target=collector, remove_comments=True, remove_pis=True)
+    with open(html_path, 'rb') as file:
+        chunk = file.read(HTML_CHUNK_SIZE)
+        encoding, bom_size = detect_html_encoding(chunk)
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        chunk = chunk[bom_size:]
+        while chunk:
+            parser.feed(decoder.decode(chunk))
+            yield collector.take()
+            chunk = file.read(HTML_CHUNK_SIZE)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        parser.feed(tail)
+    parser.close()
+    yield collector.take()
+
+def extract_html_to_file(full_file_path: str, txt_path: str):
+    """Extrai o HTML para `txt_path` em streaming; False se falhar ou não sobrar texto."""
     try:
+        return save_text_stream(iter_html_text(full_file_path), txt_path)
+    except (OSError, LookupError, etree.Error) as e:
+        print(f"Erro ao extrair texto de arquivo html: {e}")
+        if os.path.exists(txt_path + ".parcial"):
+            os.remove(txt_path + ".parcial")
+        return False
+
+def extract_pdf_pages(full_file_path: str, first_page: int = 0, last_page: int | None = None):
+    """Lê as páginas [first_page, last_page) com uma única extração estruturada por página.
+
+    Texto e área coberta por texto saem dos mesmos blocos; devolve uma lista
+    [(texto_da_pagina, precisa_ocr)], em que precisa_ocr indica que a razão
+    área de texto / área da página ficou abaixo de MIN_TEXT_RATIO.
+    """
+    pages = []
+    with perfilar("extract"), pymupdf.open(full_file_path) as doc:
+        if last_page is None or last_page > doc.page_count:
+            last_page = doc.page_count
+        for page_num in range(first_page, last_page):
+            page = doc[page_num]
+            page_area = abs(page.rect)
+            text_parts = []
+            text_area = 0.0
+            for x0, y0, x1, y1, content, block_no, block_type in page.get_text("blocks"):
+                if block_type == 0:
+                    text_parts.append(content)
+                    text_area += (x1 - x0) * (y1 - y0)
+            text_ratio = text_area / page_area if page_area > 0 else 0
+            pages.append(("".join(text_parts), text_ratio < MIN_TEXT_RATIO))
+    acumular("paginas", len(pages))
+    return pages
+
+def ocr_runs(page_numbers):
+    """Agrupa páginas (base 0) em sequências contíguas [inicio, fim) de até PAGINAS_POR_TAREFA páginas."""
+    runs = []
+    for page_num in page_numbers:
+        if runs and runs[-1][1] == page_num and page_num - runs[-1][0] < PAGINAS_POR_TAREFA:
+            runs[-1][1] = page_num + 1
+        else:
+            runs.append([page_num, page_num + 1])
+    return [tuple(run) for run in runs]
+
+def render_pages(full_file_path: str, first_page: int, last_page: int, dpi: int = OCR_DPI, renderer: str = OCR_RENDERER):
+    """Rasteriza as páginas [first_page, last_page) (base 0) uma janela por vez, gerando imagens PIL.
+
+    Só a janela corrente fica em memória: uma página no PyMuPDF, até
+    OCR_JANELA_PAGINAS páginas no poppler.
+    """
+    if renderer == "pymupdf":
         with pymupdf.open(full_file_path) as doc:
-            for page_num, page in enumerate(doc):
-                text += page.get_text("text")
-                total_area += abs(page.rect)
-                text_blocks = page.get_text("blocks")
-                text_area = 0.0
-                for block in text_blocks:
-                    x0, y0, x1, y1, content, block_type, *rest = block
-                    if block_type == 0:
-                        rect = pymupdf.Rect(x0, y0, x1, y1)
-                        text_area += abs(rect)
-        
-                total_text_area += text_area
-        
-        if(total_area) > 0:
-            text_ratio = (total_text_area / total_area)
-
-        if(text_ratio >= MIN_TEXT_RATIO):
-            return text            
+            for page_num in range(first_page, last_page):
+                pixmap = doc[page_num].get_pixmap(dpi=dpi, colorspace=pymupdf.csGRAY, alpha=False)
+                yield Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples)
+                pixmap = None
+    else:
+        for window_first in range(first_page, last_page, OCR_JANELA_PAGINAS):
+            window_last = min(window_first + OCR_JANELA_PAGINAS, last_page)
+            images = convert_from_path(
+                full_file_path, dpi = dpi, poppler_path = POPPLER_PATH,
+                first_page = window_first + 1, last_page = window_last
+            )
+            while images:
+                yield images.pop(0)
 
+@lru_cache(maxsize=1)
+def ocr_cache():
+    """Cache de OCR do processo atual (cada processo do pool abre sua conexão)."""
+    if OCR_CACHE_DIRECTORY is None:
         return None
+    return CacheOCR(OCR_CACHE_DIRECTORY, OCR_CACHE_MAX_BYTES)
+
+@lru_cache(maxsize=1)
+def tesseract_version():
+    pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+    return str(pytesseract.get_tesseract_version())
+
+def iter_ocr_pages(full_file_path: str, first_page: int, last_page: int, dpi: int = OCR_DPI, renderer: str = OCR_RENDERER):
+    """OCR página a página de [first_page, last_page) (base 0), gerando o texto de cada página.
+
+    Páginas cuja imagem já passou pelo OCR (com o mesmo DPI, idioma e versão
+    do Tesseract) saem do cache sem chamar o Tesseract.
+    """
+    pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+    cache = ocr_cache()
+    for image in render_pages(full_file_path, first_page, last_page, dpi, renderer):
+        key = None
+        page_text = None
+        if cache is not None:
+            key = CacheOCR.chave(image.tobytes(), dpi, OCR_LANG, tesseract_version())
+            page_text = cache.buscar(key)
+        if page_text is None:
+            start = time.perf_counter()
+            page_text = pytesseract.image_to_string(image, lang=OCR_LANG)
+            acumular("segundos_ocr", time.perf_counter() - start)
+            if cache is not None:
+                cache.guardar(key, page_text)
+        else:
+            acumular("paginas_ocr_cache")
+        acumular("paginas_ocr")
+        yield page_text + "\n"
+        image.close()
+
+def ocr_pdf_pages(full_file_path: str, first_page: int, last_page: int, dpi: int = OCR_DPI, renderer: str = OCR_RENDERER):
+    """Lista com o texto OCR de cada página; usada pelos processos do pool."""
+    with perfilar("extract"):
+        return list(iter_ocr_pages(full_file_path, first_page, last_page, dpi, renderer))
+
+def fill_ocr_pages(texts: list, first_page: int, ocr_texts_by_run: dict):
+    """Substitui em `texts` (que começa na página `first_page`) as sequências que passaram pelo OCR."""
+    for (first, last), ocr_texts in ocr_texts_by_run.items():
+        if ocr_texts is not None and len(ocr_texts) == last - first:
+            texts[first - first_page:last - first_page] = ocr_texts
+    return texts
+
+def iter_pdf_text(full_file_path: str, pages: list, first_page: int = 0, dpi: int = OCR_DPI, renderer: str = OCR_RENDERER):
+    """Gera, em ordem, o texto de cada página de `pages` (que começa em `first_page`).
+
+    Páginas com texto saem direto da extração; as digitalizadas passam pelo
+    OCR uma a uma, assim que chega a vez delas.
+    """
+    ocr_pages = [first_page + index for index, (_, needs_ocr) in enumerate(pages) if needs_ocr]
+    if ocr_pages:
+        print(os.path.basename(full_file_path), f"{len(ocr_pages)} de {len(pages)} páginas sem texto, executando OCR")
+
+    page_num = first_page
+    for run_first, run_last in ocr_runs(ocr_pages):
+        for native_page in range(page_num, run_first):
+            yield pages[native_page - first_page][0]
+        page_num = run_first
+        try:
+            for page_text in iter_ocr_pages(full_file_path, run_first, run_last, dpi, renderer):
+                yield page_text
+                page_num += 1
+        except Exception as e:
+            print(f"Erro ao executar OCR em arquivo pdf: {e}")
+        # se o OCR falhar no meio da sequência, mantém o pouco texto nativo dessas páginas
+        for native_page in range(page_num, run_last):
+            yield pages[native_page - first_page][0]
+        page_num = run_last
+    for native_page in range(page_num, first_page + len(pages)):
+        yield pages[native_page - first_page][0]
+
+def save_text_stream(chunks, full_file_path: str):
+    """Grava os trechos em `full_file_path` conforme chegam.
+
+    A escrita vai para um arquivo .parcial renomeado só no final, para que
+    uma extração interrompida não seja tomada como concluída. Devolve False
+    (e não cria o .txt) se o texto todo for vazio.
+    """
+    partial_path = full_file_path + ".parcial"
+    has_text = False
+    with open(partial_path, 'w', encoding='utf_8') as text_output:
+        for chunk in chunks:
+            text_output.write(chunk)
+            text_output.flush()
+            has_text = has_text or chunk.strip() != ""
+    if not has_text:
+        os.remove(partial_path)
+        return False
+    os.replace(partial_path, full_file_path)
+    return True
 
+def extract_pdf_to_file(full_file_path: str, txt_path: str, page_range: tuple | None = None,
+                        dpi: int = OCR_DPI, renderer: str = OCR_RENDERER):
+    """Extrai o PDF para `txt_path` página a página; só as páginas digitalizadas passam pelo OCR."""
+    first_page, last_page = page_range or (0, None)
+    try:
+        pages = extract_pdf_pages(full_file_path, first_page, last_page)
     except Exception as e:
         print(f"Erro ao extrair texto de arquivo pdf: {e}")
-        return None 
+        return False
+    return save_text_stream(iter_pdf_text(full_file_path, pages, first_page, dpi, renderer), txt_path)
 
-def convert_pdf_image_to_text(full_file_path: str):
-    pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
-    text = ""
+def extract_file(file_path: str, dados_extraidos_full_file_path: str, page_range: tuple | None = None,
+                 dpi: int = OCR_DPI, renderer: str = OCR_RENDERER):
+    """Extrai um arquivo bruto para .txt. Devolve (arquivo, erro); erro é None quando deu certo.
+
+    Cada arquivo gera um evento "extract" com duração, bytes, páginas e páginas com OCR.
+    """
+    file_format = os.path.splitext(file_path)[1].lstrip(".").lower()
+    with perfilar("extract"), medir_arquivo("extract", file_path, bytes=os.path.getsize(file_path), formato=file_format) as event:
+        file_name, error = convert_file(file_path, dados_extraidos_full_file_path, page_range, dpi, renderer)
+        if error:
+            event["erro"] = error
+    return file_name, error
+
+def convert_file(file_path: str, dados_extraidos_full_file_path: str, page_range: tuple | None = None,
+                 dpi: int = OCR_DPI, renderer: str = OCR_RENDERER):
+    file_name = os.path.basename(file_path)
+    file_extension = os.path.splitext(file_name)[1]
+    match file_extension:
+        case ".txt":
+            print(file_name, "Arquivo bruto já está em txt, apenas copiando para a pasta dados_extraidos")
+            shutil.copyfile(file_path, dados_extraidos_full_file_path)
+        case ".pdf":
+            print(file_name, "Convertendo pdf para txt")
+            if not extract_pdf_to_file(file_path, dados_extraidos_full_file_path, page_range, dpi, renderer):
+                return file_name, "Erro ao converter pdf"
+        case ".html" | ".htm":
+            print(file_name, "Convertendo html para txt")
+            if not extract_html_to_file(file_path, dados_extraidos_full_file_path):
+                return file_name, "Erro ao converter html"
+        case _:
+            return file_name, "Tipo de arquivo não identificado"
+    return file_name, None
+
+def list_pending_files(directory: str = DIRECTORY):
+    """Lista (arquivo_bruto, arquivo_txt) ainda sem extração; os que já têm .txt são pulados."""
+    pending = []
+    for entry in os.scandir(directory):
+        if(entry.name in LAWS):
+            for subentry in os.scandir(entry):
+                if(os.path.isdir(subentry) and subentry.name in TERRITORY_TYPES):
+                    dados_brutos_full_path = os.path.join(subentry.path, DADOS_BRUTOS_DIRECTORY)
+                    dados_extraidos_full_path = os.path.join(subentry.path, DADOS_EXTRAIDOS_DIRECTORY)
+                    if not os.path.isdir(dados_brutos_full_path):
+                        continue
+                    os.makedirs(dados_extraidos_full_path, exist_ok=True)
+                    for file in os.scandir(dados_brutos_full_path):
+                        file_name, file_extension = os.path.splitext(file.name)
+                        dados_extraidos_full_file_path = os.path.join(dados_extraidos_full_path, file_name + ".txt")
+                        if os.path.exists(dados_extraidos_full_file_path):
+                            print(file.name, "Extração do arquivo já realizada")
+                        else:
+                            pending.append((file.path, dados_extraidos_full_file_path))
+    return pending
+
+def page_batches(first_page: int, last_page: int):
+    return [(start, min(start + PAGINAS_POR_TAREFA, last_page)) for start in range(first_page, last_page, PAGINAS_POR_TAREFA)]
+
+def pdf_page_count(file_path: str):
     try:
-        images = convert_from_path(full_file_path, poppler_path = POPPLER_PATH)
-        for i, image in enumerate(images):
-            page_text = pytesseract.image_to_string(image, lang="por")
-            text += page_text + "\n"
+        with pymupdf.open(file_path) as doc:
+            return doc.page_count
+    except Exception:
+        return 0
 
-        return text 
+def extract_in_parallel(pending, max_workers: int = MAX_WORKERS, page_range: tuple | None = None,
+                        dpi: int = OCR_DPI, renderer: str = OCR_RENDERER):
+    """Extrai os arquivos pendentes num pool de processos.
 
-    except Exception as e:
-        print(f"Erro ao executar OCR em arquivo pdf: {e}")
-
-    
-
-for entry in os.scandir(DIRECTORY):
-    if(entry.name in LAWS):
-        for subentry in os.scandir(entry):
-            if(os.path.isdir(subentry) and subentry.name in TERRITORY_TYPES):
-                dados_brutos_full_path = subentry.path + "//" + DADOS_BRUTOS_DIRECTORY
-                dados_extraidos_full_path = subentry.path + "//" + DADOS_EXTRAIDOS_DIRECTORY
-                for file in os.scandir(dados_brutos_full_path):                    
-                    file_name, file_extension = os.path.splitext(file.name)
-                    dados_extraidos_full_file_path = dados_extraidos_full_path + "//" + file_name + ".txt"
-                    if os.path.exists(dados_extraidos_full_file_path):
-                        print(file.name, "Extração do arquivo já realizada")
-                    else:
-                        match file_extension:
-                            case ".txt":
-                                print(file.name, "Arquivo bruto já está em txt, apenas copiando para a pasta dados_extraidos")
-                            case ".pdf":
-                                print(file.name, "Convertendo pdf para txt")
-                                converted_text = check_and_extract_text_from_pdf(file.path)
-                                if converted_text == None or converted_text == "":
-                                    print(file.name, "Texto vazio, executando OCR")  
-                                    converted_text = convert_pdf_image_to_text(file.path)
-                                if converted_text != None and converted_text != "":
-                                    save_text_to_file(converted_text, dados_extraidos_full_file_path)
-                                else:
-                                    print(file.name, "Erro ao converter pdf")                                                           
-                            case ".html":
-                                print(file.name, "Convertendo html para txt")
-                                converted_text = html_to_text(file.path)
-                                save_text_to_file(converted_text, dados_extraidos_full_file_path)
-                            case ".htm":
-                                print(file.name, "Convertendo html para txt")
-                                converted_text = html_to_text(file.path)
-                                save_text_to_file(converted_text, dados_extraidos_full_file_path)
-                            case _:
-                                print(file.name, "Tipo de arquivo não identificado")
-
-
-
-    
-                                      
\ No newline at end of file
+    Arquivos pequenos viram uma tarefa cada; PDFs grandes são divididos em
+    lotes de PAGINAS_POR_TAREFA páginas, e depois só as sequências de páginas
+    digitalizadas vão para o OCR, também distribuídas entre os processos.
+    Resultados e erros são reunidos aqui e devolvidos como (extraídos, erros).
+    """
+    extracted = []
+    errors = []
+    large_pdfs = {}
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for file_path, txt_path in pending:
+            page_count = pdf_page_count(file_path) if file_path.endswith(".pdf") else 0
+            first_page = page_range[0] if page_range else 0
+            last_page = min(page_range[1], page_count) if page_range and page_range[1] else page_count
+            if last_page - first_page > PAGINAS_POR_TAREFA:
+                print(os.path.basename(file_path), f"Convertendo pdf para txt em lotes ({last_page - first_page} páginas)")
+                batches = page_batches(first_page, last_page)
+                large_pdfs[file_path] = {"txt_path": txt_path, "first_page": first_page, "parts": [None] * len(batches),
+                                         "start": time.perf_counter(), "started_at": time.time()}
+                for index, (first, last) in enumerate(batches):
+                    future = executor.submit(extract_pdf_pages, file_path, first, last)
+                    futures[future] = ("text", file_path, index)
+            else:
+                future = executor.submit(extract_file, file_path, txt_path, page_range, dpi, renderer)
+                futures[future] = ("file", file_path, None)
+
+        for future in as_completed(futures):
+            kind, file_path, index = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                errors.append((os.path.basename(file_path), str(e)))
+                large_pdfs.pop(file_path, None)
+                continue
+            if kind == "file":
+                file_name, error = result
+                if error:
+                    errors.append((file_name, error))
+                else:
+                    extracted.append(file_path)
+            elif file_path in large_pdfs:
+                large_pdfs[file_path]["parts"][index] = result
+
+        # PDFs grandes: junta os lotes e distribui o OCR só das páginas digitalizadas
+        ocr_futures = {}
+        for file_path, state in large_pdfs.items():
+            pages = [page for part in state["parts"] for page in part]
+            state["texts"] = [text for text, _ in pages]
+            state["ocr"] = {}
+            ocr_pages = [state["first_page"] + index for index, (_, needs_ocr) in enumerate(pages) if needs_ocr]
+            if ocr_pages:
+                print(os.path.basename(file_path), f"{len(ocr_pages)} de {len(pages)} páginas sem texto, executando OCR")
+            for first, last in ocr_runs(ocr_pages):
+                future = executor.submit(ocr_pdf_pages, file_path, first, last, dpi, renderer)
+                ocr_futures[future] = (file_path, (first, last))
+
+        for future in as_completed(ocr_futures):
+            file_path, run = ocr_futures[future]
+            try:
+                large_pdfs[file_path]["ocr"][run] = future.result()
+            except Exception as e:
+                errors.append((os.path.basename(file_path), f"Erro ao executar OCR em arquivo pdf: {e}"))
+
+    for file_path, state in large_pdfs.items():
+        texts = fill_ocr_pages(state["texts"], state["first_page"], state["ocr"])
+        saved = save_text_stream(texts, state["txt_path"])
+        # os lotes rodaram em outros processos: o evento do arquivo inteiro é montado aqui
+        registrar_evento({
+            "etapa": "extract",
+            "arquivo": file_path,
+            "pid": os.getpid(),
+            "formato": "pdf",
+            "bytes": os.path.getsize(file_path),
+            "paginas": len(state["texts"]),
+            "paginas_ocr": sum(len(run_texts) for run_texts in state["ocr"].values()),
+            "lotes": len(state["parts"]),
+            "inicio": state["started_at"],
+            "duracao": time.perf_counter() - state["start"],
+            **({} if saved else {"erro": "Erro ao converter pdf"}),
+        })
+        if not saved:
+            errors.append((os.path.basename(file_path), "Erro ao converter pdf"))
+            continue
+        extracted.append(file_path)
+
+    return extracted, errors
+
+def file_sha256(file_path: str):
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+def group_identical(pending, extracted_by_hash: dict | None = None):
+    """Separa os pendentes em (a extrair, cópias): de cada grupo de brutos com o mesmo conteúdo só um é extraído.
+
+    As cópias são (arquivo_bruto, arquivo_txt, txt_de_origem); a origem é o
+    .txt de outro pendente do grupo ou, se houver, um .txt já extraído de um
+    bruto idêntico (`extracted_by_hash`, {sha256 do bruto: txt}).
+    """
+    extracted_by_hash = dict(extracted_by_hash or {})
+    to_extract, copies, leaders = [], [], {}
+    for file_path, txt_path in pending:
+        sha = file_sha256(file_path)
+        if sha in extracted_by_hash and os.path.exists(extracted_by_hash[sha]):
+            copies.append((file_path, txt_path, extracted_by_hash[sha]))
+        elif sha in leaders:
+            copies.append((file_path, txt_path, leaders[sha]))
+        else:
+            leaders[sha] = txt_path
+            to_extract.append((file_path, txt_path))
+    return to_extract, copies
+
+def extract_all(pending, max_workers: int = MAX_WORKERS, page_range: tuple | None = None,
+                dpi: int = OCR_DPI, renderer: str = OCR_RENDERER, extracted_by_hash: dict | None = None):
+    """Extrai os pendentes (em série ou no pool) uma vez por conteúdo e copia o .txt para os brutos idênticos.
+
+    Cada .txt novo ganha sua sombra normalizada (identificador/sombra.py) para
+    as buscas do identificador. Devolve (extraídos, erros) como
+    extract_in_parallel; as cópias contam como extraídas.
+    """
+    to_extract, copies = group_identical(pending, extracted_by_hash)
+    if copies:
+        print(f"{len(copies)} arquivos idênticos a outros, reaproveitando o texto extraído")
+    if max_workers <= 1:
+        extracted, errors = [], []
+        for file_path, txt_path in to_extract:
+            file_name, error = extract_file(file_path, txt_path, page_range, dpi, renderer)
+            if error:
+                errors.append((file_name, error))
+            else:
+                extracted.append(file_path)
+    else:
+        extracted, errors = extract_in_parallel(to_extract, max_workers, page_range, dpi, renderer)
+
+    extracted_set = set(extracted)
+    available = {txt_path for file_path, txt_path in to_extract if file_path in extracted_set}
+    available.update((extracted_by_hash or {}).values())
+    for file_path, txt_path, source_txt in copies:
+        if source_txt not in available:
+            errors.append((os.path.basename(file_path), "Erro na extração do arquivo idêntico"))
+            continue
+        with medir_arquivo("extract", file_path, bytes=os.path.getsize(file_path), reaproveitado=True):
+            shutil.copyfile(source_txt, txt_path)
+        extracted.append(file_path)
+
+    txt_by_file = dict(pending)
+    sombras = Sombras()
+    sombras.atualizar(txt_by_file[file_path] for file_path in extracted)
+    sombras.podar()
+    return extracted, errors
+
+def list_html_files(directory: str = DIRECTORY):
+    return sorted(
+        os.path.join(root, name)
+        for law in LAWS
+        for root, _, names in os.walk(os.path.join(directory, law))
+        for name in names
+        if os.path.basename(root) == "dados_brutos" and name.lower().endswith((".html", ".htm"))
+    )
+
+def benchmark_html(directory: str = DIRECTORY, repeat: int = 5):
+    """Compara a vazão (MB/s) do extrator em streaming com o caminho antigo do BeautifulSoup nos HTMLs do repositório."""
+    files = list_html_files(directory)
+    total_mb = sum(os.path.getsize(path) for path in files) / (1024 * 1024)
+    paths = {
+        "BeautifulSoup": html_to_text,
+        "streaming (lxml)": lambda path: "".join(iter_html_text(path)),
+    }
+    print(f"{len(files)} arquivos HTML, {total_mb:.2f} MB, {repeat} repetições")
+    for name, extract in paths.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            chars = sum(len(extract(path) or "") for path in files)
+        elapsed = (time.perf_counter() - start) / repeat
+        print(f"{name}: {elapsed * 1000:.1f} ms por rodada, {total_mb / elapsed:.1f} MB/s, {chars} caracteres de texto")
+
+def parse_page_range(value: str):
+    """Converte "INICIO-FIM" (base 1, inclusivo; FIM opcional) em (inicio, fim) base 0 exclusivo."""
+    first, _, last = value.partition("-")
+    return int(first) - 1, int(last) if last else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Extrai o texto dos arquivos em dados_brutos para dados_extraidos.")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="processos de extração (1 = serial)")
+    parser.add_argument("--dpi", type=int, default=OCR_DPI, help="resolução da rasterização para OCR")
+    parser.add_argument("--renderer", choices=["pymupdf", "poppler"], default=OCR_RENDERER,
+                        help="como rasterizar as páginas para o OCR")
+    parser.add_argument("--paginas", type=parse_page_range, default=None,
+                        help="intervalo de páginas dos PDFs, ex.: 1-50 ou 10-")
+    parser.add_argument("--benchmark-html", action="store_true",
+                        help="só compara o extrator de HTML em streaming com o BeautifulSoup, sem extrair nada")
+    args = parser.parse_args()
+
+    if args.benchmark_html:
+        benchmark_html(DIRECTORY)
+        return
+
+    pending = list_pending_files(DIRECTORY)
+    extracted, errors = extract_all(pending, args.workers, args.paginas, args.dpi, args.renderer)
+
+    print(f"{len(extracted)} arquivos extraídos, {len(errors)} erros")
+    for file_name, error in errors:
+        print(file_name, error)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import io
+import os
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Gravação e reprodução das respostas HTTP dos scripts de coleta, para rodar
+# sem rede (testes, benchmarks, desenvolvimento offline).
+#
+#   HTTP_GRAVACAO=gravar python coleta.py        # vai à rede e grava cada resposta em fixtures/http
+#   HTTP_GRAVACAO=reproduzir python coleta.py    # responde só com o que foi gravado, sem rede
+#
+# Cada resposta vira <chave>.json (método, URL, status, cabeçalhos) e
+# <chave>.corpo (bytes já descomprimidos); a chave é o SHA-256 do método e da
+# URL com os parâmetros ordenados. Vale para o requests (coleta.py, pelo
+# adaptador) e para o aiohttp (ClienteQD, pela sessão envolvida).
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+GRAVAR = "gravar"
+REPRODUZIR = "reproduzir"
+# vazio desliga: as requisições vão direto à rede
+MODO = os.environ.get("HTTP_GRAVACAO", "")
+PASTA_FIXTURES = os.environ.get("HTTP_FIXTURES", os.path.join(BASE_DIR, "fixtures", "http"))
+
+# Não vão na gravação: a fixture guarda sempre a resposta completa, descomprimida
+CABECALHOS_NAO_ENVIADOS = ["Range", "If-Range", "If-None-Match", "If-Modified-Since", "Accept-Encoding"]
+CABECALHOS_NAO_GRAVADOS = {"content-encoding", "transfer-encoding", "content-length", "connection", "keep-alive"}
+
+
+class FixtureAusente(Exception):
+    """Requisição sem resposta gravada enquanto o modo de reprodução está ligado."""
+
+
+def normalizar_url(url: str, params=None) -> str:
+    """URL com os parâmetros (da query e de `params`) em ordem, para a mesma requisição dar a mesma chave."""
+    partes = urlsplit(url)
+    pares = parse_qsl(partes.query, keep_blank_values=True)
+    if params:
+        itens = params.items() if isinstance(params, dict) else params
+        for chave, valor in itens:
+            for v in (valor if isinstance(valor, (list, tuple)) else [valor]):
+                pares.append((chave, str(v)))
+    return urlunsplit((partes.scheme, partes.netloc, partes.path, urlencode(sorted(pares)), ""))
+
+
+class ArmazemFixtures:
+    """Pasta de respostas gravadas, uma por (método, URL normalizada)."""
+
+    def __init__(self, pasta: str = PASTA_FIXTURES):
+        self.pasta = pasta
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def chave(metodo: str, url: str) -> str:
+        return hashlib.sha256(f"{metodo.upper()} {url}".encode("utf-8")).hexdigest()[:32]
+
+    def buscar(self, metodo: str, url: str):
+        """(status, cabeçalhos, corpo, url_final) gravados; FixtureAusente se não houver."""
+        base = os.path.join(self.pasta, self.chave(metodo, url))
+        try:
+            with open(base + ".json", encoding="utf-8") as arquivo:
+                registro = json.load(arquivo)
+            with open(base + ".corpo", "rb") as arquivo:
+                corpo = arquivo.read()
+        except FileNotFoundError:
+            raise FixtureAusente(f"{metodo} {url} não foi gravada em {self.pasta}") from None
+        return registro["status"], registro["cabecalhos"], corpo, registro.get("url_final") or url
+
+    def guardar(self, metodo: str, url: str, status: int, cabecalhos, corpo: bytes, url_final: str | None = None):
+        base = os.path.join(self.pasta, self.chave(metodo, url))
+        registro = {
+            "metodo": metodo.upper(),
+            "url": url,
+            "url_final": url_final,
+            "status": status,
+            "cabecalhos": [[nome, valor] for nome, valor in cabecalhos.items() if nome.lower() not in CABECALHOS_NAO_GRAVADOS],
+            "gravado_em": time.time(),
+        }
+        with self._lock:
+            os.makedirs(self.pasta, exist_ok=True)
+            # corpo primeiro: um .json só existe com o corpo completo ao lado
+            with open(base + ".corpo.tmp", "wb") as arquivo:
+                arquivo.write(corpo)
+            os.replace(base + ".corpo.tmp", base + ".corpo")
+            with open(base + ".json.tmp", "w", encoding="utf-8") as arquivo:
+                json.dump(registro, arquivo, ensure_ascii=False, indent=1)
+            os.replace(base + ".json.tmp", base + ".json")
+
+
+# -------------------------------------------------------------------
+# requests
+# -------------------------------------------------------------------
+class AdaptadorGravacao(HTTPAdapter):
+    """HTTPAdapter que grava as respostas (GRAVAR) ou responde com as gravadas (REPRODUZIR).
+
+    Os redirecionamentos continuam a cargo da Session, então cada salto é uma fixture.
+    """
+
+    def __init__(self, modo: str, armazem: ArmazemFixtures | None = None, **kwargs):
+        super().__init__(**kwargs)
+        self.modo = modo
+        self.armazem = armazem or ArmazemFixtures()
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        url = normalizar_url(request.url)
+        if self.modo == REPRODUZIR:
+            status, cabecalhos, corpo, _ = self.armazem.buscar(request.method, url)
+            return self._resposta(request, status, cabecalhos, corpo)
+
+        for nome in CABECALHOS_NAO_ENVIADOS:
+            request.headers.pop(nome, None)
+        resposta = super().send(request, stream=True, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+        corpo = resposta.content
+        self.armazem.guardar(request.method, url, resposta.status_code, resposta.headers, corpo)
+        return self._resposta(request, resposta.status_code, list(resposta.headers.items()), corpo)
+
+    def _resposta(self, request, status, cabecalhos, corpo):
+        resposta = requests.Response()
+        resposta.status_code = status
+        resposta.headers = CaseInsensitiveDict(
+            [(nome, valor) for nome, valor in cabecalhos if nome.lower() not in CABECALHOS_NAO_GRAVADOS]
+        )
+        resposta.headers["Content-Length"] = str(len(corpo))
+        resposta.encoding = get_encoding_from_headers(resposta.headers)
+        resposta.raw = io.BytesIO(corpo)
+        resposta.url = request.url
+        resposta.request = request
+        resposta.connection = self
+        return resposta
+
+
+def montar_adaptador(modo: str = MODO, **kwargs) -> HTTPAdapter:
+    """O adaptador para `Session.mount`: o de gravação se o modo estiver ligado, senão o padrão."""
+    return AdaptadorGravacao(modo, **kwargs) if modo else HTTPAdapter(**kwargs)
+
+
+# -------------------------------------------------------------------
+# aiohttp
+# -------------------------------------------------------------------
+class _ConteudoGravado:
+    def __init__(self, corpo: bytes):
+        self._corpo = corpo
+
+    async def iter_chunked(self, tamanho: int):
+        for inicio in range(0, len(self._corpo), tamanho):
+            yield self._corpo[inicio:inicio + tamanho]
+
+
+class RespostaGravada:
+    """O pedaço da resposta do aiohttp que o ClienteQD usa: status, headers, read(), content e raise_for_status()."""
+
+    def __init__(self, metodo: str, url: str, status: int, cabecalhos, corpo: bytes):
+        from multidict import CIMultiDict, CIMultiDictProxy
+
+        cabecalhos = CIMultiDict(
+            (nome, valor) for nome, valor in cabecalhos if nome.lower() not in CABECALHOS_NAO_GRAVADOS
+        )
+        cabecalhos["Content-Length"] = str(len(corpo))
+        self.metodo = metodo
+        self.url = url
+        self.status = status
+        self.headers = CIMultiDictProxy(cabecalhos)
+        self.content = _ConteudoGravado(corpo)
+        self._corpo = corpo
+
+    async def read(self) -> bytes:
+        return self._corpo
+
+    def raise_for_status(self):
+        import aiohttp
+        from yarl import URL
+
+        if self.status >= 400:
+            info = aiohttp.RequestInfo(URL(self.url), self.metodo, self.headers, URL(self.url))
+            raise aiohttp.ClientResponseError(info, (), status=self.status, headers=self.headers)
+
+
+class _RequisicaoGravada:
+    def __init__(self, sessao: "SessaoGravada", url: str, params, headers):
+        self.sessao = sessao
+        self.url = normalizar_url(url, params)
+        self.headers = dict(headers or {})
+
+    async def __aenter__(self):
+        armazem = self.sessao.armazem
+        if self.sessao.modo == REPRODUZIR:
+            status, cabecalhos, corpo, _ = armazem.buscar("GET", self.url)
+            return RespostaGravada("GET", self.url, status, cabecalhos, corpo)
+
+        for nome in CABECALHOS_NAO_ENVIADOS:
+            self.headers.pop(nome, None)
+        async with self.sessao.sessao.get(self.url, headers=self.headers) as resposta:
+            corpo = await resposta.read()
+            cabecalhos = list(resposta.headers.items())
+            armazem.guardar("GET", self.url, resposta.status, resposta.headers, corpo, str(resposta.url))
+        return RespostaGravada("GET", self.url, resposta.status, cabecalhos, corpo)
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class SessaoGravada:
+    """Envolve uma aiohttp.ClientSession: get() grava (GRAVAR) ou reproduz (REPRODUZIR) as respostas."""
+
+    def __init__(self, sessao, modo: str, armazem: ArmazemFixtures | None = None):
+        self.sessao = sessao
+        self.modo = modo
+        self.armazem = armazem or ArmazemFixtures()
+
+    def get(self, url: str, params=None, headers=None):
+        return _RequisicaoGravada(self, url, params, headers)
+
+    async def close(self):
+        await self.sessao.close()
+
+
+def envolver_sessao(sessao, modo: str = MODO):
+    """A sessão do aiohttp envolvida para gravar/reproduzir, ou a própria sessão se o modo estiver desligado."""
+    return SessaoGravada(sessao, modo) if modo else sessao
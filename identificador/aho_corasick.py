@@ -0,0 +1,60 @@
+from collections import deque
+
+
+class AhoCorasick:
+    """Autômato de Aho-Corasick para buscar muitos padrões numa única passada pelo texto.
+
+    Cada padrão carrega uma lista de valores (por exemplo, as linhas do CSV
+    que têm aquele número); `buscar` devolve todas as ocorrências, inclusive
+    sobrepostas, em O(len(texto) + ocorrências).
+    """
+
+    def __init__(self):
+        self._transicoes = [{}]
+        self._falha = [0]
+        self._saidas = [[]]
+        self._construido = False
+
+    def adicionar(self, padrao, valor):
+        estado = 0
+        for caractere in padrao:
+            proximo = self._transicoes[estado].get(caractere)
+            if proximo is None:
+                proximo = len(self._transicoes)
+                self._transicoes.append({})
+                self._falha.append(0)
+                self._saidas.append([])
+                self._transicoes[estado][caractere] = proximo
+            estado = proximo
+        self._saidas[estado].append((len(padrao), valor))
+        self._construido = False
+
+    def construir(self):
+        """Calcula os links de falha em largura e propaga as saídas pelos sufixos."""
+        fila = deque(self._transicoes[0].values())
+        for estado in fila:
+            self._falha[estado] = 0
+        while fila:
+            estado = fila.popleft()
+            for caractere, proximo in self._transicoes[estado].items():
+                fila.append(proximo)
+                falha = self._falha[estado]
+                while falha and caractere not in self._transicoes[falha]:
+                    falha = self._falha[falha]
+                destino = self._transicoes[falha].get(caractere, 0)
+                self._falha[proximo] = destino if destino != proximo else 0
+                self._saidas[proximo] = self._saidas[proximo] + self._saidas[self._falha[proximo]]
+        self._construido = True
+
+    def buscar(self, texto):
+        """Gera (inicio, fim, valor) para cada ocorrência de cada padrão em `texto`."""
+        if not self._construido:
+            self.construir()
+        transicoes, falha, saidas = self._transicoes, self._falha, self._saidas
+        estado = 0
+        for posicao, caractere in enumerate(texto):
+            while estado and caractere not in transicoes[estado]:
+                estado = falha[estado]
+            estado = transicoes[estado].get(caractere, 0)
+            for tamanho, valor in saidas[estado]:
+                yield posicao + 1 - tamanho, posicao + 1, valor
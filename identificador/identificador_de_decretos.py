@@ -1,12 +1,20 @@
 import os
 import re
+import sys
+import argparse
 import pandas as pd
-import spacy
-from spacy.matcher import Matcher
 
-# Inicializa o modelo NLP e o matcher
-nlp = spacy.load("pt_core_news_sm")
-matcher = Matcher(nlp.vocab)
+from indice import IndiceTextos
+from sombra import Sombras, normalizar
+from aho_corasick import AhoCorasick
+from nlp import MODOS, analisar_trechos, medir
+from limpador_validado import COL_NOME, COL_NUMERO, COL_ORIGINAL, COL_TIPO, carregar_identificado
+from territorios import IndiceTerritorios
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metricas import medir_arquivo, perfilar
+from duplicatas import LIMIAR_SIMILARIDADE, MODOS_REUSO, REUSO_EXATO, representantes_textos
 
 # Caminho base do projeto (sobe um nível da pasta identificador/)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -17,13 +25,18 @@ LEIS = ["LAI", "LGD", "LGPD", "MROSC"]
 # Quantos caracteres ao redor do decreto extrair do texto
 TRECHO_LIMITE = 300
 
+# Índice invertido persistente dos textos extraídos
+CAMINHO_INDICE = os.path.join(BASE_DIR, ".cache", "indice_textos.sqlite")
+
+PASTA_RESULTADOS = os.path.join(BASE_DIR, "identificador", "resultados")
+
 
 # -------------------------------------------------------------------
-# Lê todos os .txt disponíveis
+# Lista os .txt disponíveis e atualiza o índice
 # -------------------------------------------------------------------
-def ler_txts():
-    """Lê todos os arquivos .txt nas pastas dados_extraidos e retorna um dicionário {nome_arquivo_sem_ext: {...}}"""
-    textos = {}
+def listar_txts():
+    """Lista os arquivos .txt nas pastas dados_extraidos e retorna um dicionário {nome_arquivo_sem_ext: (caminho, lei)}"""
+    arquivos = {}
 
     for lei in LEIS:
         for tipo in ["capital", "estado"]:
@@ -33,96 +46,180 @@ def ler_txts():
 
             for arquivo in os.listdir(pasta_txt):
                 if arquivo.lower().endswith(".txt"):
-                    caminho_txt = os.path.join(pasta_txt, arquivo)
-                    try:
-                        with open(caminho_txt, "r", encoding="utf-8") as f:
-                            conteudo = f.read()
-                    except UnicodeDecodeError:
-                        with open(caminho_txt, "r", encoding="latin-1") as f:
-                            conteudo = f.read()
-
                     chave = os.path.splitext(arquivo)[0]
-                    textos[chave] = {"caminho": caminho_txt, "conteudo": conteudo}
+                    arquivos[chave] = (os.path.join(pasta_txt, arquivo), lei)
+
+    return arquivos
+
+
+def agrupar_duplicatas(arquivos, modo=REUSO_EXATO, limiar=LIMIAR_SIMILARIDADE):
+    """Retorna {chave: chave do representante}: textos duplicados são buscados uma vez só, no representante"""
+    representantes = representantes_textos(arquivos, modo, limiar=limiar)
+    unicos = len(set(representantes.values()))
+    if unicos < len(arquivos):
+        print(f"🧬 {len(arquivos) - unicos} textos duplicados ({modo}) reaproveitam a busca de {unicos} representantes")
+    return representantes
 
-    print(f"📄 Total de arquivos .txt carregados: {len(textos)}")
-    return textos
+
+def so_representantes(arquivos, representantes):
+    return {chave: arquivos[chave] for chave in sorted(set(representantes.values()))}
+
+
+def carregar_indice(arquivos, caminho_indice=CAMINHO_INDICE):
+    """Abre o índice invertido e reindexa apenas os .txt novos ou alterados desde a última execução"""
+    indice = IndiceTextos(caminho_indice)
+    indexados, removidos = indice.atualizar(arquivos)
+    print(f"📄 Total de arquivos .txt no índice: {len(arquivos)} ({indexados} reindexados, {removidos} removidos)")
+    return indice
 
 
 # -------------------------------------------------------------------
 # Carrega os CSVs identificados
 # -------------------------------------------------------------------
 def carregar_csvs_identificados():
-    """Carrega todos os identificado_<LEI>.csv que existirem e retorna dict {LEI: df}"""
-    pasta_identificados = os.path.join(BASE_DIR, "identificador", "identificado")
+    """Carrega as tabelas identificado_<LEI> que existirem (só as colunas usadas aqui) e retorna dict {LEI: df}"""
     csvs = {}
     for lei in LEIS:
-        caminho_csv = os.path.join(pasta_identificados, f"identificado_{lei}.csv")
-        if os.path.exists(caminho_csv):
-            try:
-                df = pd.read_csv(caminho_csv, encoding="utf-8", dtype=str)
-            except UnicodeDecodeError:
-                df = pd.read_csv(caminho_csv, encoding="latin-1", dtype=str)
+        df = carregar_identificado(lei, [COL_TIPO, COL_NOME, COL_ORIGINAL, COL_NUMERO])
+        if df is not None:
             csvs[lei] = df.fillna("")
-            print(f"✅ CSV carregado: identificado_{lei}.csv → {len(df)} linhas")
+            print(f"✅ Tabela carregada: identificado_{lei} → {len(df)} linhas")
         else:
-            print(f"[IGNORADO] CSV não encontrado: identificado_{lei}.csv")
+            print(f"[IGNORADO] Tabela não encontrada: identificado_{lei}")
     return csvs
 
 
 # -------------------------------------------------------------------
-# Função principal de identificação dos decretos
+# Estágio opcional de NLP sobre os trechos encontrados
 # -------------------------------------------------------------------
-def identificar_por_arquivo(textos, csvs):
-    """Usa spaCy Matcher para localizar o trecho do decreto conforme número da regulamentação"""
-    pasta_saida = os.path.join(BASE_DIR, "identificador", "resultados")
-    os.makedirs(pasta_saida, exist_ok=True)
+def enriquecer_com_nlp(df_res, coluna_trecho, modo_nlp):
+    """Acrescenta ao DataFrame as colunas calculadas pelo spaCy sobre os trechos (nada muda no modo "off")"""
+    for coluna, valores in analisar_trechos(df_res[coluna_trecho].tolist(), modo_nlp).items():
+        df_res[coluna] = valores
+    return df_res
 
-    resultados_por_lei = {}
 
-    for lei, df in csvs.items():
-        resultados = []
-        print(f"\n🔎 Processando {lei}...")
+# -------------------------------------------------------------------
+# Resolução de territórios: linhas do CSV e arquivos .txt viram códigos IBGE
+# -------------------------------------------------------------------
+def pendencia(origem, lei, nome, codigos):
+    return {
+        "Origem": origem,
+        "Lei": lei,
+        "Nome": nome,
+        "Motivo": "ambíguo" if codigos else "não encontrado",
+        "Candidatos": "; ".join(str(c) for c in codigos),
+    }
 
-        for _, row in df.iterrows():
-            numero_regulamentacao = str(row.get("Se sim, número da regulamentação (original)", "")).strip()
-            if not numero_regulamentacao:
-                continue
 
-            # Nome base do arquivo (buscando sem extensão)
-            nome_cidade = str(row.get("Município", "")).strip()
-            if not nome_cidade:
-                continue
+def tabela_documentos(arquivos, territorios):
+    """Um documento por linha com o código IBGE do território (o tipo vem da pasta capital/estado)"""
+    documentos, pendencias = [], []
+    for chave, (caminho, lei) in arquivos.items():
+        tipo = os.path.basename(os.path.dirname(os.path.dirname(caminho)))
+        codigos = territorios.resolver_arquivo(chave, tipo)
+        if len(codigos) == 1:
+            documentos.append({"Arquivo TXT": chave, "Lei do Arquivo": lei, "Codigo IBGE": codigos[0]})
+        else:
+            pendencias.append(pendencia("arquivo", lei, chave, codigos))
+    return pd.DataFrame(documentos, columns=["Arquivo TXT", "Lei do Arquivo", "Codigo IBGE"]), pendencias
+
 
-            # Tenta encontrar o arquivo .txt correspondente
-            possiveis_chaves = [k for k in textos.keys() if nome_cidade.lower() in k.lower()]
-            if not possiveis_chaves:
+def tabela_linhas(csvs, territorios):
+    """Todas as linhas dos identificado_<LEI> com número preenchido, já com o código IBGE resolvido"""
+    linhas, pendencias = [], []
+    for lei, df in csvs.items():
+        for tipo, nome, original, numero in zip(df[COL_TIPO], df[COL_NOME].str.strip(),
+                                                df[COL_ORIGINAL].str.strip(), df[COL_NUMERO].str.strip()):
+            if not original or not nome:
+                continue
+            codigos = territorios.resolver_linha(nome, tipo)
+            if len(codigos) != 1:
+                pendencias.append(pendencia("linha", lei, nome, codigos))
                 continue
+            linhas.append({"Lei": lei, "Nome": nome, "Original": original, "Numero": numero, "Codigo IBGE": codigos[0]})
+    colunas = ["Lei", "Nome", "Original", "Numero", "Codigo IBGE"]
+    return pd.DataFrame(linhas, columns=colunas), pendencias
+
+
+def casar_linhas_documentos(linhas, documentos):
+    """Junta linhas e documentos pelo código IBGE (um único hash join) e fica com um documento por linha,
+    preferindo o da mesma lei. Devolve os pares e as linhas que ficaram sem documento."""
+    linhas = linhas.reset_index(names="Linha")
+    pares = linhas.merge(documentos, on="Codigo IBGE", how="left")
+    pares["Outra Lei"] = pares["Lei do Arquivo"] != pares["Lei"]
+    pares = pares.sort_values(["Linha", "Outra Lei", "Arquivo TXT"]).drop_duplicates("Linha")
+    sem_documento = pares[pares["Arquivo TXT"].isna()]
+    pendencias = [
+        {"Origem": "linha", "Lei": lei, "Nome": nome, "Motivo": "sem documento", "Candidatos": str(codigo)}
+        for lei, nome, codigo in zip(sem_documento["Lei"], sem_documento["Nome"], sem_documento["Codigo IBGE"])
+    ]
+    return pares.dropna(subset=["Arquivo TXT"]), pendencias
 
-            chave_txt = possiveis_chaves[0]
-            texto = textos[chave_txt]["conteudo"]
 
-            # Cria padrão de busca (regex + NLP)
-            padrao_regex = re.escape(numero_regulamentacao)
-            match = re.search(padrao_regex, texto, flags=re.IGNORECASE)
+def salvar_pendencias(pendencias, pasta_saida):
+    """Tabela lateral com os nomes ambíguos, não encontrados ou sem documento"""
+    saida_csv = os.path.join(pasta_saida, "territorios_pendentes.csv")
+    colunas = ["Origem", "Lei", "Nome", "Motivo", "Candidatos"]
+    pd.DataFrame(pendencias, columns=colunas).to_csv(saida_csv, index=False, encoding="utf-8-sig")
+    print(f"⚠️ {len(pendencias)} nomes sem território único ou sem documento, listados em {saida_csv}")
 
-            if match:
-                start, end = match.span()
-                trecho_inicio = max(0, start - TRECHO_LIMITE)
-                trecho_fim = min(len(texto), end + TRECHO_LIMITE)
-                trecho_extraido = texto[trecho_inicio:trecho_fim].replace("\n", " ").strip()
 
-                resultados.append({
-                    "Lei": lei,
-                    "Municipio": nome_cidade,
-                    "Numero_Regulamentacao": numero_regulamentacao,
-                    "Trecho_Encontrado": trecho_extraido
-                })
+# -------------------------------------------------------------------
+# Função principal de identificação dos decretos
+# -------------------------------------------------------------------
+def identificar_por_arquivo(indice, arquivos, csvs, modo_nlp="off", pasta_saida=PASTA_RESULTADOS, representantes=None):
+    """Localiza o trecho do decreto conforme número da regulamentação consultando o índice invertido.
+
+    Com `representantes` ({chave: chave do representante}), cada texto é
+    buscado no seu representante, e o índice só precisa ter os representantes.
+    """
+    os.makedirs(pasta_saida, exist_ok=True)
+    representantes = representantes or {}
+    # (texto buscado, número) → trecho; duplicatas repetem as mesmas consultas
+    buscas = {}
+
+    territorios = IndiceTerritorios()
+    documentos, pendencias_documentos = tabela_documentos(arquivos, territorios)
+    linhas, pendencias_linhas = tabela_linhas(csvs, territorios)
+    pares, sem_documento = casar_linhas_documentos(linhas, documentos)
+    salvar_pendencias(pendencias_documentos + pendencias_linhas + sem_documento, pasta_saida)
+
+    resultados_por_lei = {}
+
+    for lei in csvs:
+        resultados = []
+        print(f"\n🔎 Processando {lei}...")
+
+        pares_lei = pares[pares["Lei"] == lei]
+        with medir_arquivo("identify", lei, modo="por_arquivo", consultas=len(pares_lei)) as evento:
+            for nome_cidade, numero_regulamentacao, chave_txt in zip(
+                pares_lei["Nome"], pares_lei["Original"], pares_lei["Arquivo TXT"]
+            ):
+                chave_busca = representantes.get(chave_txt, chave_txt)
+                if (chave_busca, numero_regulamentacao) not in buscas:
+                    # Busca de frase no índice (ignora pontuação, acentos e caixa)
+                    ocorrencias = indice.buscar_frase(chave_busca, numero_regulamentacao)
+                    buscas[chave_busca, numero_regulamentacao] = (
+                        indice.trecho(chave_busca, *ocorrencias[0], TRECHO_LIMITE).replace("\n", " ").strip()
+                        if ocorrencias else None
+                    )
+                trecho_extraido = buscas[chave_busca, numero_regulamentacao]
+
+                if trecho_extraido is not None:
+                    resultados.append({
+                        "Lei": lei,
+                        "Municipio": nome_cidade,
+                        "Numero_Regulamentacao": numero_regulamentacao,
+                        "Trecho_Encontrado": trecho_extraido
+                    })
+            evento["encontrados"] = len(resultados)
 
         resultados_por_lei[lei] = resultados
 
         # Salva os resultados de cada lei
         if resultados:
-            df_res = pd.DataFrame(resultados)
+            df_res = enriquecer_com_nlp(pd.DataFrame(resultados), "Trecho_Encontrado", modo_nlp)
             saida_csv = os.path.join(pasta_saida, f"decretos_identificados_{lei}.csv")
             df_res.to_csv(saida_csv, index=False, encoding="utf-8-sig")
             print(f"✅ {lei}: {len(df_res)} decretos encontrados e salvos em {saida_csv}")
@@ -132,14 +229,131 @@ def identificar_por_arquivo(textos, csvs):
     return resultados_por_lei
 
 
+# -------------------------------------------------------------------
+# Modo em lote: todos os números de todas as leis numa passada só
+# -------------------------------------------------------------------
+def variantes_numero(numero):
+    """Formas de um número de regulamentação na sombra, onde já não há pontuação ("12.527" vira "12527");
+    zeros à esquerda são opcionais ("017" também gera "17")"""
+    numero = numero.strip()
+    if not re.fullmatch(r"\d{1,3}(?:\.\d{3})+|\d+", numero):
+        return set()
+    digitos = normalizar(numero)
+    return {digitos, str(int(digitos))}
+
+
+def numero_isolado(sombra, inicio, fim):
+    """Descarta ocorrências que são pedaço de um número maior (1915 dentro de 19150 ou 11.915, que na sombra é 11915)"""
+    return not (sombra[inicio - 1:inicio].isdigit() or sombra[fim:fim + 1].isdigit())
+
+
+def identificar_em_lote(arquivos, csvs, modo_nlp="off", pasta_saida=PASTA_RESULTADOS, representantes=None):
+    """Compila os números de todas as leis num autômato de Aho-Corasick e percorre cada .txt uma única vez,
+    registrando toda ocorrência com arquivo, posição e lei. Com `representantes`, só os representantes são
+    percorridos e as ocorrências de cada um são copiadas para as suas duplicatas"""
+    os.makedirs(pasta_saida, exist_ok=True)
+
+    territorios = IndiceTerritorios()
+    documentos, _ = tabela_documentos(arquivos, territorios)
+    codigo_do_arquivo = dict(zip(documentos["Arquivo TXT"], documentos["Codigo IBGE"]))
+
+    automato = AhoCorasick()
+    total_padroes = 0
+    for lei, df in csvs.items():
+        for tipo, nome, original, numero in zip(df[COL_TIPO], df[COL_NOME].str.strip(),
+                                                df[COL_ORIGINAL].str.strip(), df[COL_NUMERO].str.strip()):
+            codigos = territorios.resolver_linha(nome, tipo)
+            codigo = codigos[0] if len(codigos) == 1 else None
+            for variante in variantes_numero(numero):
+                automato.adicionar(variante, (lei, nome, numero, original, codigo))
+                total_padroes += 1
+    automato.construir()
+    print(f"🔢 Autômato com {total_padroes} padrões de número")
+
+    representantes = representantes or {}
+    duplicatas_de = {}
+    for chave, representante in representantes.items():
+        if chave != representante:
+            duplicatas_de.setdefault(representante, []).append(chave)
+
+    sombras = Sombras()
+    ocorrencias = []
+    for chave, (caminho, lei_arquivo) in arquivos.items():
+        if representantes.get(chave, chave) != chave:
+            continue
+        with medir_arquivo("identify", caminho, modo="lote", bytes=os.path.getsize(caminho)) as evento:
+            antes = len(ocorrencias)
+            codigos_das_linhas = []
+            # o autômato percorre a sombra em pedaços (cortados em espaços, que nenhum padrão tem) e do
+            # original só são decodificadas as janelas dos trechos
+            sombra = sombras.de(caminho)
+            for deslocamento, pedaco in sombra.pedacos():
+                for inicio, fim, (lei, nome, numero, original, codigo) in automato.buscar(pedaco):
+                    if not numero_isolado(pedaco, inicio, fim):
+                        continue
+                    inicio, fim = sombra.intervalo_original(deslocamento + inicio, deslocamento + fim)
+                    trecho = sombra.original(inicio - TRECHO_LIMITE, fim + TRECHO_LIMITE)
+                    codigos_das_linhas.append(codigo)
+                    ocorrencias.append({
+                        "Arquivo TXT": chave,
+                        "Lei do Arquivo": lei_arquivo,
+                        "Posicao": inicio,
+                        "Lei": lei,
+                        "Nome": nome,
+                        "Decreto (original)": original,
+                        "Decreto (número extraído)": numero,
+                        "Mesmo Territorio": codigo is not None and codigo == codigo_do_arquivo.get(chave),
+                        "Trecho Encontrado": trecho.replace("\n", " ").strip(),
+                    })
+            evento["encontrados"] = len(ocorrencias) - antes
+
+            do_representante = ocorrencias[antes:]
+            evento["duplicatas"] = len(duplicatas_de.get(chave, []))
+            for duplicata in duplicatas_de.get(chave, []):
+                lei_duplicata = arquivos[duplicata][1]
+                for ocorrencia, codigo in zip(do_representante, codigos_das_linhas):
+                    ocorrencias.append({
+                        **ocorrencia,
+                        "Arquivo TXT": duplicata,
+                        "Lei do Arquivo": lei_duplicata,
+                        "Mesmo Territorio": codigo is not None and codigo == codigo_do_arquivo.get(duplicata),
+                    })
+
+    if ocorrencias:
+        df_res = enriquecer_com_nlp(pd.DataFrame(ocorrencias), "Trecho Encontrado", modo_nlp)
+        saida_csv = os.path.join(pasta_saida, "ocorrencias_em_lote.csv")
+        df_res.to_csv(saida_csv, index=False, encoding="utf-8-sig")
+        print(f"✅ {len(df_res)} ocorrências em {df_res['Arquivo TXT'].nunique()} arquivos salvas em {saida_csv}")
+    else:
+        print("[AVISO] Nenhuma ocorrência encontrada no modo em lote.")
+
+    return ocorrencias
+
+
 # -------------------------------------------------------------------
 # MAIN
 # -------------------------------------------------------------------
 def main():
+    parser = argparse.ArgumentParser(description="Identifica os decretos nos textos extraídos.")
+    parser.add_argument("--lote", action="store_true",
+                        help="busca todos os números em todos os arquivos numa passada só (Aho-Corasick)")
+    parser.add_argument("--nlp", choices=MODOS, default="off",
+                        help="analisa os trechos com spaCy: só tokenizador (blank) ou modelo completo com entidades")
+    parser.add_argument("--duplicatas", choices=MODOS_REUSO, default=REUSO_EXATO,
+                        help="reaproveita a busca entre textos idênticos (exatas), também entre quase idênticos "
+                             "(quase, posições e trechos vêm do representante) ou não reaproveita (off)")
+    args = parser.parse_args()
+
     print("🚀 Iniciando identificador de decretos pelos nomes dos arquivos .txt...\n")
-    textos = ler_txts()
-    csvs = carregar_csvs_identificados()
-    identificar_por_arquivo(textos, csvs)
+    with medir(f"Identificação (NLP: {args.nlp})"), perfilar("identify"):
+        csvs = carregar_csvs_identificados()
+        arquivos = listar_txts()
+        representantes = agrupar_duplicatas(arquivos, args.duplicatas)
+        if args.lote:
+            identificar_em_lote(arquivos, csvs, args.nlp, representantes=representantes)
+        else:
+            indice = carregar_indice(so_representantes(arquivos, representantes))
+            identificar_por_arquivo(indice, arquivos, csvs, args.nlp, representantes=representantes)
     print("\n🏁 Processo finalizado.")
 
 
@@ -0,0 +1,164 @@
+import os
+import re
+import sqlite3
+from array import array
+
+from sombra import Sombra, Sombras, descartar_outra_versao
+
+# Números ou palavras da sombra normalizada; pontuação e símbolos ficam de fora
+TOKEN_RE = re.compile(r"\d+|[^\W\d_]+")
+
+# Sufixo da lei no nome dos arquivos (Macapa_LAI, TO_Palmas_LGPD...)
+SUFIXO_LEI_RE = re.compile(r"_(LAI|LGD|LGPD|MROSC)$", flags=re.IGNORECASE)
+
+
+def tokenizar(texto):
+    """Gera (termo_normalizado, inicio, fim) para cada token do texto, com posições em caracteres do original.
+
+    Os termos vêm da sombra (minúsculas sem acento, números sem pontuação: "12.527" e "12527" são o mesmo termo).
+    """
+    return tokenizar_sombra(Sombra.de_texto(texto))
+
+
+def tokenizar_sombra(sombra):
+    # os pedaços terminam em espaço, então nenhum termo fica dividido entre dois
+    for deslocamento, pedaco in sombra.pedacos():
+        for match in TOKEN_RE.finditer(pedaco):
+            yield (match.group(), *sombra.intervalo_original(deslocamento + match.start(), deslocamento + match.end()))
+
+
+class IndiceTextos:
+    """Índice invertido persistente (SQLite) sobre os .txt de dados_extraidos.
+
+    Para cada termo guarda, por documento, as posições (ordem do token,
+    início e fim em caracteres), o que permite buscas de frase e recortar o
+    trecho sem varrer o texto. A atualização é incremental: só documentos
+    novos ou com tamanho/data de modificação diferentes são reindexados. Os
+    termos saem das sombras guardadas em `sombras`.
+    """
+
+    def __init__(self, caminho_db, sombras=None):
+        os.makedirs(os.path.dirname(caminho_db), exist_ok=True)
+        self._conn = sqlite3.connect(caminho_db)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documentos (
+                id INTEGER PRIMARY KEY,
+                chave TEXT UNIQUE,
+                caminho TEXT,
+                lei TEXT,
+                encoding TEXT,
+                mtime_ns INTEGER,
+                tamanho INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                termo TEXT,
+                doc_id INTEGER,
+                posicoes BLOB,
+                PRIMARY KEY (termo, doc_id)
+            ) WITHOUT ROWID;
+            """
+        )
+        self._conn.commit()
+        descartar_outra_versao(self._conn, ["postings", "documentos"])
+        self.sombras = sombras or Sombras()
+
+    # ---------------------------------------------------------------
+    # Indexação
+    # ---------------------------------------------------------------
+    def atualizar(self, arquivos):
+        """Sincroniza o índice com `arquivos` ({chave: (caminho, lei)}). Devolve (indexados, removidos)."""
+        existentes = {
+            chave: (doc_id, mtime_ns, tamanho)
+            for doc_id, chave, mtime_ns, tamanho in self._conn.execute(
+                "SELECT id, chave, mtime_ns, tamanho FROM documentos"
+            )
+        }
+
+        removidos = 0
+        for chave in set(existentes) - set(arquivos):
+            self._remover(existentes[chave][0])
+            removidos += 1
+
+        indexados = 0
+        for chave, (caminho, lei) in arquivos.items():
+            stat = os.stat(caminho)
+            anterior = existentes.get(chave)
+            if anterior and anterior[1] == stat.st_mtime_ns and anterior[2] == stat.st_size:
+                continue
+            if anterior:
+                self._remover(anterior[0])
+            self._indexar(chave, caminho, lei, stat)
+            indexados += 1
+
+        self._conn.commit()
+        return indexados, removidos
+
+    def _remover(self, doc_id):
+        self._conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+        self._conn.execute("DELETE FROM documentos WHERE id = ?", (doc_id,))
+
+    def _indexar(self, chave, caminho, lei, stat):
+        sombra = self.sombras.de(caminho)
+        cursor = self._conn.execute(
+            "INSERT INTO documentos (chave, caminho, lei, encoding, mtime_ns, tamanho) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (chave, caminho, lei, sombra.encoding, stat.st_mtime_ns, stat.st_size),
+        )
+        doc_id = cursor.lastrowid
+
+        posicoes = {}
+        for ordem, (termo, inicio, fim) in enumerate(tokenizar_sombra(sombra)):
+            posicoes.setdefault(termo, array("I")).extend((ordem, inicio, fim))
+
+        self._conn.executemany(
+            "INSERT INTO postings (termo, doc_id, posicoes) VALUES (?, ?, ?)",
+            ((termo, doc_id, valores.tobytes()) for termo, valores in posicoes.items()),
+        )
+
+    # ---------------------------------------------------------------
+    # Consultas
+    # ---------------------------------------------------------------
+    def documento(self, chave):
+        linha = self._conn.execute(
+            "SELECT id, caminho, encoding FROM documentos WHERE chave = ?", (chave,)
+        ).fetchone()
+        if linha is None:
+            return None
+        return {"id": linha[0], "caminho": linha[1], "encoding": linha[2]}
+
+    def _posicoes(self, termo, doc_id):
+        linha = self._conn.execute(
+            "SELECT posicoes FROM postings WHERE termo = ? AND doc_id = ?", (termo, doc_id)
+        ).fetchone()
+        if linha is None:
+            return {}
+        valores = array("I")
+        valores.frombytes(linha[0])
+        return {valores[i]: (valores[i + 1], valores[i + 2]) for i in range(0, len(valores), 3)}
+
+    def buscar_frase(self, chave, consulta):
+        """Ocorrências da frase `consulta` no documento, como lista de (inicio, fim) em caracteres."""
+        documento = self.documento(chave)
+        termos = [termo for termo, _, _ in tokenizar(consulta)]
+        if documento is None or not termos:
+            return []
+
+        posicoes_por_termo = []
+        for termo in termos:
+            posicoes = self._posicoes(termo, documento["id"])
+            if not posicoes:
+                return []
+            posicoes_por_termo.append(posicoes)
+
+        ocorrencias = []
+        for ordem, (inicio, _) in sorted(posicoes_por_termo[0].items()):
+            if all(ordem + deslocamento in posicoes_por_termo[deslocamento] for deslocamento in range(1, len(termos))):
+                fim = posicoes_por_termo[-1][ordem + len(termos) - 1][1]
+                ocorrencias.append((inicio, fim))
+        return ocorrencias
+
+    def trecho(self, chave, inicio, fim, limite):
+        """Recorta o texto do documento em [inicio - limite, fim + limite), sem ler o arquivo inteiro."""
+        documento = self.documento(chave)
+        return self.sombras.de(documento["caminho"]).original(inicio - limite, fim + limite)
@@ -1,14 +1,57 @@
 import os
-import re
+import sys
 import pandas as pd
 
 # Caminho base (sobe um nível da pasta identificador/)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+sys.path.insert(0, BASE_DIR)
+
+from metricas import medir_arquivo, perfilar
+
 # Pastas principais com leis
 LEIS = ["LAI", "LGD", "LGPD", "MROSC"]
 
-def limpar_csv(caminho_csv, nome_lei):
+PASTA_SAIDA = os.path.join(BASE_DIR, "identificador", "identificado")
+
+# Esquema normalizado dos identificado_<LEI>: mesmos nomes e tipos para todas as leis
+COL_LEI = "Lei"
+COL_TIPO = "Capital / Estado"
+COL_NOME = "Nome"
+COL_ORIGINAL = "Regulamentação (original)"
+COL_NUMERO = "Regulamentação (número extraído)"
+ESQUEMA = {
+    COL_LEI: "category",
+    COL_TIPO: "category",
+    COL_NOME: "string",
+    COL_ORIGINAL: "string",
+    COL_NUMERO: "string",
+}
+
+# Número do decreto/lei: "1.915", "15.627" ou "5715", mas não um ano solto
+PADRAO_NUMERO = r'\b(?!19\d{2}\b|20\d{2}\b)(\d{1,2}(?:\.\d{3})+|\d{3,5})(?=[^\d]|$)'
+PADRAO_NUMERO_ALTERNATIVO = r'\b(?!19\d{2}\b|20\d{2}\b)(\d{3,5})\b'
+# Datas do tipo "de 2024", removidas antes de procurar o número
+PADRAO_ANO = r'\bde\s+(?:19|20)\d{2}\b'
+
+
+def extrair_numeros(textos):
+    """Extrai o número da regulamentação de uma Series de textos, em operações vetorizadas do pandas"""
+    textos = textos.astype("string").str.replace(PADRAO_ANO, "", case=False, regex=True)
+    numero = textos.str.extract(PADRAO_NUMERO, expand=False)
+    numero = numero.fillna(textos.str.extract(PADRAO_NUMERO_ALTERNATIVO, expand=False))
+    # sem nenhum número reconhecível, mantém o texto como veio
+    return numero.fillna(textos.str.strip())
+
+
+def limpar_csv(caminho_csv, nome_lei, pasta_saida=PASTA_SAIDA):
+    with perfilar("clean"), medir_arquivo("clean", caminho_csv, lei=nome_lei, bytes=os.path.getsize(caminho_csv)) as evento:
+        saida = limpar_tabela(caminho_csv, nome_lei, pasta_saida)
+        evento["linhas"] = len(saida)
+    return saida
+
+
+def limpar_tabela(caminho_csv, nome_lei, pasta_saida):
     print(f"🧹 Limpando {caminho_csv} ...")
 
     # 1) Lê CSV
@@ -37,51 +80,53 @@ def limpar_csv(caminho_csv, nome_lei):
         print(f"[AVISO] Colunas principais ausentes em {nome_lei}")
         print(f"Encontradas: {col_capital_estado}, {col_nome}, {col_encontrou}")
 
-    # 4) Define colunas válidas (mantém a ordem lógica e remove link)
-    colunas_validas = [c for c in [col_capital_estado, col_nome, col_encontrou, col_regulamenta] if c is not None]
-    df = df[colunas_validas].copy()
-
-    # 5) Filtra linhas com base nos critérios de regulamentação
+    # 4) Filtra linhas com base nos critérios de regulamentação
     if col_encontrou:
-        df = df[df[col_encontrou].astype(str).str.strip().str.lower() == "sim"]
+        df = df[df[col_encontrou].str.strip().str.lower() == "sim"]
 
     if col_regulamenta:
         df = df[df[col_regulamenta].notna() & (df[col_regulamenta].str.strip() != "")]
 
-    # 5.1) 🧩 Cria coluna com número extraído e mantém a original
-    if col_regulamenta in df.columns:
-
-        # Renomeia a original
-        df.rename(columns={col_regulamenta: f"{col_regulamenta} (original)"}, inplace=True)
-
-        # Regex melhorada:
-        pattern = re.compile(
-            r'\b(?!19\d{2}\b|20\d{2}\b)(\d{1,2}(?:\.\d{3})+|\d{3,5})(?=[^\d]|$)',
-            flags=re.IGNORECASE
-        )
-
-        def extrair_decreto(texto):
-            if pd.isna(texto):
-                return None
-            texto_str = str(texto)
-            # remove datas do tipo “de 2024”
-            texto_str = re.sub(r'\bde\s+(19|20)\d{2}\b', '', texto_str, flags=re.IGNORECASE)
-            match = pattern.search(texto_str)
-            if match:
-                return match.group(1)
-            alt = re.search(r'\b(?!19\d{2}\b|20\d{2}\b)\d{3,5}\b', texto_str)
-            return alt.group(0) if alt else texto_str.strip()
-
-        # Cria a nova coluna apenas com o número
-        df[f"{col_regulamenta} (número extraído)"] = df[f"{col_regulamenta} (original)"].astype(str).apply(extrair_decreto)
-
-    # 6) Cria pasta de saída e salva CSV
-    pasta_saida = os.path.join(BASE_DIR, "identificador", "identificado")
+    # 5) Monta a tabela no esquema normalizado, com o número extraído ao lado do texto original
+    vazio = pd.Series(pd.NA, index=df.index)
+    original = df[col_regulamenta] if col_regulamenta else vazio
+    saida = pd.DataFrame({
+        COL_LEI: nome_lei,
+        COL_TIPO: df[col_capital_estado].str.strip() if col_capital_estado else vazio,
+        COL_NOME: df[col_nome].str.strip() if col_nome else vazio,
+        COL_ORIGINAL: original,
+        COL_NUMERO: extrair_numeros(original) if col_regulamenta else vazio,
+    }).astype(ESQUEMA)
+
+    # 6) Cria pasta de saída e salva CSV e Parquet (tipado, lido por coluna nas etapas seguintes)
     os.makedirs(pasta_saida, exist_ok=True)
     saida_csv = os.path.join(pasta_saida, f"identificado_{nome_lei}.csv")
-    df.to_csv(saida_csv, index=False, encoding='utf-8-sig')
+    saida.to_csv(saida_csv, index=False, encoding='utf-8-sig')
+    print(f"✅ Arquivo salvo em: {saida_csv}")
 
-    print(f"✅ Arquivo salvo em: {saida_csv}\n")
+    saida_parquet = os.path.join(pasta_saida, f"identificado_{nome_lei}.parquet")
+    try:
+        saida.to_parquet(saida_parquet, index=False)
+        print(f"✅ Arquivo salvo em: {saida_parquet}\n")
+    except ImportError:
+        print("[AVISO] pyarrow não instalado: Parquet não gerado, as próximas etapas lerão o CSV\n")
+
+    return saida
+
+
+def carregar_identificado(nome_lei, colunas=None, pasta=PASTA_SAIDA):
+    """Lê identificado_<LEI> só com as colunas pedidas: do Parquet se existir, senão do CSV (UTF-8, esquema fixo)"""
+    colunas = list(colunas or ESQUEMA)
+    caminho = os.path.join(pasta, f"identificado_{nome_lei}")
+    if os.path.exists(caminho + ".parquet"):
+        try:
+            return pd.read_parquet(caminho + ".parquet", columns=colunas)
+        except ImportError:
+            pass
+    if os.path.exists(caminho + ".csv"):
+        tipos = {c: ESQUEMA[c] for c in colunas}
+        return pd.read_csv(caminho + ".csv", encoding="utf-8-sig", usecols=colunas, dtype=tipos)
+    return None
 
 
 def main():
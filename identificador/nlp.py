@@ -0,0 +1,78 @@
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Modelo carregado apenas quando entidades/classes gramaticais são pedidas
+MODELO_COMPLETO = "pt_core_news_sm"
+
+# Modos do estágio de NLP: desligado, só tokenizador ("pt" em branco) ou modelo completo
+MODOS = ["off", "blank", "completo"]
+
+_pipelines = {}
+
+
+def pico_memoria_mb():
+    """Pico de memória residente do processo em MB (ru_maxrss; no Windows, pico do tracemalloc)."""
+    if resource is None:
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+@contextmanager
+def medir(rotulo):
+    """Imprime o tempo gasto e o pico de memória do processo ao fim do bloco."""
+    if resource is None:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        pico = pico_memoria_mb()
+        if resource is None:
+            tracemalloc.stop()
+        print(f"⏱️ {rotulo}: {duracao:.2f}s, pico de memória {pico:.0f} MB")
+
+
+def carregar_nlp(modo):
+    """Carrega (uma vez por processo) o pipeline do modo pedido; spaCy só é importado aqui."""
+    if modo == "off":
+        return None
+    if modo not in _pipelines:
+        with medir(f"spaCy ({modo})"):
+            import spacy
+            if modo == "blank":
+                _pipelines[modo] = spacy.blank("pt")
+            else:
+                _pipelines[modo] = spacy.load(MODELO_COMPLETO)
+    return _pipelines[modo]
+
+
+def analisar_trechos(trechos, modo, batch_size=64):
+    """Processa os trechos em lote com `nlp.pipe` e devolve uma coluna de atributos por trecho.
+
+    No modo "blank" só há tokenização: devolve os números citados no trecho.
+    No modo "completo" devolve também as entidades nomeadas.
+    """
+    nlp = carregar_nlp(modo)
+    if nlp is None:
+        return {}
+
+    colunas = {"Numeros no Trecho": []}
+    if modo == "completo":
+        colunas["Entidades"] = []
+
+    with medir(f"NLP em {len(trechos)} trechos ({modo})"):
+        for doc in nlp.pipe(trechos, batch_size=batch_size):
+            colunas["Numeros no Trecho"].append("; ".join(t.text for t in doc if t.like_num))
+            if modo == "completo":
+                colunas["Entidades"].append("; ".join(f"{ent.text} ({ent.label_})" for ent in doc.ents))
+    return colunas
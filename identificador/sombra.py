@@ -0,0 +1,379 @@
+import os
+import re
+import mmap
+import codecs
+import sqlite3
+import hashlib
+from array import array
+from bisect import bisect_right
+from unidecode import unidecode
+
+# "Sombra" normalizada dos textos extraídos: sem acentos, minúscula, com os
+# espaços colapsados e os números sem pontuação ("DECRETO N° 1.915" vira
+# "decreto n 1915"), mais um mapa de posições de volta ao texto original.
+# As buscas rodam na sombra com comparação exata e os trechos são recortados
+# do original.
+#
+# O mapa só guarda âncoras (posição na sombra, posição no original) onde a
+# diferença entre as duas muda — espaços colapsados, pontuação removida,
+# caracteres que o unidecode expande —, então ocupa uma fração do texto.
+#
+# Guardadas em disco, as sombras são o corpus do identificador: a sombra é um
+# arquivo ASCII (posição em caracteres = posição em bytes) lido por mmap em
+# pedaços, e o original só é aberto para recortar as janelas dos trechos,
+# achadas pelos pontos de controle caractere → byte gravados na geração. O
+# encoding é detectado uma vez, na geração, e fica nos metadados. Nenhum
+# texto inteiro precisa ficar em memória.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_SOMBRAS = os.path.join(BASE_DIR, ".cache", "sombras")
+CAMINHO_DB = os.path.join(PASTA_SOMBRAS, "sombras.sqlite")
+
+# Muda quando a normalização muda: caches de termos normalizados com outra versão são descartados
+VERSAO_NORMALIZACAO = 2
+
+# Trechos que não passam como estão: espaços repetidos ou que não são " ",
+# pontuação entre dígitos e qualquer caractere fora do ASCII
+ESPECIAIS_RE = re.compile(r"\s{2,}|[^\S ]|(?<=\d)[.,](?=\d)|[^\x00-\x7f]")
+# "º" e "°" somem: "Nº 10", "N° 10" e "N 10" dão o mesmo "n 10" (o unidecode faria "no" e "ndeg")
+TROCAS = {"º": "", "°": ""}
+
+# Bytes lidos por vez do original e da sombra; cada bloco do original vira um ponto de controle
+TAMANHO_BLOCO = 64 * 1024
+
+
+def mapear(caminho):
+    """mmap somente leitura do arquivo (bytes vazios se ele estiver vazio, que o mmap não aceita)."""
+    with open(caminho, "rb") as arquivo:
+        if os.fstat(arquivo.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def cortar_no_espaco(texto):
+    """Posição onde começa o último trecho de espaços de `texto`.
+
+    Cortando aí, nenhum espaço repetido, número ou termo fica dividido entre
+    dois pedaços. Sem espaço, o corte fica antes dos últimos dígitos e
+    pontuação; 0 quando o texto todo tem que esperar o pedaço seguinte.
+    """
+    corte = len(texto)
+    while corte > 0 and not texto[corte - 1].isspace():
+        corte -= 1
+    while corte > 0 and texto[corte - 1].isspace():
+        corte -= 1
+    if corte == 0:
+        corte = len(texto)
+        while corte > 0 and (texto[corte - 1].isdigit() or texto[corte - 1] in ".," or texto[corte - 1].isspace()):
+            corte -= 1
+    return corte
+
+
+class Normalizador:
+    """Normaliza um texto pedaço a pedaço, acumulando as âncoras do mapa de posições.
+
+    Os pedaços devem ser cortados com cortar_no_espaco, para os espaços
+    repetidos e a pontuação entre dígitos nunca ficarem na fronteira.
+    """
+
+    def __init__(self):
+        self.ancoras_sombra = array("I", [0])
+        self.ancoras_original = array("I", [0])
+        self.posicao_sombra = 0
+        self.posicao_original = 0
+
+    def _ancorar(self, posicao_sombra, posicao_original):
+        # só vira âncora se a diferença entre as posições mudar
+        if self.ancoras_original[-1] + posicao_sombra - self.ancoras_sombra[-1] == posicao_original:
+            return
+        if self.ancoras_sombra[-1] == posicao_sombra:
+            self.ancoras_original[-1] = posicao_original
+        else:
+            self.ancoras_sombra.append(posicao_sombra)
+            self.ancoras_original.append(posicao_original)
+
+    def normalizar(self, texto):
+        """Sombra do próximo pedaço do original."""
+        partes = []
+        posicao = self.posicao_sombra
+        base = self.posicao_original
+        anterior = 0
+        for match in ESPECIAIS_RE.finditer(texto):
+            inicio, fim = match.span()
+            if inicio > anterior:
+                partes.append(texto[anterior:inicio].lower())
+                posicao += inicio - anterior
+            caractere = texto[inicio]
+            if caractere.isspace():
+                saida = " "
+            elif caractere in ".,":
+                saida = ""
+            else:
+                saida = TROCAS[caractere] if caractere in TROCAS else unidecode(caractere).lower()
+            partes.append(saida)
+            # os caracteres a mais de uma expansão apontam todos para o caractere de origem
+            for deslocamento in range(1, len(saida)):
+                self._ancorar(posicao + deslocamento, base + inicio)
+            posicao += len(saida)
+            self._ancorar(posicao, base + fim)
+            anterior = fim
+        partes.append(texto[anterior:].lower())
+        self.posicao_sombra = posicao + len(texto) - anterior
+        self.posicao_original = base + len(texto)
+        return "".join(partes)
+
+
+def normalizar_com_mapa(texto):
+    """Devolve (sombra, âncoras na sombra, âncoras no original)."""
+    normalizador = Normalizador()
+    return normalizador.normalizar(texto), normalizador.ancoras_sombra, normalizador.ancoras_original
+
+
+def normalizar(texto):
+    """Só a sombra de `texto` (para normalizar padrões e consultas)."""
+    return normalizar_com_mapa(texto)[0]
+
+
+class Sombra:
+    """Sombra de um documento com o mapa de volta às posições do original.
+
+    Vem de um texto em memória (de_texto) ou dos arquivos guardados por
+    Sombras; nesse caso sombra e original só são abertos (por mmap) quando
+    pedacos() ou original() são chamados, e fechados em seguida.
+    """
+
+    def __init__(self, ancoras_sombra, ancoras_original, encoding=None, texto=None, conteudo=None,
+                 caminho_sombra=None, caminho=None, pontos_caracteres=None, pontos_bytes=None):
+        self.ancoras_sombra = ancoras_sombra
+        self.ancoras_original = ancoras_original
+        self.encoding = encoding
+        self._texto = texto
+        self._conteudo = conteudo
+        self.caminho_sombra = caminho_sombra
+        self.caminho = caminho
+        self.pontos_caracteres = pontos_caracteres
+        self.pontos_bytes = pontos_bytes
+
+    @classmethod
+    def de_texto(cls, texto, encoding=None):
+        sombra, ancoras_sombra, ancoras_original = normalizar_com_mapa(texto)
+        return cls(ancoras_sombra, ancoras_original, encoding, texto=sombra, conteudo=texto)
+
+    @property
+    def texto(self):
+        """A sombra inteira (materializa o arquivo; para varrer, prefira pedacos())."""
+        if self._texto is not None:
+            return self._texto
+        return "".join(pedaco for _, pedaco in self.pedacos())
+
+    def pedacos(self, tamanho=TAMANHO_BLOCO):
+        """Gera (posição, pedaço) da sombra, cada pedaço terminando num espaço (ou no fim do texto)."""
+        if self._texto is not None:
+            yield 0, self._texto
+            return
+        dados = mapear(self.caminho_sombra)
+        try:
+            posicao = 0
+            while posicao < len(dados):
+                pedaco = dados[posicao:posicao + tamanho].decode("ascii")
+                if posicao + len(pedaco) < len(dados):
+                    corte = pedaco.rfind(" ") + 1
+                    # sem espaço no pedaço, corta antes do último termo
+                    corte = corte or len(pedaco.rstrip("abcdefghijklmnopqrstuvwxyz0123456789"))
+                    pedaco = pedaco[:corte] if corte else pedaco
+                yield posicao, pedaco
+                posicao += len(pedaco)
+        finally:
+            if isinstance(dados, mmap.mmap):
+                dados.close()
+
+    def posicao_original(self, posicao):
+        indice = bisect_right(self.ancoras_sombra, posicao) - 1
+        return self.ancoras_original[indice] + posicao - self.ancoras_sombra[indice]
+
+    def intervalo_original(self, inicio, fim):
+        """[inicio, fim) da sombra convertido para o original (o fim cobre o último caractere inteiro)."""
+        if fim <= inicio:
+            posicao = self.posicao_original(inicio)
+            return posicao, posicao
+        return self.posicao_original(inicio), self.posicao_original(fim - 1) + 1
+
+    def encontrar(self, padrao):
+        """Gera o (inicio, fim) na sombra de cada ocorrência do padrão já normalizado, inclusive sobrepostas.
+
+        O padrão não pode ter espaços (os pedaços são cortados neles).
+        """
+        if not padrao:
+            return
+        for deslocamento, pedaco in self.pedacos():
+            posicao = pedaco.find(padrao)
+            while posicao >= 0:
+                yield deslocamento + posicao, deslocamento + posicao + len(padrao)
+                posicao = pedaco.find(padrao, posicao + 1)
+
+    def original(self, inicio, fim):
+        """Os caracteres [inicio, fim) do texto original; só essa janela é decodificada."""
+        inicio = max(0, inicio)
+        if fim <= inicio:
+            return ""
+        if self._conteudo is not None:
+            return self._conteudo[inicio:fim]
+        # decodifica a partir do ponto de controle anterior ao início, pulando os caracteres até ele
+        indice = bisect_right(self.pontos_caracteres, inicio) - 1
+        pular = inicio - self.pontos_caracteres[indice]
+        posicao = self.pontos_bytes[indice]
+        decodificador = codecs.getincrementaldecoder(self.encoding)()
+        partes, faltam = [], pular + fim - inicio
+        dados = mapear(self.caminho)
+        try:
+            while faltam > 0 and posicao < len(dados):
+                pedaco = decodificador.decode(dados[posicao:posicao + TAMANHO_BLOCO])
+                posicao += TAMANHO_BLOCO
+                partes.append(pedaco[:faltam])
+                faltam -= len(partes[-1])
+        finally:
+            if isinstance(dados, mmap.mmap):
+                dados.close()
+        return "".join(partes)[pular:]
+
+
+def descartar_outra_versao(conn, tabelas):
+    """Esvazia as tabelas de um cache gravado com outra VERSAO_NORMALIZACAO."""
+    if conn.execute("PRAGMA user_version").fetchone()[0] == VERSAO_NORMALIZACAO:
+        return
+    for tabela in tabelas:
+        conn.execute(f"DELETE FROM {tabela}")
+    conn.execute(f"PRAGMA user_version = {VERSAO_NORMALIZACAO}")
+    conn.commit()
+
+
+def chave_caminho(caminho):
+    """Caminho absoluto e canônico: "a//b.txt", "./a/b.txt" e um link para ele dão a mesma sombra."""
+    return os.path.normcase(os.path.realpath(caminho))
+
+
+class Sombras:
+    """Sombras dos .txt em PASTA_SOMBRAS, com os metadados em SQLite; regeradas só quando mudam tamanho ou mtime."""
+
+    def __init__(self, caminho_db=CAMINHO_DB, pasta=None):
+        self.pasta = pasta or os.path.dirname(caminho_db)
+        os.makedirs(self.pasta, exist_ok=True)
+        self._conn = sqlite3.connect(caminho_db)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sombras (
+                caminho TEXT PRIMARY KEY,
+                mtime_ns INTEGER,
+                tamanho INTEGER,
+                encoding TEXT,
+                ancoras_sombra BLOB,
+                ancoras_original BLOB,
+                pontos_caracteres BLOB,
+                pontos_bytes BLOB
+            )
+            """
+        )
+        self._conn.commit()
+        descartar_outra_versao(self._conn, ["sombras"])
+
+    def caminho_sombra(self, caminho):
+        caminho = chave_caminho(caminho)
+        return os.path.join(self.pasta, hashlib.sha256(caminho.encode("utf-8")).hexdigest()[:32] + ".txt")
+
+    def de(self, caminho):
+        """A sombra do arquivo, gerada e guardada se ainda não existir ou estiver desatualizada."""
+        caminho = chave_caminho(caminho)
+        stat = os.stat(caminho)
+        linha = self._conn.execute(
+            "SELECT encoding, ancoras_sombra, ancoras_original, pontos_caracteres, pontos_bytes FROM sombras "
+            "WHERE caminho = ? AND mtime_ns = ? AND tamanho = ?",
+            (caminho, stat.st_mtime_ns, stat.st_size),
+        ).fetchone()
+        if linha is None or not os.path.exists(self.caminho_sombra(caminho)):
+            return self._gerar(caminho, stat)
+        encoding, *blobs = linha
+        ancoras_sombra, ancoras_original, pontos_caracteres, pontos_bytes = (array("I") for _ in blobs)
+        for valores, blob in zip((ancoras_sombra, ancoras_original, pontos_caracteres, pontos_bytes), blobs):
+            valores.frombytes(blob)
+        return Sombra(ancoras_sombra, ancoras_original, encoding, caminho_sombra=self.caminho_sombra(caminho),
+                      caminho=caminho, pontos_caracteres=pontos_caracteres, pontos_bytes=pontos_bytes)
+
+    def atualizar(self, caminhos):
+        """Gera as sombras que faltam ou estão desatualizadas. Devolve quantas foram geradas."""
+        geradas = 0
+        for caminho in map(chave_caminho, caminhos):
+            stat = os.stat(caminho)
+            atual = self._conn.execute(
+                "SELECT 1 FROM sombras WHERE caminho = ? AND mtime_ns = ? AND tamanho = ?",
+                (caminho, stat.st_mtime_ns, stat.st_size),
+            ).fetchone()
+            if not atual or not os.path.exists(self.caminho_sombra(caminho)):
+                self._gerar(caminho, stat)
+                geradas += 1
+        return geradas
+
+    def podar(self):
+        """Remove as sombras de arquivos que não existem mais ou gravadas com caminho não canônico. Devolve quantas."""
+        removidas = [
+            caminho for (caminho,) in self._conn.execute("SELECT caminho FROM sombras")
+            if caminho != chave_caminho(caminho) or not os.path.exists(caminho)
+        ]
+        self._conn.executemany("DELETE FROM sombras WHERE caminho = ?", ((caminho,) for caminho in removidas))
+        self._conn.commit()
+        # arquivos de sombra sem linha na tabela (como os das chaves removidas acima) são apagados
+        em_uso = {
+            os.path.basename(self.caminho_sombra(caminho))
+            for (caminho,) in self._conn.execute("SELECT caminho FROM sombras")
+        }
+        for nome in os.listdir(self.pasta):
+            if nome.endswith(".txt") and nome not in em_uso:
+                os.remove(os.path.join(self.pasta, nome))
+        return len(removidas)
+
+    def _gerar(self, caminho, stat):
+        destino = self.caminho_sombra(caminho)
+        try:
+            encoding, normalizador, pontos = self._escrever(caminho, destino + ".tmp", "utf-8")
+        except UnicodeDecodeError:
+            encoding, normalizador, pontos = self._escrever(caminho, destino + ".tmp", "latin-1")
+        os.replace(destino + ".tmp", destino)
+        pontos_caracteres, pontos_bytes = pontos
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sombras VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (caminho, stat.st_mtime_ns, stat.st_size, encoding,
+             normalizador.ancoras_sombra.tobytes(), normalizador.ancoras_original.tobytes(),
+             pontos_caracteres.tobytes(), pontos_bytes.tobytes()),
+        )
+        self._conn.commit()
+        return Sombra(normalizador.ancoras_sombra, normalizador.ancoras_original, encoding, caminho_sombra=destino,
+                      caminho=caminho, pontos_caracteres=pontos_caracteres, pontos_bytes=pontos_bytes)
+
+    @staticmethod
+    def _escrever(caminho, destino, encoding):
+        """Decodifica o original em blocos, grava a sombra em `destino` e anota um ponto de controle por bloco."""
+        decodificador = codecs.getincrementaldecoder(encoding)()
+        normalizador = Normalizador()
+        pontos_caracteres, pontos_bytes = array("I"), array("I")
+        caracteres, resto = 0, ""
+        dados = mapear(caminho)
+        try:
+            with open(destino, "w", encoding="ascii", newline="") as saida:
+                for posicao in range(0, len(dados), TAMANHO_BLOCO):
+                    # bytes de um caractere partido ao meio ficam no decodificador e são do bloco seguinte
+                    pontos_caracteres.append(caracteres)
+                    pontos_bytes.append(posicao - len(decodificador.getstate()[0]))
+                    bloco = decodificador.decode(dados[posicao:posicao + TAMANHO_BLOCO])
+                    caracteres += len(bloco)
+                    texto = resto + bloco
+                    corte = cortar_no_espaco(texto)
+                    saida.write(normalizador.normalizar(texto[:corte]))
+                    resto = texto[corte:]
+                resto += decodificador.decode(b"", final=True)
+                saida.write(normalizador.normalizar(resto))
+        finally:
+            if isinstance(dados, mmap.mmap):
+                dados.close()
+        if not pontos_caracteres:
+            pontos_caracteres.append(0)
+            pontos_bytes.append(0)
+        return encoding, normalizador, (pontos_caracteres, pontos_bytes)
@@ -0,0 +1,114 @@
+import re
+from collections import defaultdict
+from unidecode import unidecode
+
+from indice import SUFIXO_LEI_RE
+
+# UF: (nome do estado, código IBGE da UF, capital, código IBGE do município da capital)
+# Os códigos das capitais são os territory_id do Querido Diário (querido_diario.CAPITAIS sai daqui)
+UFS = {
+    "AC": ("Acre", 12, "Rio Branco", 1200401),
+    "AL": ("Alagoas", 27, "Maceió", 2704302),
+    "AP": ("Amapá", 16, "Macapá", 1600303),
+    "AM": ("Amazonas", 13, "Manaus", 1302603),
+    "BA": ("Bahia", 29, "Salvador", 2927408),
+    "CE": ("Ceará", 23, "Fortaleza", 2304400),
+    "DF": ("Distrito Federal", 53, "Brasília", 5300108),
+    "ES": ("Espírito Santo", 32, "Vitória", 3205309),
+    "GO": ("Goiás", 52, "Goiânia", 5208707),
+    "MA": ("Maranhão", 21, "São Luís", 2111300),
+    "MT": ("Mato Grosso", 51, "Cuiabá", 5103403),
+    "MS": ("Mato Grosso do Sul", 50, "Campo Grande", 5002704),
+    "MG": ("Minas Gerais", 31, "Belo Horizonte", 3106200),
+    "PA": ("Pará", 15, "Belém", 1501402),
+    "PB": ("Paraíba", 25, "João Pessoa", 2507507),
+    "PR": ("Paraná", 41, "Curitiba", 4106902),
+    "PE": ("Pernambuco", 26, "Recife", 2611606),
+    "PI": ("Piauí", 22, "Teresina", 2211001),
+    "RJ": ("Rio de Janeiro", 33, "Rio de Janeiro", 3304557),
+    "RN": ("Rio Grande do Norte", 24, "Natal", 2408102),
+    "RS": ("Rio Grande do Sul", 43, "Porto Alegre", 4314902),
+    "RO": ("Rondônia", 11, "Porto Velho", 1100205),
+    "RR": ("Roraima", 14, "Boa Vista", 1400100),
+    "SC": ("Santa Catarina", 42, "Florianópolis", 4205407),
+    "SP": ("São Paulo", 35, "São Paulo", 3550308),
+    "SE": ("Sergipe", 28, "Aracaju", 2800308),
+    "TO": ("Tocantins", 17, "Palmas", 1721000),
+}
+
+TIPOS = ["capital", "estado"]
+
+# código IBGE → (nome, UF), de capitais e estados
+NOMES = {}
+for _uf, (_estado, _codigo_uf, _capital, _codigo_capital) in UFS.items():
+    NOMES[_codigo_uf] = (_estado, _uf)
+    NOMES[_codigo_capital] = (_capital, _uf)
+
+# UF entre parênteses no fim do nome: "Rio Branco (AC)"
+UF_ENTRE_PARENTESES_RE = re.compile(r"\(\s*([A-Za-z]{2})\s*\)")
+
+
+def normalizar(nome):
+    """Minúsculas, sem acentos, espaços ou pontuação: "São Luís" → "saoluis"."""
+    return re.sub(r"[^a-z0-9]", "", unidecode(nome).lower())
+
+
+class IndiceTerritorios:
+    """Índice de nomes de capitais e estados para códigos IBGE.
+
+    Cada território é registrado pelo nome completo normalizado e pela
+    primeira palavra do nome, que é como a coleta nomeia os arquivos
+    ("Belo_LAI", "Joao_LAI"). Um apelido que serve a mais de um território
+    ("rio", "mato") fica ambíguo e não é resolvido sozinho; a UF, vinda do
+    prefixo do arquivo ou dos parênteses do CSV, desempata.
+    """
+
+    def __init__(self):
+        # (tipo, nome normalizado) → {código IBGE: UF}
+        self._completos = defaultdict(dict)
+        self._apelidos = defaultdict(dict)
+        for uf, (estado, codigo_uf, capital, codigo_capital) in UFS.items():
+            self._registrar("estado", estado, codigo_uf, uf)
+            self._registrar("capital", capital, codigo_capital, uf)
+        # A planilha chama Brasília de "Distrito Federal (DF)" na linha da capital
+        self._registrar("capital", "Distrito Federal", UFS["DF"][3], "DF")
+
+    def _registrar(self, tipo, nome, codigo, uf):
+        self._completos[(tipo, normalizar(nome))][codigo] = uf
+        self._apelidos[(tipo, normalizar(nome.split()[0]))][codigo] = uf
+
+    def resolver(self, nome, tipo=None, uf=None):
+        """Códigos IBGE candidatos para `nome` (vazio se nenhum; mais de um se ambíguo).
+
+        Sem `tipo`, procura entre capitais e estados; com `uf`, descarta os de outras UFs.
+        """
+        chave = normalizar(nome)
+        if not chave:
+            return []
+        candidatos = {}
+        for tipo_busca in ([tipo] if tipo else TIPOS):
+            encontrados = self._completos.get((tipo_busca, chave)) or self._apelidos.get((tipo_busca, chave)) or {}
+            candidatos.update(encontrados)
+        if uf:
+            candidatos = {codigo: uf_codigo for codigo, uf_codigo in candidatos.items() if uf_codigo == uf.upper()}
+        return sorted(candidatos)
+
+    def resolver_linha(self, nome, tipo=None):
+        """Resolve um nome da planilha ("Rio Branco (AC)", "Minas Gerais"), usando a UF entre parênteses."""
+        uf = UF_ENTRE_PARENTESES_RE.search(nome)
+        nome = UF_ENTRE_PARENTESES_RE.sub("", nome)
+        return self.resolver(nome, normalizar_tipo(tipo), uf.group(1) if uf else None)
+
+    def resolver_arquivo(self, chave, tipo=None):
+        """Resolve o nome de um arquivo extraído ("Macapa_LAI", "TO_Palmas_LGPD", "SaoPaulo_LGD")."""
+        partes = SUFIXO_LEI_RE.sub("", chave).split("_")
+        uf = None
+        if len(partes) > 1 and partes[0].upper() in UFS:
+            uf = partes.pop(0)
+        return self.resolver("".join(partes), normalizar_tipo(tipo), uf)
+
+
+def normalizar_tipo(tipo):
+    """"Capital" / "Estado" da planilha (ou da pasta) para o tipo do índice; outros valores viram None."""
+    tipo = normalizar(tipo or "")
+    return tipo if tipo in TIPOS else None
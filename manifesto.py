@@ -0,0 +1,293 @@
+import os
+import re
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+
+# Buffer de leitura/escrita dos downloads: cresce com o tamanho anunciado do arquivo
+BUFFER_MINIMO = 64 * 1024
+BUFFER_MAXIMO = 1024 * 1024
+# Quantos buffers, no mínimo, um arquivo grande deve render (para o progresso e a retomada)
+BUFFERS_POR_ARQUIVO = 64
+
+# Situação da última tentativa de cada URL: baixada, falha que não se resolve tentando de novo
+# (4xx, como link quebrado) ou falha passageira (rede, 5xx, arquivo incompleto)
+SITUACAO_OK = "ok"
+SITUACAO_PERMANENTE = "falha_permanente"
+SITUACAO_TEMPORARIA = "falha_temporaria"
+
+CONTENT_RANGE_RE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+
+class DownloadIncompleto(IOError):
+    """A conexão terminou antes do Content-Length anunciado; o .parcial fica para a retomada."""
+
+
+class DownloadCorrompido(IOError):
+    """Bytes a mais que o anunciado ou SHA-256 diferente do esperado; o .parcial é descartado."""
+
+
+def tamanho_do_buffer(total: int | None) -> int:
+    """Tamanho do buffer para um arquivo de `total` bytes, entre BUFFER_MINIMO e BUFFER_MAXIMO."""
+    if not total:
+        return BUFFER_MINIMO
+    return max(BUFFER_MINIMO, min(BUFFER_MAXIMO, total // BUFFERS_POR_ARQUIVO))
+
+
+class DownloadParcial:
+    """Transferência gravada em `<caminho>.parcial` e movida para o destino só quando completa.
+
+    Uma transferência interrompida deixa o .parcial e, ao lado, o validador
+    do servidor (ETag forte ou Last-Modified). Na próxima tentativa,
+    `cabecalhos()` pede só o que falta com Range + If-Range; se o arquivo
+    mudou no servidor, ele responde 200 e a transferência recomeça do zero.
+    Uso, com qualquer cliente HTTP:
+
+        parcial = DownloadParcial(caminho_parcial)
+        resposta = get(url, headers=parcial.cabecalhos())
+        parcial.iniciar(resposta.status, resposta.headers)
+        for chunk in corpo(parcial.buffer):
+            parcial.escrever(chunk)
+        sha256, tamanho = parcial.concluir(destino)
+    """
+
+    def __init__(self, caminho: str, sha256_esperado: str | None = None):
+        self.caminho = caminho
+        self.caminho_meta = caminho + ".json"
+        self.sha256_esperado = sha256_esperado
+        self.retomado_de = 0
+        self.total = None
+        self.buffer = BUFFER_MINIMO
+        self._arquivo = None
+        self._sha = None
+        self._tamanho = 0
+
+    def _validador(self):
+        try:
+            with open(self.caminho_meta, encoding="utf-8") as arquivo:
+                return json.load(arquivo).get("validador")
+        except (OSError, ValueError):
+            return None
+
+    def cabecalhos(self) -> dict:
+        """Range/If-Range para continuar de onde a última tentativa parou (vazio se não houver o que retomar)."""
+        validador = self._validador()
+        if not validador or not os.path.exists(self.caminho):
+            return {}
+        tamanho = os.path.getsize(self.caminho)
+        return {"Range": f"bytes={tamanho}-", "If-Range": validador} if tamanho else {}
+
+    def iniciar(self, status: int, headers):
+        """Abre o .parcial conforme a resposta: continua em 206, recomeça em 200."""
+        self.descartar_arquivo_aberto()
+        inicio = 0
+        if status == 206:
+            faixa = CONTENT_RANGE_RE.match(headers.get("Content-Range") or "")
+            tamanho_local = os.path.getsize(self.caminho) if os.path.exists(self.caminho) else 0
+            if not faixa or int(faixa.group(1)) != tamanho_local:
+                raise DownloadCorrompido(f"Content-Range inesperado: {headers.get('Content-Range')!r}")
+            inicio = tamanho_local
+            self.total = int(faixa.group(3)) if faixa.group(3) != "*" else None
+        else:
+            comprimento = headers.get("Content-Length")
+            self.total = int(comprimento) if comprimento and comprimento.isdigit() else None
+        if (headers.get("Content-Encoding") or "identity").lower() != "identity":
+            # o cliente descomprime o corpo, e o tamanho anunciado é o comprimido
+            self.total = None
+
+        # ETag fraco não serve para If-Range; nesse caso fica o Last-Modified
+        etag = headers.get("ETag")
+        validador = etag if etag and not etag.startswith("W/") else headers.get("Last-Modified")
+        os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+        if validador:
+            with open(self.caminho_meta, "w", encoding="utf-8") as arquivo:
+                json.dump({"validador": validador, "total": self.total}, arquivo)
+        elif os.path.exists(self.caminho_meta):
+            os.remove(self.caminho_meta)
+
+        self._sha = hashlib.sha256()
+        if inicio:
+            # o SHA-256 cobre o arquivo inteiro, então o trecho já baixado entra no cálculo
+            with open(self.caminho, "rb") as anterior:
+                for bloco in iter(lambda: anterior.read(BUFFER_MAXIMO), b""):
+                    self._sha.update(bloco)
+        self._arquivo = open(self.caminho, "ab" if inicio else "wb")
+        self._tamanho = inicio
+        self.retomado_de = inicio
+        self.buffer = tamanho_do_buffer(self.total)
+
+    def escrever(self, chunk: bytes):
+        self._sha.update(chunk)
+        self._tamanho += len(chunk)
+        self._arquivo.write(chunk)
+
+    def concluir(self, destino: str | None = None) -> tuple[str, int]:
+        """Confere tamanho e hash e move o .parcial para `destino`; devolve (sha256, tamanho).
+
+        Sem `destino`, o arquivo conferido fica em `self.caminho` para quem chamou movê-lo.
+        """
+        self.descartar_arquivo_aberto()
+        if self.total is not None and self._tamanho < self.total:
+            raise DownloadIncompleto(f"{self._tamanho} de {self.total} bytes")
+        if self.total is not None and self._tamanho > self.total:
+            self.descartar()
+            raise DownloadCorrompido(f"{self._tamanho} bytes, {self.total} anunciados")
+        digest = self._sha.hexdigest()
+        if self.sha256_esperado and digest != self.sha256_esperado:
+            self.descartar()
+            raise DownloadCorrompido(f"SHA-256 {digest[:12]}…, esperado {self.sha256_esperado[:12]}…")
+        if os.path.exists(self.caminho_meta):
+            os.remove(self.caminho_meta)
+        if destino:
+            os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+            # rename no mesmo sistema de arquivos: o destino troca de uma vez, nunca pela metade
+            os.replace(self.caminho, destino)
+        return digest, self._tamanho
+
+    def descartar_arquivo_aberto(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+
+    def descartar(self):
+        """Apaga o .parcial e o validador (a próxima tentativa recomeça do zero)."""
+        self.descartar_arquivo_aberto()
+        for caminho in (self.caminho, self.caminho_meta):
+            if os.path.exists(caminho):
+                os.remove(caminho)
+
+
+class Manifesto:
+    """Manifesto local dos downloads com armazenamento endereçado por conteúdo.
+
+    Para cada URL guarda a URL final, ETag, Last-Modified, tamanho e SHA-256
+    do artefato. Os bytes ficam uma única vez em `objetos/<sha[:2]>/<sha>` e
+    as pastas dados_brutos recebem um hard link (ou cópia, se o sistema de
+    arquivos não permitir link) para o objeto. Downloads em andamento ficam
+    em `parciais/`, com nome derivado da URL, até serem conferidos e movidos
+    para `objetos/`.
+    """
+
+    def __init__(self, pasta: str):
+        self.pasta = pasta
+        self.pasta_objetos = os.path.join(pasta, "objetos")
+        self.pasta_parciais = os.path.join(pasta, "parciais")
+        os.makedirs(self.pasta_objetos, exist_ok=True)
+        os.makedirs(self.pasta_parciais, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(pasta, "manifesto.sqlite"), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS artefatos (
+                url TEXT PRIMARY KEY,
+                final_url TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                tamanho INTEGER,
+                sha256 TEXT,
+                extensao TEXT,
+                atualizado_em REAL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS situacoes (
+                url TEXT PRIMARY KEY,
+                situacao TEXT,
+                motivo TEXT,
+                atualizado_em REAL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def buscar(self, url: str):
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT url, final_url, etag, last_modified, tamanho, sha256, extensao FROM artefatos WHERE url = ?",
+                (url,),
+            )
+            linha = cursor.fetchone()
+        if linha is None:
+            return None
+        colunas = ["url", "final_url", "etag", "last_modified", "tamanho", "sha256", "extensao"]
+        return dict(zip(colunas, linha))
+
+    def conhece_objeto(self, sha256: str, extensao: str | None = None) -> bool:
+        """Se algum download registrado (com essa extensão, se dada) tem esse conteúdo."""
+        consulta = "SELECT 1 FROM artefatos WHERE sha256 = ?" + (" AND extensao = ?" if extensao else "")
+        parametros = (sha256, extensao) if extensao else (sha256,)
+        with self._lock:
+            return self._conn.execute(consulta, parametros).fetchone() is not None
+
+    def registrar(self, url, final_url, etag, last_modified, tamanho, sha256, extensao):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artefatos VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, final_url, etag, last_modified, tamanho, sha256, extensao, time.time()),
+            )
+            self._conn.commit()
+
+    def anotar_situacao(self, url: str, situacao: str, motivo: str | None = None):
+        """Resultado da última tentativa de baixar `url`: SITUACAO_OK, SITUACAO_PERMANENTE ou SITUACAO_TEMPORARIA."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO situacoes VALUES (?, ?, ?, ?)", (url, situacao, motivo, time.time())
+            )
+            self._conn.commit()
+
+    def situacao(self, url: str):
+        with self._lock:
+            linha = self._conn.execute("SELECT situacao FROM situacoes WHERE url = ?", (url,)).fetchone()
+        return linha[0] if linha else None
+
+    def cabecalhos_condicionais(self, url: str) -> dict:
+        """Cabeçalhos If-None-Match/If-Modified-Since para uma URL cujo objeto ainda está no armazém."""
+        registro = self.buscar(url)
+        if not registro or not os.path.exists(self.caminho_objeto(registro["sha256"])):
+            return {}
+        headers = {}
+        if registro["etag"]:
+            headers["If-None-Match"] = registro["etag"]
+        if registro["last_modified"]:
+            headers["If-Modified-Since"] = registro["last_modified"]
+        return headers
+
+    def caminho_objeto(self, sha256: str) -> str:
+        return os.path.join(self.pasta_objetos, sha256[:2], sha256)
+
+    def caminho_parcial(self, url: str) -> str:
+        """Onde fica a transferência em andamento de `url`, estável entre execuções para permitir a retomada."""
+        return os.path.join(self.pasta_parciais, hashlib.sha256(url.encode("utf-8")).hexdigest()[:32] + ".parcial")
+
+    def adotar(self, caminho: str, sha256: str):
+        """Move para o armazém um arquivo completo cujo SHA-256 já foi calculado (descarta se já houver)."""
+        final = self.caminho_objeto(sha256)
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        if os.path.exists(final):
+            os.remove(caminho)
+        else:
+            os.replace(caminho, final)
+
+    def vincular(self, sha256: str, destino: str):
+        """Coloca o objeto em `destino` por hard link, caindo para cópia quando não for possível."""
+        origem = self.caminho_objeto(sha256)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        if os.path.exists(destino) and os.path.samefile(origem, destino):
+            return
+        # link (ou cópia) num nome temporário e rename por cima: o destino nunca fica pela metade
+        temporario = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            try:
+                os.link(origem, temporario)
+            except OSError:
+                shutil.copyfile(origem, temporario)
+            os.replace(temporario, destino)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
@@ -0,0 +1,227 @@
+import os
+import sys
+import json
+import time
+import bisect
+import cProfile
+import argparse
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Eventos estruturados (um JSON por linha) de cada arquivo processado pelos
+# scripts, e perfilamento opcional com cProfile.
+#
+#   with medir_arquivo("extract", caminho) as evento:
+#       ...                               # evento["bytes"] = ..., anotar(status_http=200)
+#
+# Funções mais internas (OCR de uma página, uma tentativa HTTP) somam no evento
+# corrente com acumular()/anotar(), sem precisar receber o evento por parâmetro.
+#
+#   python metricas.py                    # resumo com contadores e histogramas
+#   PERFILAR=extract python extracao.py   # grava .cache/metricas/perfil_extract_<pid>.prof
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PASTA_METRICAS = os.path.join(BASE_DIR, ".cache", "metricas")
+# METRICAS_ARQUIVO= (vazio) desliga a gravação dos eventos
+ARQUIVO_EVENTOS = os.environ.get("METRICAS_ARQUIVO", os.path.join(PASTA_METRICAS, "eventos.jsonl"))
+# Etapas perfiladas, separadas por vírgula ("extract,download"), ou "all"
+PERFILAR = {etapa.strip() for etapa in os.environ.get("PERFILAR", "").split(",") if etapa.strip()}
+
+# Limites (em segundos) das faixas do histograma de latência
+FAIXAS_LATENCIA = [0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60]
+
+_evento_atual = contextvars.ContextVar("evento_atual", default=None)
+_lock_escrita = threading.Lock()
+# Perfis por etapa, acumulados entre os blocos, e a thread que está com um perfil ligado
+_perfis = {}
+_lock_perfis = threading.Lock()
+_dono_do_perfil = None
+
+
+def registrar_evento(evento: dict, caminho: str | None = ARQUIVO_EVENTOS):
+    """Acrescenta o evento como uma linha JSON; uma única escrita em modo append, segura entre processos."""
+    if not caminho:
+        return
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    linha = json.dumps(evento, ensure_ascii=False, default=str) + "\n"
+    with _lock_escrita, open(caminho, "a", encoding="utf-8") as arquivo:
+        arquivo.write(linha)
+
+
+@contextmanager
+def medir_arquivo(etapa: str, arquivo: str, **campos):
+    """Mede o processamento de um arquivo e grava o evento ao sair, com a duração e o erro, se houver."""
+    evento = {"etapa": etapa, "arquivo": arquivo, "pid": os.getpid(), **campos}
+    token = _evento_atual.set(evento)
+    inicio = time.perf_counter()
+    evento["inicio"] = time.time()
+    try:
+        yield evento
+    except BaseException as e:
+        evento["erro"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        evento["duracao"] = time.perf_counter() - inicio
+        _evento_atual.reset(token)
+        registrar_evento(evento)
+
+
+def acumular(campo: str, valor=1):
+    """Soma `valor` ao campo do evento corrente (nada acontece fora de um medir_arquivo)."""
+    evento = _evento_atual.get()
+    if evento is not None:
+        evento[campo] = evento.get(campo, 0) + valor
+
+
+def anotar(**campos):
+    """Grava campos no evento corrente (nada acontece fora de um medir_arquivo)."""
+    evento = _evento_atual.get()
+    if evento is not None:
+        evento.update(campos)
+
+
+@contextmanager
+def perfilar(etapa: str):
+    """Roda o bloco sob cProfile se a etapa estiver em PERFILAR.
+
+    Só um perfil fica ligado por vez no processo: o Python 3.12+ recusa um
+    segundo enable() simultâneo ("Another profiling tool is already active").
+    A thread que entra primeiro liga o perfil da etapa; blocos de outras
+    threads enquanto ele está ligado, e blocos aninhados, rodam sem perfil
+    próprio. Até o 3.11 o perfil só enxerga a thread que o ligou, então num
+    pool de threads (como o da coleta) ele amostra os blocos de quem pegou a
+    vez; do 3.12 em diante (sys.monitoring) ele vê todas as threads. O perfil
+    de cada etapa é acumulado entre os blocos e regravado ao fim de cada um em
+    perfil_<etapa>_<pid>.prof. Os .prof se juntam com pstats.Stats(*arquivos),
+    abrem no snakeviz e viram flamegraph com flameprof ou gprof2dot.
+    """
+    global _dono_do_perfil
+    if etapa not in PERFILAR and "all" not in PERFILAR:
+        yield
+        return
+    with _lock_perfis:
+        livre = _dono_do_perfil is None
+        if livre:
+            _dono_do_perfil = threading.get_ident()
+            perfil = _perfis.setdefault(etapa, cProfile.Profile())
+    if not livre:
+        yield
+        return
+    try:
+        perfil.enable()
+    except ValueError:
+        # outra ferramenta de perfil (um depurador, por exemplo) já está ligada
+        with _lock_perfis:
+            _dono_do_perfil = None
+        perfil = None
+    if perfil is None:
+        yield
+        return
+    try:
+        yield
+    finally:
+        perfil.disable()
+        with _lock_perfis:
+            _dono_do_perfil = None
+            os.makedirs(PASTA_METRICAS, exist_ok=True)
+            perfil.dump_stats(os.path.join(PASTA_METRICAS, f"perfil_{etapa}_{os.getpid()}.prof"))
+
+
+# -------------------------------------------------------------------
+# Resumo
+# -------------------------------------------------------------------
+def ler_eventos(caminho: str = ARQUIVO_EVENTOS):
+    if not caminho or not os.path.exists(caminho):
+        return []
+    with open(caminho, encoding="utf-8") as arquivo:
+        return [json.loads(linha) for linha in arquivo if linha.strip()]
+
+
+def percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return 0.0
+    indice = min(len(valores_ordenados) - 1, int(round(p / 100 * (len(valores_ordenados) - 1))))
+    return valores_ordenados[indice]
+
+
+def histograma(duracoes):
+    """Contagem de durações por faixa de FAIXAS_LATENCIA (a última faixa é "acima do maior limite")."""
+    contagens = [0] * (len(FAIXAS_LATENCIA) + 1)
+    for duracao in duracoes:
+        contagens[bisect.bisect_left(FAIXAS_LATENCIA, duracao)] += 1
+    return contagens
+
+
+def resumir(eventos):
+    """Contadores, totais e latências por etapa."""
+    por_etapa = defaultdict(list)
+    for evento in eventos:
+        por_etapa[evento["etapa"]].append(evento)
+
+    resumo = {}
+    for etapa, lista in sorted(por_etapa.items()):
+        duracoes = sorted(evento.get("duracao", 0.0) for evento in lista)
+        status = defaultdict(int)
+        for evento in lista:
+            if "status_http" in evento:
+                status[str(evento["status_http"])] += 1
+        resumo[etapa] = {
+            "eventos": len(lista),
+            "erros": sum(1 for evento in lista if evento.get("erro")),
+            "bytes": sum(evento.get("bytes", 0) for evento in lista),
+            "paginas": sum(evento.get("paginas", 0) for evento in lista),
+            "paginas_ocr": sum(evento.get("paginas_ocr", 0) for evento in lista),
+            "segundos_ocr": sum(evento.get("segundos_ocr", 0.0) for evento in lista),
+            "tentativas_extras": sum(max(0, evento.get("tentativas", 1) - 1) for evento in lista),
+            "reaproveitados": sum(1 for evento in lista if evento.get("reaproveitado")),
+            "status_http": dict(status),
+            "segundos": sum(duracoes),
+            "p50": percentil(duracoes, 50),
+            "p90": percentil(duracoes, 90),
+            "p99": percentil(duracoes, 99),
+            "histograma": histograma(duracoes),
+        }
+    return resumo
+
+
+def imprimir_resumo(resumo):
+    rotulos = [f"< {limite}s" for limite in FAIXAS_LATENCIA] + [f">= {FAIXAS_LATENCIA[-1]}s"]
+    for etapa, dados in resumo.items():
+        print(f"\n📊 {etapa}: {dados['eventos']} arquivos, {dados['erros']} erros, {dados['segundos']:.1f}s no total")
+        print(f"   {dados['bytes'] / (1024 * 1024):.1f} MB, {dados['paginas']} páginas, "
+              f"{dados['paginas_ocr']} com OCR ({dados['segundos_ocr']:.1f}s de OCR)")
+        if dados["status_http"]:
+            status = ", ".join(f"{codigo}: {qtd}" for codigo, qtd in sorted(dados["status_http"].items()))
+            print(f"   HTTP {status}; {dados['tentativas_extras']} novas tentativas")
+        if dados["reaproveitados"]:
+            print(f"   {dados['reaproveitados']} reaproveitados de duplicatas")
+        print(f"   latência p50 {dados['p50']:.3f}s, p90 {dados['p90']:.3f}s, p99 {dados['p99']:.3f}s")
+        maior = max(dados["histograma"]) or 1
+        for rotulo, contagem in zip(rotulos, dados["histograma"]):
+            if contagem:
+                print(f"   {rotulo:>8} | {'█' * max(1, round(30 * contagem / maior))} {contagem}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumo dos eventos de métricas gravados pelos scripts.")
+    parser.add_argument("--arquivo", default=ARQUIVO_EVENTOS, help="arquivo JSONL de eventos")
+    parser.add_argument("--etapa", action="append", help="mostra só as etapas indicadas (pode repetir)")
+    parser.add_argument("--json", action="store_true", help="imprime o resumo em JSON")
+    args = parser.parse_args()
+
+    eventos = [e for e in ler_eventos(args.arquivo) if not args.etapa or e["etapa"] in args.etapa]
+    if not eventos:
+        print(f"Nenhum evento em {args.arquivo}")
+        sys.exit(1)
+    resumo = resumir(eventos)
+    if args.json:
+        print(json.dumps(resumo, ensure_ascii=False, indent=2))
+    else:
+        imprimir_resumo(resumo)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# Ponto de entrada único: coleta → extração e limpeza → duplicatas → identificação.
+#
+# Cada artefato (pasta de downloads de uma lei, .txt extraído, tabela
+# identificado_<LEI>, resultados da identificação) é registrado com o hash
+# das suas entradas e dos parâmetros usados. Numa nova execução só é refeito
+# o que ficou desatualizado: um PDF baixado de novo com outro conteúdo volta
+# para a extração, um validado_<LEI>.csv editado volta para a limpeza. Os
+# downloads também são revalidados nos portais depois de --validade-download horas.
+#
+#   python pipeline.py                         # tudo que estiver desatualizado
+#   python pipeline.py --only LAI --stage extract
+#   python pipeline.py --stage identify --lote --force
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IDENTIFICADOR_DIR = os.path.join(BASE_DIR, "identificador")
+# Os módulos do identificador importam uns aos outros pelo nome, como quando rodados de dentro da pasta
+sys.path.insert(0, IDENTIFICADOR_DIR)
+
+LEIS = ["LAI", "LGD", "LGPD", "MROSC"]
+TIPOS = ["capital", "estado"]
+
+# Etapas e de quais dependem; a ordem da lista já é uma ordem topológica
+ETAPAS = {
+    "download": [],
+    "extract": ["download"],
+    "clean": [],
+    "dedup": ["extract"],
+    "identify": ["dedup", "clean"],
+}
+
+CAMINHO_ESTADO = os.path.join(BASE_DIR, ".cache", "pipeline.sqlite")
+PASTA_DOWNLOADS = os.path.join(BASE_DIR, ".cache", "downloads")
+CHUNK_SIZE = 1024 * 1024
+# Horas até o download de uma lei ser refeito mesmo sem mudar o validado_<LEI>.csv, para pegar
+# documentos alterados nos portais; as requisições condicionais (ETag/Last-Modified) deixam isso barato
+VALIDADE_DOWNLOAD_HORAS = 24
+
+
+class EstadoPipeline:
+    """Registro (SQLite) do hash de entradas de cada artefato e cache dos hashes de arquivo.
+
+    O hash de um arquivo só é recalculado quando muda o tamanho ou o mtime,
+    então checar se algo está desatualizado não relê os PDFs a cada execução.
+    """
+
+    def __init__(self, caminho_db: str = CAMINHO_ESTADO):
+        os.makedirs(os.path.dirname(caminho_db), exist_ok=True)
+        self._conn = sqlite3.connect(caminho_db)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS artefatos (
+                etapa TEXT,
+                alvo TEXT,
+                hash_entradas TEXT,
+                parametros TEXT,
+                atualizado_em REAL,
+                PRIMARY KEY (etapa, alvo)
+            );
+            CREATE TABLE IF NOT EXISTS hashes (
+                caminho TEXT PRIMARY KEY,
+                mtime_ns INTEGER,
+                tamanho INTEGER,
+                sha256 TEXT
+            );
+            """
+        )
+        self._conn.commit()
+
+    def hash_arquivo(self, caminho: str) -> str:
+        stat = os.stat(caminho)
+        linha = self._conn.execute(
+            "SELECT sha256 FROM hashes WHERE caminho = ? AND mtime_ns = ? AND tamanho = ?",
+            (caminho, stat.st_mtime_ns, stat.st_size),
+        ).fetchone()
+        if linha:
+            return linha[0]
+        sha = hashlib.sha256()
+        with open(caminho, "rb") as arquivo:
+            for bloco in iter(lambda: arquivo.read(CHUNK_SIZE), b""):
+                sha.update(bloco)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)",
+            (caminho, stat.st_mtime_ns, stat.st_size, sha.hexdigest()),
+        )
+        self._conn.commit()
+        return sha.hexdigest()
+
+    def hash_entradas(self, caminhos, parametros: dict) -> str:
+        """Hash do conjunto de arquivos de entrada (por caminho relativo e conteúdo) e dos parâmetros."""
+        sha = hashlib.sha256(json.dumps(parametros, sort_keys=True).encode("utf-8"))
+        for caminho in sorted(caminhos):
+            sha.update(os.path.relpath(caminho, BASE_DIR).encode("utf-8"))
+            sha.update(self.hash_arquivo(caminho).encode("ascii"))
+        return sha.hexdigest()
+
+    def desatualizado(self, etapa: str, alvo: str, hash_entradas: str, validade: float | None = None) -> bool:
+        """Entradas diferentes das registradas, ou registro com mais de `validade` segundos."""
+        linha = self._conn.execute(
+            "SELECT hash_entradas, atualizado_em FROM artefatos WHERE etapa = ? AND alvo = ?", (etapa, alvo)
+        ).fetchone()
+        if linha is None or linha[0] != hash_entradas:
+            return True
+        return validade is not None and time.time() - linha[1] >= validade
+
+    def registrar(self, etapa: str, alvo: str, hash_entradas: str, parametros: dict):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO artefatos VALUES (?, ?, ?, ?, ?)",
+            (etapa, alvo, hash_entradas, json.dumps(parametros, sort_keys=True), time.time()),
+        )
+        self._conn.commit()
+
+
+# -------------------------------------------------------------------
+# Arquivos de cada lei
+# -------------------------------------------------------------------
+def caminho_validado(lei):
+    return os.path.join(BASE_DIR, lei, f"validado_{lei}.csv")
+
+
+def pares_bruto_txt(lei):
+    """(arquivo bruto, .txt de destino) de todas as pastas dados_brutos da lei."""
+    pares = []
+    for tipo in TIPOS:
+        pasta_brutos = os.path.join(BASE_DIR, lei, tipo, "dados_brutos")
+        if not os.path.isdir(pasta_brutos):
+            continue
+        pasta_extraidos = os.path.join(BASE_DIR, lei, tipo, "dados_extraidos")
+        for entrada in sorted(os.scandir(pasta_brutos), key=lambda e: e.name):
+            if entrada.is_file():
+                nome = os.path.splitext(entrada.name)[0]
+                pares.append((entrada.path, os.path.join(pasta_extraidos, nome + ".txt")))
+    return pares
+
+
+def relativo(caminho):
+    return os.path.relpath(caminho, BASE_DIR)
+
+
+# -------------------------------------------------------------------
+# Etapas
+# -------------------------------------------------------------------
+def etapa_download(estado, leis, args):
+    """Baixa as regulamentações das leis cujo validado_<LEI>.csv mudou ou cujo último download
+    tem mais de --validade-download horas (aí o manifesto só baixa o que mudou no portal)."""
+    import coleta
+    from manifesto import Manifesto
+
+    parametros = {"pdf_qd": args.pdf_qd}
+    pendentes = {}
+    for lei in leis:
+        if not os.path.exists(caminho_validado(lei)):
+            continue
+        hash_entradas = estado.hash_entradas([caminho_validado(lei)], parametros)
+        if args.force or estado.desatualizado("download", lei, hash_entradas, args.validade_download * 3600):
+            pendentes[lei] = hash_entradas
+    if not pendentes:
+        print("⏭️ download: nada desatualizado")
+        return
+
+    tarefas = [tarefa for tarefa in coleta.listar_tarefas(BASE_DIR) if tarefa["lei"] in pendentes]
+    print(f"⬇️ download: {len(tarefas)} documentos de {', '.join(pendentes)}")
+    baixados = coleta.baixar_todos(tarefas, pasta_cache=PASTA_DOWNLOADS, baixar_pdf_do_qd=args.pdf_qd)
+    print(f"⬇️ download: {len(baixados)}/{len(tarefas)} documentos baixados")
+    # Fica registrada a lei cujos documentos vieram ou falharam de vez (link quebrado, 4xx);
+    # com alguma falha passageira, ela tenta de novo na próxima execução
+    manifesto = Manifesto(PASTA_DOWNLOADS)
+    for lei, hash_entradas in pendentes.items():
+        nao_resolvidas = [t for t in tarefas if t["lei"] == lei and not coleta.tarefa_resolvida(t, manifesto)]
+        if nao_resolvidas:
+            print(f"⬇️ download: {lei} fica pendente ({len(nao_resolvidas)} documentos com falha passageira)")
+        else:
+            estado.registrar("download", lei, hash_entradas, parametros)
+
+
+def etapa_extract(estado, leis, args):
+    """Extrai os arquivos brutos sem .txt ou cujo conteúdo (ou parâmetros de extração) mudou.
+
+    Um .txt que é o texto pronto baixado do Querido Diário não é sobrescrito pela extração do PDF.
+    """
+    import extracao
+    from manifesto import Manifesto
+
+    manifesto = Manifesto(PASTA_DOWNLOADS)
+    parametros = {"dpi": args.dpi, "renderer": args.renderer, "paginas": args.paginas}
+    pendentes = []
+    hashes = {}
+    # .txt atualizados por hash do bruto: um bruto pendente idêntico a um deles só copia o texto
+    prontos = {}
+    for lei in leis:
+        for bruto, txt in pares_bruto_txt(lei):
+            if os.path.exists(txt) and manifesto.conhece_objeto(estado.hash_arquivo(txt), "txt"):
+                continue
+            hash_entradas = estado.hash_entradas([bruto], parametros)
+            if args.force or not os.path.exists(txt) or estado.desatualizado("extract", relativo(txt), hash_entradas):
+                pendentes.append((bruto, txt))
+                hashes[bruto] = (txt, hash_entradas)
+            else:
+                prontos.setdefault(estado.hash_arquivo(bruto), txt)
+    if not pendentes:
+        print("⏭️ extract: nada desatualizado")
+        return
+
+    print(f"📄 extract: {len(pendentes)} arquivos desatualizados")
+    for _, txt in pendentes:
+        os.makedirs(os.path.dirname(txt), exist_ok=True)
+    # Todas as leis e territórios dividem o mesmo pool de processos
+    extraidos, erros = extracao.extract_all(pendentes, args.workers, args.paginas, args.dpi, args.renderer,
+                                            extracted_by_hash=prontos)
+    for bruto in extraidos:
+        txt, hash_entradas = hashes[bruto]
+        estado.registrar("extract", relativo(txt), hash_entradas, parametros)
+    print(f"📄 extract: {len(extraidos)} arquivos extraídos, {len(erros)} erros")
+    for nome, erro in erros:
+        print(nome, erro)
+
+
+def etapa_clean(estado, leis, args):
+    """Regera identificado_<LEI> quando o validado_<LEI>.csv muda; leis diferentes em paralelo."""
+    import limpador_validado
+
+    parametros = {}
+    pendentes = {}
+    for lei in leis:
+        if not os.path.exists(caminho_validado(lei)):
+            continue
+        hash_entradas = estado.hash_entradas([caminho_validado(lei)], parametros)
+        saida = os.path.join(limpador_validado.PASTA_SAIDA, f"identificado_{lei}.csv")
+        if args.force or not os.path.exists(saida) or estado.desatualizado("clean", lei, hash_entradas):
+            pendentes[lei] = hash_entradas
+    if not pendentes:
+        print("⏭️ clean: nada desatualizado")
+        return
+
+    with ThreadPoolExecutor(max_workers=len(pendentes)) as executor:
+        futuros = {lei: executor.submit(limpador_validado.limpar_csv, caminho_validado(lei), lei) for lei in pendentes}
+    for lei, futuro in futuros.items():
+        futuro.result()
+        estado.registrar("clean", lei, pendentes[lei], parametros)
+
+
+def etapa_dedup(estado, leis, args):
+    """Regera o relatório de duplicatas quando mudam os brutos ou os .txt de qualquer lei.
+
+    Olha sempre todas as leis: a mesma regulamentação costuma aparecer em mais de uma.
+    """
+    import duplicatas
+
+    documentos = duplicatas.listar_documentos(BASE_DIR)
+    entradas = [caminho for documento in documentos.values() for caminho in (documento["bruto"], documento["txt"]) if caminho]
+    parametros = {"limiar": args.limiar}
+    hash_entradas = estado.hash_entradas(entradas, parametros)
+    if not args.force and os.path.exists(duplicatas.CAMINHO_RELATORIO) \
+            and not estado.desatualizado("dedup", "todas", hash_entradas):
+        print("⏭️ dedup: nada desatualizado")
+        return
+
+    grupos = duplicatas.agrupar(documentos, limiar=args.limiar)
+    resumo = duplicatas.relatorio(documentos, grupos)
+    print(f"🧬 dedup: {resumo['documentos']} documentos, {resumo['grupos']} grupos, "
+          f"{resumo['redundantes']} redundantes ({resumo['bytes_redundantes'] / (1024 * 1024):.1f} MB)")
+    estado.registrar("dedup", "todas", hash_entradas, parametros)
+
+
+def etapa_identify(estado, leis, args):
+    """Refaz a identificação quando mudam as tabelas identificado_<LEI>, os .txt ou o modo (lote/NLP)."""
+    import identificador_de_decretos as identificador
+    from limpador_validado import PASTA_SAIDA
+
+    arquivos = identificador.listar_txts()
+    entradas = [caminho for caminho, _ in arquivos.values()]
+    for lei in leis:
+        for extensao in (".csv", ".parquet"):
+            caminho = os.path.join(PASTA_SAIDA, f"identificado_{lei}{extensao}")
+            if os.path.exists(caminho):
+                entradas.append(caminho)
+    parametros = {"lote": args.lote, "nlp": args.nlp, "duplicatas": args.duplicatas, "limiar": args.limiar}
+    alvo = ",".join(leis)
+    hash_entradas = estado.hash_entradas(entradas, parametros)
+    if not args.force and not estado.desatualizado("identify", alvo, hash_entradas):
+        print("⏭️ identify: nada desatualizado")
+        return
+
+    csvs = {lei: df for lei, df in identificador.carregar_csvs_identificados().items() if lei in leis}
+    representantes = identificador.agrupar_duplicatas(arquivos, args.duplicatas, args.limiar)
+    if args.lote:
+        identificador.identificar_em_lote(arquivos, csvs, args.nlp, representantes=representantes)
+    else:
+        indice = identificador.carregar_indice(identificador.so_representantes(arquivos, representantes))
+        identificador.identificar_por_arquivo(indice, arquivos, csvs, args.nlp, representantes=representantes)
+    estado.registrar("identify", alvo, hash_entradas, parametros)
+
+
+FUNCOES = {
+    "download": etapa_download,
+    "extract": etapa_extract,
+    "clean": etapa_clean,
+    "dedup": etapa_dedup,
+    "identify": etapa_identify,
+}
+
+
+def etapas_a_executar(pedidas, com_dependencias):
+    """Etapas pedidas (todas, se nenhuma) na ordem do DAG, incluindo as anteriores se pedido."""
+    selecionadas = set(pedidas or ETAPAS)
+    if com_dependencias:
+        pilha = list(selecionadas)
+        while pilha:
+            for dependencia in ETAPAS[pilha.pop()]:
+                if dependencia not in selecionadas:
+                    selecionadas.add(dependencia)
+                    pilha.append(dependencia)
+    return [etapa for etapa in ETAPAS if etapa in selecionadas]
+
+
+def main():
+    import duplicatas
+    import extracao
+    import metricas
+    from nlp import MODOS
+
+    parser = argparse.ArgumentParser(description="Executa as etapas desatualizadas do pipeline de regulamentações.")
+    parser.add_argument("--only", action="append", choices=LEIS, metavar="LEI",
+                        help="limita às leis indicadas (pode repetir)")
+    parser.add_argument("--stage", action="append", choices=list(ETAPAS),
+                        help="executa só as etapas indicadas (pode repetir)")
+    parser.add_argument("--com-dependencias", action="store_true",
+                        help="com --stage, inclui também as etapas de que ela depende")
+    parser.add_argument("--force", action="store_true", help="refaz mesmo o que está atualizado")
+    parser.add_argument("--pdf-qd", action="store_true",
+                        help="baixa também o PDF dos documentos do Querido Diário (o .txt pronto sempre vem)")
+    parser.add_argument("--validade-download", type=float, default=VALIDADE_DOWNLOAD_HORAS, metavar="HORAS",
+                        help="revalida os documentos baixados há mais tempo que isso (0: a cada execução)")
+    parser.add_argument("--workers", type=int, default=extracao.MAX_WORKERS, help="processos da extração")
+    parser.add_argument("--dpi", type=int, default=extracao.OCR_DPI, help="resolução da rasterização para OCR")
+    parser.add_argument("--renderer", choices=["pymupdf", "poppler"], default=extracao.OCR_RENDERER)
+    parser.add_argument("--paginas", type=extracao.parse_page_range, default=None,
+                        help="intervalo de páginas dos PDFs, ex.: 1-50")
+    parser.add_argument("--lote", action="store_true", help="identificação em lote (Aho-Corasick)")
+    parser.add_argument("--nlp", choices=MODOS, default="off", help="estágio de NLP da identificação")
+    parser.add_argument("--duplicatas", choices=duplicatas.MODOS_REUSO, default=duplicatas.REUSO_EXATO,
+                        help="reaproveitamento da identificação entre textos duplicados")
+    parser.add_argument("--limiar", type=float, default=duplicatas.LIMIAR_SIMILARIDADE,
+                        help="similaridade mínima (Jaccard) das quase duplicatas")
+    parser.add_argument("--perfilar", action="append", choices=list(ETAPAS) + ["all"],
+                        help="grava perfis do cProfile das etapas indicadas em .cache/metricas")
+    args = parser.parse_args()
+
+    if args.perfilar:
+        metricas.PERFILAR.update(args.perfilar)
+        # processos do pool de extração leem a variável ao importar o metricas
+        os.environ["PERFILAR"] = ",".join(metricas.PERFILAR)
+
+    leis = args.only or LEIS
+    estado = EstadoPipeline()
+    inicio_execucao = time.time()
+    for etapa in etapas_a_executar(args.stage, args.com_dependencias):
+        inicio = time.perf_counter()
+        FUNCOES[etapa](estado, leis, args)
+        print(f"✅ {etapa} concluída em {time.perf_counter() - inicio:.1f}s\n")
+
+    eventos = [evento for evento in metricas.ler_eventos() if evento.get("inicio", 0) >= inicio_execucao]
+    if eventos:
+        metricas.imprimir_resumo(metricas.resumir(eventos))
+
+
+if __name__ == "__main__":
+    # coleta.py e extracao.py usam a pasta atual como raiz do projeto
+    os.chdir(BASE_DIR)
+    main()
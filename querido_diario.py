@@ -0,0 +1,270 @@
+import os
+import sys
+import json
+import random
+import hashlib
+import asyncio
+import threading
+from collections import Counter
+
+import aiohttp
+
+from cache_consultas import CacheAusente, CacheConsultas
+from gravacao_http import envolver_sessao
+from manifesto import DownloadIncompleto, DownloadParcial
+from metricas import acumular, anotar, medir_arquivo, perfilar
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "identificador"))
+
+from territorios import UFS
+
+# QD_API_URL aponta os scripts para outro servidor, como o servidor_qd.py local
+API_BASE_URL = os.environ.get("QD_API_URL", "https://queridodiario.ok.org.br/api/gazettes")
+
+# Capitais buscadas no Querido Diário, nesta ordem; nomes e códigos IBGE vêm de territorios.UFS
+UFS_DAS_CAPITAIS = [
+    "SE", "MG", "PA", "RR", "MS", "DF", "MT", "PR", "GO", "SC", "PB", "AP",
+    "AL", "AM", "RN", "TO", "RS", "PE", "RJ", "BA", "MA", "PI", "ES",
+]
+CAPITAIS = {f"{UFS[uf][2]} ({uf})": UFS[uf][3] for uf in UFS_DAS_CAPITAIS}
+
+# Requisições simultâneas (API + downloads) e conexões mantidas no pool
+MAX_CONEXOES = 10
+# Diários pedidos por página na paginação offset/size
+TAMANHO_PAGINA = 100
+# Tentativas em 429/5xx/erros de rede, com espera exponencial a partir de ESPERA_INICIAL segundos
+TENTATIVAS = 5
+ESPERA_INICIAL = 1.0
+TIMEOUT = aiohttp.ClientTimeout(total=None, connect=10, sock_read=120)
+
+STATUS_RETENTAVEIS = {429, 500, 502, 503, 504}
+
+# Cache das respostas da API: validade padrão de cada consulta e tamanho máximo em disco
+CAMINHO_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "consultas_qd.sqlite")
+TTL_PADRAO = 24 * 60 * 60
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+# QD_SOMENTE_CACHE=1 roda offline: só responde o que já está no cache (mesmo vencido)
+SOMENTE_CACHE = os.environ.get("QD_SOMENTE_CACHE") == "1"
+
+
+class ErroRetentavel(Exception):
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class ClienteQD:
+    """Cliente assíncrono do endpoint /api/gazettes do Querido Diário.
+
+    Uma única sessão aiohttp com pool de conexões é compartilhada pelas
+    buscas e pelos downloads; um semáforo limita quantas requisições ficam
+    em voo ao mesmo tempo. Uso:
+
+        async with ClienteQD() as cliente:
+            dados = await cliente.buscar({"querystring": ..., "territory_ids": ...})
+
+    As respostas da API passam pelo `CacheConsultas` (desligue com
+    `usar_cache=False`); com `somente_cache`, nenhuma busca vai à rede.
+    """
+
+    def __init__(self, max_conexoes: int = MAX_CONEXOES, usar_cache: bool = True,
+                 somente_cache: bool = SOMENTE_CACHE, ttl: float = TTL_PADRAO, api_url: str = API_BASE_URL):
+        self.max_conexoes = max_conexoes
+        self.api_url = api_url
+        self.cache = CacheConsultas(CAMINHO_CACHE, CACHE_MAX_BYTES) if usar_cache or somente_cache else None
+        self.somente_cache = somente_cache
+        self.ttl = ttl
+        self._sessao = None
+        self._semaforo = None
+
+    async def __aenter__(self):
+        conector = aiohttp.TCPConnector(limit=self.max_conexoes)
+        # com HTTP_GRAVACAO=gravar/reproduzir, as respostas vêm das fixtures (ver gravacao_http.py)
+        self._sessao = envolver_sessao(aiohttp.ClientSession(connector=conector, timeout=TIMEOUT))
+        self._semaforo = asyncio.Semaphore(self.max_conexoes)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._sessao.close()
+
+    async def _com_retentativas(self, operacao):
+        """Executa `operacao()` repetindo em 429/5xx e falhas de rede, com espera exponencial e jitter."""
+        for tentativa in range(TENTATIVAS):
+            acumular("tentativas")
+            try:
+                async with self._semaforo:
+                    return await operacao()
+            except (ErroRetentavel, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                    asyncio.TimeoutError, DownloadIncompleto) as e:
+                if tentativa == TENTATIVAS - 1:
+                    raise
+                espera = ESPERA_INICIAL * 2 ** tentativa + random.uniform(0, ESPERA_INICIAL)
+                if isinstance(e, ErroRetentavel) and e.retry_after:
+                    espera = max(espera, e.retry_after)
+                await asyncio.sleep(espera)
+
+    async def _get_json(self, params, ttl=None):
+        chave = CacheConsultas.chave(self.api_url, params)
+        with medir_arquivo("qd_consulta", chave) as evento:
+            if self.cache is not None:
+                dados = self.cache.buscar(chave, ignorar_validade=self.somente_cache)
+                evento["cache"] = dados is not None
+                if dados is not None:
+                    return dados
+                if self.somente_cache:
+                    raise CacheAusente(f"consulta fora do cache: {params}")
+
+            async def operacao():
+                async with self._sessao.get(self.api_url, params=parametros_da_url(params)) as resposta:
+                    verificar_status(resposta)
+                    corpo = await resposta.read()
+                    anotar(bytes=len(corpo))
+                    return json.loads(corpo)
+            dados = await self._com_retentativas(operacao)
+
+            if self.cache is not None:
+                self.cache.guardar(chave, dados, self.ttl if ttl is None else ttl)
+            return dados
+
+    async def buscar(self, params: dict, paginar: bool = True, ttl: float | None = None):
+        """Busca diários; com `paginar`, segue offset/size até trazer todos os `total_gazettes`.
+
+        `ttl` (segundos) sobrepõe a validade padrão do cache para esta consulta.
+        Valores em lista (como vários `territory_ids`) viram parâmetros repetidos.
+        """
+        params = {
+            chave: [str(v) for v in valor] if isinstance(valor, (list, tuple)) else str(valor)
+            for chave, valor in params.items() if valor not in (None, "")
+        }
+        if not paginar:
+            return await self._get_json(params, ttl)
+
+        params["size"] = str(TAMANHO_PAGINA)
+        params["offset"] = "0"
+        dados = await self._get_json(params, ttl)
+        gazettes = list(dados.get("gazettes") or [])
+        total = dados.get("total_gazettes") or 0
+        while len(gazettes) < total:
+            params["offset"] = str(len(gazettes))
+            pagina = (await self._get_json(params, ttl)).get("gazettes") or []
+            if not pagina:
+                break
+            gazettes.extend(pagina)
+        dados["gazettes"] = gazettes
+        return dados
+
+    async def buscar_varios(self, lista_params, paginar: bool = True, ttl: float | None = None):
+        """Dispara várias buscas em paralelo (por exemplo, uma por território) e devolve na mesma ordem."""
+        return await asyncio.gather(*(self.buscar(params, paginar, ttl) for params in lista_params))
+
+    def resumo_cache(self) -> str:
+        return self.cache.resumo() if self.cache is not None else "Cache de consultas desligado"
+
+    async def baixar(self, url: str, destino: str, sha256: str | None = None):
+        """Baixa `url` para `destino` em streaming, sem manter o corpo inteiro em memória.
+
+        Os bytes vão para `<destino>.parcial`, que só substitui o destino depois
+        de conferidos o Content-Length e, se informado, o `sha256`. Cada nova
+        tentativa (e a próxima execução) continua do .parcial com Range.
+        """
+        parcial = DownloadParcial(destino + ".parcial", sha256)
+
+        async def operacao():
+            # sem compressão, para o Content-Length e o Range valerem para os bytes do arquivo
+            cabecalhos = {"Accept-Encoding": "identity", **parcial.cabecalhos()}
+            async with self._sessao.get(url, headers=cabecalhos) as resposta:
+                if resposta.status == 416:
+                    parcial.descartar()
+                    raise DownloadIncompleto("faixa recusada pelo servidor (416)")
+                verificar_status(resposta)
+                parcial.iniciar(resposta.status, resposta.headers)
+                if parcial.retomado_de:
+                    anotar(retomado_de=parcial.retomado_de)
+                try:
+                    async for chunk in resposta.content.iter_chunked(parcial.buffer):
+                        parcial.escrever(chunk)
+                finally:
+                    parcial.descartar_arquivo_aberto()
+                _, tamanho = parcial.concluir(destino)
+                anotar(bytes=tamanho - parcial.retomado_de)
+            return destino
+        with medir_arquivo("qd_download", url, destino=destino):
+            return await self._com_retentativas(operacao)
+
+
+def parametros_da_url(params: dict):
+    """Lista de pares (nome, valor) para a URL, repetindo o nome para valores em lista."""
+    return [
+        (chave, v)
+        for chave, valor in params.items()
+        for v in (valor if isinstance(valor, list) else [valor])
+    ]
+
+
+def verificar_status(resposta):
+    anotar(status_http=resposta.status)
+    if resposta.status in STATUS_RETENTAVEIS:
+        retry_after = resposta.headers.get("Retry-After")
+        raise ErroRetentavel(resposta.status, float(retry_after) if retry_after and retry_after.isdigit() else None)
+    resposta.raise_for_status()
+
+
+def nome_do_diario(gazette, data_repetida: bool) -> str:
+    """<data>, ou <data>_<hash da URL> quando mais de um diário do território sai na mesma data
+    (edição extra, executivo e legislativo), para cada um ter os seus arquivos."""
+    if not data_repetida:
+        return gazette["date"]
+    url = gazette.get("txt_url") or gazette.get("url") or ""
+    return f"{gazette['date']}_{hashlib.sha256(url.encode()).hexdigest()[:8]}"
+
+
+async def salvar_diarios(cliente: ClienteQD, pasta: str, gazettes, baixar_pdf: bool):
+    """Salva o trecho de cada diário em <pasta>/<data>.txt e baixa, em paralelo, o texto completo
+    (<data>_full_gazzete.txt) e, se pedido, o PDF (<data>_full_gazzete.pdf).
+
+    Diários de mesma data ganham o hash da URL no nome (ver nome_do_diario); cada destino é
+    baixado uma única vez, já que dois downloads no mesmo .parcial se atropelariam.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    por_data = Counter(gazette["date"] for gazette in gazettes)
+    downloads = {}
+    for gazette in gazettes:
+        nome = nome_do_diario(gazette, por_data[gazette["date"]] > 1)
+        with open(os.path.join(pasta, nome + ".txt"), "w", encoding="utf-8") as f:
+            f.write(gazette["excerpts"][0] if gazette.get("excerpts") else "")
+        base = os.path.join(pasta, nome + "_full_gazzete")
+        if gazette.get("txt_url"):
+            downloads.setdefault(base + ".txt", gazette["txt_url"])
+        if baixar_pdf and gazette.get("url"):
+            downloads.setdefault(base + ".pdf", gazette["url"])
+    resultados = await asyncio.gather(
+        *(cliente.baixar(url, destino) for destino, url in downloads.items()), return_exceptions=True
+    )
+    for resultado in resultados:
+        if isinstance(resultado, Exception):
+            print(f"Erro ao baixar diário: {resultado}")
+
+
+def executar(corrotina):
+    """asyncio.run que também funciona de dentro de um loop já rodando (células do Jupyter/VS Code)."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        with perfilar("qd"):
+            return asyncio.run(corrotina)
+    resultado = {}
+
+    def rodar():
+        try:
+            with perfilar("qd"):
+                resultado["valor"] = asyncio.run(corrotina)
+        except BaseException as e:
+            resultado["erro"] = e
+
+    thread = threading.Thread(target=rodar)
+    thread.start()
+    thread.join()
+    if "erro" in resultado:
+        raise resultado["erro"]
+    return resultado.get("valor")
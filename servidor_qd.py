@@ -0,0 +1,308 @@
+import os
+import re
+import sys
+import glob
+import random
+import asyncio
+import argparse
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from aiohttp import web
+from unidecode import unidecode
+
+# Servidor local que imita o Querido Diário: a busca em /api/gazettes e os
+# arquivos dos diários (txt_url e url). Serve para rodar os scripts e medir
+# concorrência, retentativas e vazão sem depender da rede:
+#
+#   python servidor_qd.py --latencia 0.2 --taxa-erro 0.1
+#   QD_API_URL=http://127.0.0.1:8080/api/gazettes python MROSC/mrosc.py
+#
+# Os diários são os .txt do próprio repositório: */dados_extraidos/*.txt
+# (território pelo nome do arquivo, data de modificação do arquivo) e os
+# <data>_full_gazzete.txt salvos pelas buscas (território pela pasta).
+# Com --semente, a latência e os erros sorteados se repetem entre execuções.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, "identificador"))
+
+from territorios import NOMES as NOMES_TERRITORIOS, IndiceTerritorios
+
+PORTA = 8080
+TAMANHO_PAGINA = 10
+EXCERPT_SIZE = 500
+STATUS_ERRO = [503, 429]
+
+# Termos da busca: frases entre aspas (com ~N opcional) e palavras soltas
+TERMO_RE = re.compile(r'"([^"]*)"(?:~(\d+))?|([^\s"+|]+)')
+PALAVRA_RE = re.compile(r"\w+(?:[.,/-]\w+)*")
+DATA_DIARIO_RE = re.compile(r"(\d{4}-\d{2}-\d{2})(?:_[0-9a-f]+)?_full_gazzete\.txt$")
+
+
+def palavras(texto):
+    """(palavra normalizada, início, fim) de cada palavra do texto; "14.129" e "14129" viram a mesma palavra."""
+    normalizado = unidecode(texto).lower()
+    return [(re.sub(r"[.,/-]", "", m.group()), m.start(), m.end()) for m in PALAVRA_RE.finditer(normalizado)]
+
+
+class Diario:
+    def __init__(self, identificador, territory_id, data, caminho_txt, caminho_original=None, edicao=0):
+        self.id = identificador
+        self.territory_id = territory_id
+        self.data = data
+        self.edicao = edicao
+        self.caminho_txt = caminho_txt
+        self.caminho_original = caminho_original
+        with open(caminho_txt, encoding="utf-8", errors="replace") as arquivo:
+            self.texto = arquivo.read()
+        self.palavras = palavras(self.texto)
+        self.posicoes = {}
+        for posicao, (palavra, _, _) in enumerate(self.palavras):
+            self.posicoes.setdefault(palavra, []).append(posicao)
+
+
+def carregar_corpus(base_dir: str = BASE_DIR, copias: int = 1, edicoes: int = 1):
+    """Diários do repositório; com `copias` > 1, cada um se repete em dias seguidos (corpus maior para carga),
+    e com `edicoes` > 1 sai também em edições extras no mesmo dia."""
+    indice = IndiceTerritorios()
+    encontrados = []
+    for caminho in sorted(glob.glob(os.path.join(base_dir, "*", "*", "dados_extraidos", "*.txt"))):
+        chave = os.path.splitext(os.path.basename(caminho))[0]
+        tipo = os.path.basename(os.path.dirname(os.path.dirname(caminho)))
+        codigos = indice.resolver_arquivo(chave, tipo)
+        brutos = glob.glob(os.path.join(os.path.dirname(os.path.dirname(caminho)), "dados_brutos", chave + ".*"))
+        data = date.fromtimestamp(os.path.getmtime(caminho))
+        encontrados.append((codigos[0] if codigos else 0, data, caminho, brutos[0] if brutos else None))
+    for caminho in sorted(glob.glob(os.path.join(base_dir, "**", "*_full_gazzete.txt"), recursive=True)):
+        pasta = os.path.basename(os.path.dirname(caminho))
+        codigos = indice.resolver_linha(pasta, "capital")
+        pdf = caminho[:-len(".txt")] + ".pdf"
+        data = date.fromisoformat(DATA_DIARIO_RE.search(caminho).group(1))
+        encontrados.append((codigos[0] if codigos else 0, data, caminho, pdf if os.path.exists(pdf) else None))
+
+    diarios = []
+    for copia in range(copias):
+        for territory_id, data, caminho, original in encontrados:
+            for edicao in range(edicoes):
+                diarios.append(
+                    Diario(len(diarios), territory_id, data + timedelta(days=copia), caminho, original, edicao)
+                )
+    return diarios
+
+
+def interpretar_busca(querystring: str):
+    """Alternativas (separadas por espaço ou |) de cláusulas obrigatórias (unidas por +).
+
+    Cada cláusula é (palavras, distância máxima): palavra solta tem distância 0,
+    frase exata também, e "frase"~N aceita as palavras em até N posições de folga.
+    """
+    alternativas = []
+    for grupo in re.split(r'\s+(?=(?:[^"]*"[^"]*")*[^"]*$)|\|', querystring.strip()):
+        clausulas = []
+        for frase, distancia, palavra in TERMO_RE.findall(grupo):
+            termos = [p for p, _, _ in palavras(frase or palavra)]
+            if termos:
+                clausulas.append((termos, int(distancia) if distancia else 0))
+        if clausulas:
+            alternativas.append(clausulas)
+    return alternativas
+
+
+def casar_clausula(diario: Diario, termos, distancia):
+    """Posição da primeira ocorrência da cláusula no diário, ou None."""
+    listas = [diario.posicoes.get(termo) for termo in termos]
+    if not all(listas):
+        return None
+    if len(termos) == 1:
+        return listas[0][0]
+    janela = len(termos) - 1 + distancia
+    for inicio in listas[0]:
+        if distancia == 0:
+            if all(inicio + deslocamento in diario.posicoes[termo] for deslocamento, termo in enumerate(termos)):
+                return inicio
+        elif all(any(abs(posicao - inicio) <= janela for posicao in lista) for lista in listas[1:]):
+            return inicio
+    return None
+
+
+def casar(diario: Diario, alternativas):
+    """Posições das cláusulas da primeira alternativa que casa por inteiro (lista vazia se nenhuma)."""
+    if not alternativas:
+        return [0]
+    for clausulas in alternativas:
+        posicoes = [casar_clausula(diario, termos, distancia) for termos, distancia in clausulas]
+        if all(posicao is not None for posicao in posicoes):
+            return posicoes
+    return []
+
+
+def trecho(diario: Diario, posicao: int, tamanho: int):
+    if not diario.palavras:
+        return diario.texto[:tamanho]
+    _, inicio, fim = diario.palavras[min(posicao, len(diario.palavras) - 1)]
+    comeco = max(0, (inicio + fim) // 2 - tamanho // 2)
+    return diario.texto[comeco:comeco + tamanho]
+
+
+def para_json(diario: Diario, request, posicoes, excerpt_size, number_of_excerpts):
+    nome, uf = NOMES_TERRITORIOS.get(diario.territory_id, ("", ""))
+    base = f"{request.scheme}://{request.host}/arquivos/{diario.id}"
+    extensao = os.path.splitext(diario.caminho_original)[1] if diario.caminho_original else None
+    return {
+        "territory_id": str(diario.territory_id),
+        "date": diario.data.isoformat(),
+        "scraped_at": datetime.fromtimestamp(os.path.getmtime(diario.caminho_txt)).isoformat(),
+        "url": base + extensao if extensao else None,
+        "territory_name": nome,
+        "state_code": uf,
+        "excerpts": [trecho(diario, posicao, excerpt_size) for posicao in sorted(posicoes)[:number_of_excerpts]],
+        "edition": str(diario.edicao + 1),
+        "is_extra_edition": diario.edicao > 0,
+        "txt_url": base + ".txt",
+    }
+
+
+# -------------------------------------------------------------------
+# Rotas
+# -------------------------------------------------------------------
+async def buscar(request):
+    diarios = request.app["diarios"]
+    query = request.query
+    territorios = {int(t) for t in query.getall("territory_ids", []) if t.isdigit()}
+    desde = date.fromisoformat(query["published_since"]) if query.get("published_since") else None
+    ate = date.fromisoformat(query["published_until"]) if query.get("published_until") else None
+    alternativas = interpretar_busca(query.get("querystring", ""))
+
+    encontrados = []
+    for diario in diarios:
+        if territorios and diario.territory_id not in territorios:
+            continue
+        if (desde and diario.data < desde) or (ate and diario.data > ate):
+            continue
+        posicoes = casar(diario, alternativas)
+        if posicoes:
+            encontrados.append((diario, posicoes))
+
+    ordem = query.get("sort_by", "descending_date")
+    encontrados.sort(key=lambda par: (par[0].data, par[0].id), reverse=ordem != "ascending_date")
+    offset = int(query.get("offset", 0))
+    size = int(query.get("size", TAMANHO_PAGINA))
+    excerpt_size = int(query.get("excerpt_size", EXCERPT_SIZE))
+    number_of_excerpts = int(query.get("number_of_excerpts", 1))
+    return web.json_response({
+        "total_gazettes": len(encontrados),
+        "gazettes": [
+            para_json(diario, request, posicoes, excerpt_size, number_of_excerpts)
+            for diario, posicoes in encontrados[offset:offset + size]
+        ],
+    })
+
+
+async def arquivo(request):
+    """txt_url e url dos diários; o FileResponse atende Range/If-Range e manda ETag e Last-Modified."""
+    diarios = request.app["diarios"]
+    identificador, extensao = os.path.splitext(request.match_info["nome"])
+    if not identificador.isdigit() or int(identificador) >= len(diarios):
+        raise web.HTTPNotFound()
+    diario = diarios[int(identificador)]
+    if extensao == ".txt":
+        caminho = diario.caminho_txt
+    elif diario.caminho_original and diario.caminho_original.endswith(extensao):
+        caminho = diario.caminho_original
+    else:
+        raise web.HTTPNotFound()
+
+    config = request.app["config"]
+    if request.app["sorteio"].random() < config["taxa_corte"]:
+        return await enviar_cortado(request, caminho)
+    return web.FileResponse(caminho)
+
+
+async def enviar_cortado(request, caminho):
+    """Anuncia o arquivo inteiro e derruba a conexão na metade, como uma transferência interrompida."""
+    request.app["contadores"]["cortes"] += 1
+    tamanho = os.path.getsize(caminho)
+    resposta = web.StreamResponse(headers={"Content-Length": str(tamanho)})
+    await resposta.prepare(request)
+    with open(caminho, "rb") as arquivo:
+        await resposta.write(arquivo.read(tamanho // 2))
+    request.transport.close()
+    return resposta
+
+
+async def estatisticas(request):
+    return web.json_response(dict(request.app["contadores"]))
+
+
+@web.middleware
+async def simular_rede(request, handler):
+    """Latência e erros sorteados em toda rota, menos /_estatisticas."""
+    if request.path == "/_estatisticas":
+        return await handler(request)
+    config, sorteio, contadores = request.app["config"], request.app["sorteio"], request.app["contadores"]
+    contadores["requisicoes"] += 1
+    espera = config["latencia"] + sorteio.uniform(0, config["jitter"])
+    if espera:
+        await asyncio.sleep(espera)
+    if sorteio.random() < config["taxa_erro"]:
+        status = sorteio.choice(config["status_erro"])
+        contadores[f"erro_{status}"] += 1
+        cabecalhos = {"Retry-After": "1"} if status == 429 else None
+        return web.Response(status=status, headers=cabecalhos, text=f"erro simulado {status}")
+    resposta = await handler(request)
+    contadores[f"status_{resposta.status}"] += 1
+    return resposta
+
+
+def criar_app(diarios=None, latencia: float = 0.0, jitter: float = 0.0, taxa_erro: float = 0.0,
+              status_erro=None, taxa_corte: float = 0.0, semente: int | None = None):
+    app = web.Application(middlewares=[simular_rede])
+    app["diarios"] = carregar_corpus() if diarios is None else diarios
+    app["config"] = {
+        "latencia": latencia,
+        "jitter": jitter,
+        "taxa_erro": taxa_erro,
+        "status_erro": status_erro or STATUS_ERRO,
+        "taxa_corte": taxa_corte,
+    }
+    app["sorteio"] = random.Random(semente)
+    app["contadores"] = Counter()
+    app.router.add_get("/api/gazettes", buscar)
+    app.router.add_get("/arquivos/{nome}", arquivo)
+    app.router.add_get("/_estatisticas", estatisticas)
+    return app
+
+
+async def iniciar(app, host: str = "127.0.0.1", porta: int = 0):
+    """Sobe o app em segundo plano; devolve (runner, URL da API). Com porta 0, o sistema escolhe uma livre."""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, porta)
+    await site.start()
+    porta_real = runner.addresses[0][1]
+    return runner, f"http://{host}:{porta_real}/api/gazettes"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita a API e os arquivos do Querido Diário.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=PORTA)
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos de espera fixos por requisição")
+    parser.add_argument("--jitter", type=float, default=0.0, help="segundos extras sorteados (0 a jitter) por requisição")
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="fração das requisições respondida com erro")
+    parser.add_argument("--status-erro", type=int, nargs="+", default=STATUS_ERRO, help="status sorteados nos erros")
+    parser.add_argument("--taxa-corte", type=float, default=0.0, help="fração dos downloads interrompidos na metade")
+    parser.add_argument("--copias", type=int, default=1, help="repete cada diário em dias seguidos")
+    parser.add_argument("--edicoes", type=int, default=1, help="publica cada diário também em edições extras no mesmo dia")
+    parser.add_argument("--semente", type=int, help="semente do sorteio de latência e erros")
+    args = parser.parse_args()
+
+    diarios = carregar_corpus(copias=args.copias, edicoes=args.edicoes)
+    app = criar_app(diarios, args.latencia, args.jitter, args.taxa_erro, args.status_erro, args.taxa_corte, args.semente)
+    print(f"📰 {len(diarios)} diários; API em http://{args.host}:{args.porta}/api/gazettes")
+    print(f"   QD_API_URL=http://{args.host}:{args.porta}/api/gazettes python MROSC/mrosc.py")
+    web.run_app(app, host=args.host, port=args.porta, print=None)
+
+
+if __name__ == "__main__":
+    main()